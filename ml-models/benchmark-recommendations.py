@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Recommendation Benchmark and Offline Evaluation
+Generates a synthetic power-law interaction log, trains RecommendationEngine
+on a time split, and reports ranking quality (recall@k, NDCG@k) alongside
+latency, throughput and peak memory, with regressions flagged against a
+baseline report
+"""
+
+import sys
+import os
+import json
+import time
+import platform
+import statistics
+import threading
+import importlib.util
+from itertools import islice
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_engine_module():
+    """Import recommendation-engine.py (its file name is not importable as-is)"""
+    spec = importlib.util.spec_from_file_location(
+        'recommendation_engine', os.path.join(SCRIPT_DIR, 'recommendation-engine.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+EVENT_TYPES = ['view', 'wishlist', 'cart', 'purchase']
+EVENT_PROBABILITIES = [0.80, 0.07, 0.08, 0.05]
+
+def generate_events(n_events, n_users, n_items, n_groups=50, exponent=1.1, affinity=0.8, seed=42):
+    """
+    Synthetic interaction log with power-law activity and popularity
+
+    Users and items belong to taste groups. Each event picks a user by a
+    Zipf-like activity weight, then with probability `affinity` an item
+    from the user's group (Zipf-like within the group), otherwise an item
+    by global popularity. Timestamps are spread over one year, in order.
+
+    Returns:
+        Dict of numpy arrays: users, items, event_types, timestamps
+    """
+    rng = np.random.default_rng(seed)
+    n_groups = max(1, min(n_groups, n_items))
+
+    def zipf_weights(n):
+        weights = 1.0 / np.arange(1, n + 1) ** exponent
+        return weights / weights.sum()
+
+    # Shuffle ranks so activity and popularity are not tied to id order
+    user_rank = rng.permutation(n_users)
+    users = user_rank[rng.choice(n_users, n_events, p=zipf_weights(n_users))]
+
+    items_per_group = int(np.ceil(n_items / n_groups))
+    group_items = rng.choice(items_per_group, n_events, p=zipf_weights(items_per_group))
+    in_group = (users % n_groups) + n_groups * group_items
+    in_group = np.where(in_group < n_items, in_group, users % n_groups)
+
+    item_rank = rng.permutation(n_items)
+    popular = item_rank[rng.choice(n_items, n_events, p=zipf_weights(n_items))]
+    items = np.where(rng.random(n_events) < affinity, in_group, popular)
+
+    now = time.time()
+    timestamps = np.sort(now - 365 * 86400 + rng.random(n_events) * 365 * 86400)
+    event_types = rng.choice(len(EVENT_TYPES), n_events, p=EVENT_PROBABILITIES)
+
+    return {
+        'users': users.astype(np.int64),
+        'items': items.astype(np.int64),
+        'event_types': event_types.astype(np.int8),
+        'timestamps': timestamps
+    }
+
+def generate_products(n_items, n_groups=50, seed=42):
+    """Product catalogue whose categories follow the taste groups"""
+    rng = np.random.default_rng(seed + 1)
+    conditions = ['new', 'like-new', 'good', 'fair', 'poor']
+    prices = np.exp(rng.normal(6.5, 1.0, n_items)).astype(int)
+    return [
+        {
+            'id': item,
+            'category': f'category-{item % n_groups}',
+            'condition': conditions[rng.integers(len(conditions))],
+            'price': int(prices[item])
+        }
+        for item in range(n_items)
+    ]
+
+def build_split(engine_module, events, n_users, n_items, test_fraction=0.1):
+    """
+    Time split: earliest events train the model, the latest are held out
+
+    Returns:
+        (engine with the training matrix built, dict of user -> held-out item set)
+    """
+    from scipy import sparse
+
+    weights = np.asarray([engine_module.DEFAULT_EVENT_WEIGHTS[t] for t in EVENT_TYPES], dtype=np.float32)
+    cut = int(len(events['users']) * (1 - test_fraction))
+
+    matrix = sparse.csr_matrix(
+        (weights[events['event_types'][:cut]], (events['users'][:cut], events['items'][:cut])),
+        shape=(n_users, n_items), dtype=np.float32
+    )
+    matrix.sum_duplicates()
+
+    engine = engine_module.RecommendationEngine()
+    engine._set_ids(range(n_users), range(n_items))
+    engine._set_matrix(matrix)
+
+    # Held-out items a user had not already interacted with
+    test_users = events['users'][cut:]
+    test_items = events['items'][cut:]
+    seen = np.asarray(matrix[test_users, test_items]).ravel() > 0
+    held_out = {}
+    for user, item in zip(test_users[~seen].tolist(), test_items[~seen].tolist()):
+        held_out.setdefault(user, set()).add(item)
+
+    return engine, held_out
+
+def ranking_metrics(engine, held_out, k=10, max_users=2000, seed=42):
+    """
+    Mean recall@k and NDCG@k of collaborative recommendations on held-out items
+
+    Only users with training history and held-out items are evaluated.
+    """
+    rng = np.random.default_rng(seed)
+    users = [u for u in held_out if engine.user_item_matrix[u].nnz]
+    if len(users) > max_users:
+        users = rng.choice(users, max_users, replace=False).tolist()
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    recalls, ndcgs = [], []
+    for user in users:
+        relevant = held_out[user]
+        ranked = [item for item, _ in engine.get_collaborative_recommendations(user, k)]
+        hits = np.array([item in relevant for item in ranked], dtype=float)
+
+        recalls.append(hits.sum() / min(len(relevant), k))
+        ideal = discounts[:min(len(relevant), k)].sum()
+        ndcgs.append(float((hits * discounts[:len(hits)]).sum() / ideal))
+
+    return {
+        f'recall@{k}': round(float(np.mean(recalls)), 4) if recalls else None,
+        f'ndcg@{k}': round(float(np.mean(ndcgs)), 4) if ndcgs else None,
+        'evaluatedUsers': len(users)
+    }
+
+def _current_rss_mb():
+    """Resident set size from /proc (Linux); None where unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def measure(fn, interval=0.005):
+    """
+    Run fn once, tracking wall time and peak resident memory
+
+    RSS is sampled from a background thread, so native allocations (BLAS,
+    scipy) are counted and fn runs without tracing overhead.
+
+    Returns:
+        (result, seconds, peak MB above the RSS at start, or None without /proc)
+    """
+    baseline = _current_rss_mb()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            rss = _current_rss_mb()
+            if rss is not None and rss > peak[0]:
+                peak[0] = rss
+
+    sampler = None
+    if baseline is not None:
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        seconds = time.perf_counter() - start
+        done.set()
+        if sampler is not None:
+            sampler.join()
+
+    if baseline is None:
+        return result, seconds, None
+    peak_mb = max(peak[0], _current_rss_mb() or 0)
+    return result, seconds, peak_mb - baseline
+
+def latency(fn, args_list):
+    """p50 / p95 latency in ms of fn over a list of argument tuples"""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50Ms': round(statistics.median(samples), 3),
+        'p95Ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'calls': len(samples)
+    }
+
+def benchmark(n_events=1000000, n_users=50000, n_items=20000, algorithms=('svd', 'als'),
+              k=10, eval_users=2000, latency_calls=200, bulk_users=20000, seed=42):
+    """
+    Generate data, then train and evaluate each algorithm
+
+    Returns:
+        Report dict
+    """
+    engine_module = load_engine_module()
+    rng = np.random.default_rng(seed)
+
+    # Keep one-off library import cost out of the first train timing
+    from sklearn.decomposition import TruncatedSVD  # noqa: F401
+
+    events, seconds, peak = measure(lambda: generate_events(n_events, n_users, n_items, seed=seed))
+    print(f'generated {n_events} events in {seconds:.1f}s', file=sys.stderr)
+    products = generate_products(n_items, seed=seed)
+
+    results = {}
+    for algorithm in algorithms:
+        engine, held_out = build_split(engine_module, events, n_users, n_items)
+        result = {'matrix': engine.matrix_stats()}
+
+        if algorithm == 'als':
+            train = lambda: engine.train_als()
+        elif algorithm == 'svd':
+            train = lambda: engine.train_collaborative_filtering()
+        else:
+            raise ValueError(f'Unknown algorithm: {algorithm}')
+        _, seconds, peak = measure(train)
+        result['train'] = {'seconds': round(seconds, 3), 'peakMB': _round(peak), 'params': engine.params}
+
+        engine.build_item_features_matrix(products)
+        _, seconds, peak = measure(lambda: engine.build_neighbours())
+        result['buildNeighbours'] = {'seconds': round(seconds, 3), 'peakMB': _round(peak)}
+
+        if n_users >= engine_module.USER_INDEX_MIN_USERS:
+            _, seconds, peak = measure(lambda: engine.build_user_index())
+            result['buildUserIndex'] = {'seconds': round(seconds, 3), 'peakMB': _round(peak)}
+
+        result['quality'] = ranking_metrics(engine, held_out, k, eval_users, seed)
+
+        active_users = np.flatnonzero(np.diff(engine.user_item_matrix.indptr))
+        sample_users = rng.choice(active_users, min(latency_calls, len(active_users)), replace=False).tolist()
+        sample_items = rng.choice(n_items, min(latency_calls, n_items), replace=False).tolist()
+
+        result['recommend'] = latency(engine.get_hybrid_recommendations, [(u, k) for u in sample_users])
+        result['similarProducts'] = latency(engine.get_content_based_recommendations, [(i, k) for i in sample_items])
+        result['similarUsers'] = latency(engine.get_similar_users, [(u, k) for u in sample_users])
+
+        count, seconds, peak = measure(
+            lambda: sum(1 for _ in islice(engine.iter_recommendations_all(k), bulk_users))
+        )
+        result['recommendAll'] = {
+            'users': count,
+            'seconds': round(seconds, 3),
+            'usersPerSecond': round(count / seconds, 1) if seconds else None,
+            'peakMB': _round(peak)
+        }
+
+        results[algorithm] = result
+        print(f"{algorithm}: train {result['train']['seconds']}s, "
+              f"recall@{k} {result['quality'][f'recall@{k}']}, "
+              f"recommend p50 {result['recommend']['p50Ms']}ms", file=sys.stderr)
+
+    return {
+        'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {
+            'events': n_events,
+            'users': n_users,
+            'items': n_items,
+            'k': k,
+            'seed': seed
+        },
+        'peakRssMB': round(_peak_rss_mb(), 1),
+        'results': results
+    }
+
+def _round(value, digits=1):
+    return None if value is None else round(value, digits)
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# (section, metric, higher is better)
+TRACKED_METRICS = [
+    ('train', 'seconds', False),
+    ('recommend', 'p50Ms', False),
+    ('similarProducts', 'p50Ms', False),
+    ('similarUsers', 'p50Ms', False),
+    ('recommendAll', 'usersPerSecond', True),
+    ('quality', None, True)
+]
+
+def compare(report, baseline, tolerance=0.2, quality_tolerance=0.01):
+    """
+    Metrics that regressed against a baseline report
+
+    Speed metrics regress when more than `tolerance` (relative) worse;
+    quality metrics (recall@k, NDCG@k) when they drop by more than
+    `quality_tolerance` (absolute). Reports with different configs are
+    not compared.
+    """
+    if report.get('config') != baseline.get('config'):
+        return [{'error': 'Baseline was generated with a different config'}]
+
+    regressions = []
+    for algorithm, result in report['results'].items():
+        before = baseline.get('results', {}).get(algorithm)
+        if not before:
+            continue
+
+        for section, metric, higher_is_better in TRACKED_METRICS:
+            if section == 'quality':
+                for name, value in result['quality'].items():
+                    old = before.get('quality', {}).get(name)
+                    if name.startswith(('recall@', 'ndcg@')) and value is not None and old is not None \
+                            and old - value > quality_tolerance:
+                        regressions.append({'algorithm': algorithm, 'metric': name, 'baseline': old, 'current': value})
+                continue
+
+            value = result.get(section, {}).get(metric)
+            old = before.get(section, {}).get(metric)
+            if value is None or not old:
+                continue
+            change = (old - value) / old if higher_is_better else (value - old) / old
+            if change > tolerance:
+                regressions.append({
+                    'algorithm': algorithm,
+                    'metric': f'{section}.{metric}',
+                    'baseline': old,
+                    'current': value
+                })
+
+    return regressions
+
+USAGE = """benchmark-recommendations.py [--events N] [--users N] [--items N]
+    [--algorithms svd,als] [--k N] [--eval-users N] [--seed N]
+    [--output report.json] [--baseline report.json]"""
+
+OPTIONS = ('--events', '--users', '--items', '--algorithms', '--k', '--eval-users',
+           '--seed', '--output', '--baseline')
+
+def main():
+    """
+    CLI interface (see USAGE)
+
+    Exits 1 if any tracked metric regressed against the baseline, or on
+    unknown arguments, so a typo never launches the full default run.
+    """
+    try:
+        args = sys.argv[1:]
+        if '--help' in args or '-h' in args:
+            print(USAGE)
+            sys.exit(0)
+
+        options = {}
+        for name in OPTIONS:
+            if name in args:
+                i = args.index(name)
+                if i + 1 >= len(args):
+                    raise ValueError(f'{name} requires a value')
+                options[name] = args[i + 1]
+                del args[i:i + 2]
+
+        if args:
+            print(json.dumps({
+                'success': False,
+                'error': f"Unknown arguments: {' '.join(args)}",
+                'usage': USAGE
+            }))
+            sys.exit(1)
+
+        report = benchmark(
+            n_events=int(float(options.get('--events', 1000000))),
+            n_users=int(float(options.get('--users', 50000))),
+            n_items=int(float(options.get('--items', 20000))),
+            algorithms=options.get('--algorithms', 'svd,als').split(','),
+            k=int(options.get('--k', 10)),
+            eval_users=int(options.get('--eval-users', 2000)),
+            seed=int(options.get('--seed', 42))
+        )
+
+        if '--baseline' in options:
+            with open(options['--baseline']) as f:
+                report['regressions'] = compare(report, json.load(f))
+
+        if '--output' in options:
+            with open(options['--output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        print(json.dumps(dict(success=True, **report)))
+        sys.exit(1 if report.get('regressions') else 0)
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Benchmark for ML Model CLIs
+Measures per-command import time and time-to-first-result of the scripts
+the server spawns per request, and flags regressions against a baseline
+"""
+
+import sys
+import os
+import json
+import time
+import platform
+import statistics
+import subprocess
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (name, script, args) for each command the server launches as a fresh process.
+# Inputs are tiny so the measurement is dominated by interpreter and import cost.
+SAMPLE_INTERACTIONS = json.dumps([
+    {'userId': u, 'productId': p, 'score': (u + p) % 5 + 1}
+    for u in range(1, 6) for p in range(1, 8) if (u * p) % 3
+])
+SAMPLE_PRODUCTS = json.dumps([
+    {'id': p, 'category': ['clothing', 'home', 'books'][p % 3], 'condition': 'good', 'price': 100 * p}
+    for p in range(1, 8)
+])
+SAMPLE_PRODUCT = json.dumps({'id': 1, 'category': 'clothing', 'condition': 'good', 'price': 300, 'ageInDays': 12})
+
+CASES = [
+    ('visual-search:find_similar', 'visual-search-clip.py',
+     ['find_similar', '[1, 0]', '[[1, [1, 0]], [2, [0, 1]]]', '1']),
+    ('visual-search:cache_stats', 'visual-search-clip.py', ['cache_stats', '--no-cache']),
+    ('inventory:predict_velocity', 'inventory-predictor.py', ['predict_velocity', SAMPLE_PRODUCT]),
+    ('inventory:dead_stock', 'inventory-predictor.py', ['dead_stock', f'[{SAMPLE_PRODUCT}]']),
+    ('inventory:turnover', 'inventory-predictor.py', ['turnover', f'[{SAMPLE_PRODUCT}]']),
+    ('pricing:predict', 'pricing-predictor.py', [json.dumps({'category': 'clothing', 'condition': 'good'})]),
+    ('recommendations:popular', 'recommendation-engine.py', ['popular', SAMPLE_INTERACTIONS, '5']),
+    ('recommendations:similar_products', 'recommendation-engine.py',
+     ['similar_products', SAMPLE_PRODUCTS, '1', '3']),
+    ('recommendations:recommend', 'recommendation-engine.py',
+     ['recommend', SAMPLE_INTERACTIONS, SAMPLE_PRODUCTS, '1', '3']),
+]
+
+def parse_import_time(stderr):
+    """
+    Total import time in ms from `python -X importtime` output
+
+    Sums the cumulative time of top-level imports (names without leading
+    indentation), which covers nested imports exactly once.
+    """
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line.split('|')
+        if len(parts) != 3 or parts[2].startswith('  '):
+            continue
+        try:
+            total_us += int(parts[1])
+        except ValueError:
+            continue  # header line
+    return total_us / 1000.0
+
+def run_case(script, args):
+    """
+    Launch one command as the server would
+
+    Returns:
+        (import ms, first-result ms, total ms, exit code)
+    """
+    # -X importtime output is large; spool it to a file so a full stderr
+    # pipe can never block the child before it writes its result. On-disk
+    # caches point at a fresh directory, so every run starts cold and the
+    # benchmark leaves nothing behind in ml-models/.cache
+    with tempfile.TemporaryFile(mode='w+') as stderr, tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, RECOMMENDATION_FEATURE_CACHE_DIR=cache_dir, VISUAL_SEARCH_CACHE_DIR=cache_dir)
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, '-X', 'importtime', os.path.join(SCRIPT_DIR, script)] + args,
+            stdout=subprocess.PIPE, stderr=stderr, text=True, env=env
+        )
+        proc.stdout.readline()
+        first_result = time.perf_counter() - start
+
+        proc.communicate()
+        total = time.perf_counter() - start
+
+        stderr.seek(0)
+        import_ms = parse_import_time(stderr.read())
+
+    return import_ms, first_result * 1000, total * 1000, proc.returncode
+
+def benchmark(runs=5, cases=CASES):
+    """
+    Run every case `runs` times and report medians
+
+    Returns:
+        Report dict keyed by case name
+    """
+    results = {}
+
+    for name, script, args in cases:
+        samples = [run_case(script, args) for _ in range(runs)]
+        results[name] = {
+            'importMs': round(statistics.median(s[0] for s in samples), 1),
+            'firstResultMs': round(statistics.median(s[1] for s in samples), 1),
+            'totalMs': round(statistics.median(s[2] for s in samples), 1),
+            'exitCode': samples[-1][3]
+        }
+        print(f"{name}: import {results[name]['importMs']}ms, "
+              f"first result {results[name]['firstResultMs']}ms", file=sys.stderr)
+
+    return {
+        'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'results': results
+    }
+
+def compare(report, baseline, tolerance=0.2, min_delta_ms=50):
+    """
+    Cases whose first-result time regressed beyond tolerance
+
+    A regression must be both `tolerance` slower (relative) and at least
+    `min_delta_ms` slower (absolute), so process-launch jitter is ignored.
+    """
+    regressions = []
+
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        delta = result['firstResultMs'] - before['firstResultMs']
+        if delta > min_delta_ms and delta > before['firstResultMs'] * tolerance:
+            regressions.append({
+                'case': name,
+                'baselineMs': before['firstResultMs'],
+                'currentMs': result['firstResultMs'],
+                'importMs': result['importMs'],
+                'baselineImportMs': before['importMs']
+            })
+
+    return regressions
+
+def main():
+    """
+    CLI interface
+
+    benchmark-startup.py [runs] [--output report.json] [--baseline report.json]
+    Exits 1 if any command's first-result time regressed against the baseline.
+    """
+    try:
+        args = sys.argv[1:]
+        output = None
+        baseline_path = None
+
+        if '--output' in args:
+            i = args.index('--output')
+            output = args[i + 1]
+            del args[i:i + 2]
+        if '--baseline' in args:
+            i = args.index('--baseline')
+            baseline_path = args[i + 1]
+            del args[i:i + 2]
+
+        runs = int(args[0]) if args else 5
+        report = benchmark(runs)
+
+        if baseline_path:
+            with open(baseline_path) as f:
+                report['regressions'] = compare(report, json.load(f))
+
+        if output:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        print(json.dumps(dict(success=True, **report)))
+        sys.exit(1 if report.get('regressions') else 0)
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
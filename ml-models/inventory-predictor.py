@@ -5,20 +5,173 @@ Predicts product velocity and optimizes stocking decisions
 """
 
 import sys
+import os
+import csv
 import json
+import time
+import zlib
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
-from sklearn.preprocessing import LabelEncoder
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+# Velocity classes, indexed by the codes predict_velocity_batch returns
+VELOCITY_LABELS = np.array(['slow', 'medium', 'fast'])
+VELOCITY_CONFIDENCE = np.array([0.70, 0.75, 0.85])
+
+FAST_CATEGORIES = ['electronics', 'clothing', 'accessories']
+
+# Rows per chunk when reading product files
+PRODUCT_CHUNK = 50000
+
+PRODUCT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+# Trained days-to-sell model written by the train command
+DAYS_MODEL_PATH = os.environ.get(
+    'INVENTORY_DAYS_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'days-to-sell-model.joblib')
+)
+DAYS_MODEL_FORMAT = 1
+
+# Columns of the _extract_features matrix
+FEATURE_NAMES = ['category', 'condition', 'price', 'ageInDays', 'viewCount']
+
+CONDITION_CODES = {'new': 5, 'like-new': 4, 'good': 3, 'fair': 2, 'poor': 1}
+
+# Fallback days-to-sell (middle of the old per-velocity ranges) and confidence
+# when no trained model exists, indexed by velocity code
+VELOCITY_DAYS = np.array([60, 18, 4])
+VELOCITY_DAYS_CONFIDENCE = np.array([0.60, 0.70, 0.80])
+
+# Monte Carlo stocking simulation defaults
+SERVICE_LEVEL = 0.95
+SIMULATIONS = 2000
+# Combinations simulated per block, bounding memory to block x simulations floats
+SIMULATION_BLOCK = 2000
+
+def _number(value):
+    """Numeric field value, treating missing/null/empty as 0"""
+    return float(value) if value not in (None, '') else 0.0
+
+def _parse_id(value):
+    """
+    Ids from CSV arrive as strings; turn canonical integers back into ints
+
+    Only strings that round-trip exactly ("42", not "007" or "+42") are
+    converted, so zero-padded SKUs stay strings.
+    """
+    if isinstance(value, str):
+        try:
+            number = int(value)
+        except ValueError:
+            return value
+        return number if str(number) == value else value
+    return value
+
+def products_to_columns(products, parse_ids=False):
+    """
+    Convert a list of product dicts into columnar NumPy arrays
+    
+    Args:
+        products: List of product dicts
+        parse_ids: Turn integer string ids into ints (for rows read from
+            CSV); ids from JSON, NDJSON and Parquet are kept as given
+    
+    Returns:
+        Dict of aligned arrays: id, category (lowercased), condition,
+        price, ageInDays, viewCount, status, daysToSell
+    """
+    n = len(products)
+    return {
+        'id': [_parse_id(p.get('id')) for p in products] if parse_ids else [p.get('id') for p in products],
+        'category': np.array([str(p.get('category') or '').lower() for p in products], dtype=object),
+        'condition': np.array([p.get('condition') for p in products], dtype=object),
+        'price': np.fromiter((_number(p.get('price')) for p in products), dtype=np.float64, count=n),
+        'ageInDays': np.fromiter((_number(p.get('ageInDays')) for p in products), dtype=np.float64, count=n),
+        'viewCount': np.fromiter((_number(p.get('viewCount')) for p in products), dtype=np.float64, count=n),
+        'status': np.array([p.get('status') for p in products], dtype=object),
+        'daysToSell': np.fromiter((_number(p.get('daysToSell')) for p in products), dtype=np.float64, count=n)
+    }
+
+def _iter_rows(source, fmt):
+    """Stream product dicts from a CSV or NDJSON file ('-' for stdin)"""
+    f = sys.stdin if source == '-' else open(source, newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def iter_product_chunks(source, fmt=None, chunk_size=PRODUCT_CHUNK):
+    """
+    Stream a product file as fixed-size column chunks
+    
+    Args:
+        source: File path, or '-' for stdin
+        fmt: 'csv', 'ndjson' or 'parquet' (default: from the file extension, else ndjson)
+        chunk_size: Products per chunk
+    
+    Yields:
+        Column dicts from products_to_columns(), at most chunk_size rows each
+    """
+    if fmt is None:
+        ext = str(source).lower().rsplit('.', 1)[-1]
+        fmt = ext if ext in PRODUCT_FORMATS else 'ndjson'
+    if fmt not in PRODUCT_FORMATS:
+        raise ValueError(f'Unknown product format: {fmt}')
+    
+    if fmt == 'parquet':
+        if source == '-':
+            raise ValueError('Parquet input must be a file, not stdin')
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Parquet input requires pyarrow (pip install pyarrow)')
+        
+        parquet = pq.ParquetFile(source)
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            yield products_to_columns(batch.to_pylist())
+        return
+    
+    # Only CSV loses id types; NDJSON and Parquet ids are kept as written
+    parse_ids = fmt == 'csv'
+    chunk = []
+    for row in _iter_rows(source, fmt):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield products_to_columns(chunk, parse_ids=parse_ids)
+            chunk = []
+    if chunk:
+        yield products_to_columns(chunk, parse_ids=parse_ids)
+
+def concat_columns(chunks):
+    """Join column chunks (e.g. from iter_product_chunks()) into one set of columns"""
+    chunks = list(chunks)
+    if not chunks:
+        return products_to_columns([])
+    return {
+        key: sum((c[key] for c in chunks), []) if key == 'id' else np.concatenate([c[key] for c in chunks])
+        for key in chunks[0]
+    }
+
+def read_products(value, fmt=None, chunk_size=PRODUCT_CHUNK):
+    """Product columns from an inline JSON list or a product file"""
+    if is_json_arg(value):
+        return products_to_columns(json.loads(value))
+    return concat_columns(iter_product_chunks(value, fmt, chunk_size))
+
 class InventoryPredictor:
     def __init__(self):
         self.velocity_classifier = None
         self.demand_regressor = None
-        self.category_encoder = LabelEncoder()
-        self.condition_encoder = LabelEncoder()
+        self.days_model = None
+        self.days_model_path = DAYS_MODEL_PATH
         
     def predict_velocity(self, product_data):
         """
@@ -31,49 +184,44 @@ class InventoryPredictor:
             velocity: 'fast', 'medium', or 'slow'
             confidence: 0-1 confidence score
         """
-        # Extract features
-        features = self._extract_features(product_data)
+        result = self.predict_velocity_batch(products_to_columns([product_data]))
+        return str(VELOCITY_LABELS[result['velocity'][0]]), float(result['confidence'][0])
+    
+    def predict_velocity_batch(self, columns):
+        """
+        Score velocity for a whole catalog at once
         
+        Args:
+            columns: Product columns from products_to_columns()
+        
+        Returns:
+            Dict of arrays: velocity (codes into VELOCITY_LABELS), score, confidence
+        """
         # Simple rule-based prediction (would use trained model in production)
-        score = 0
         
         # Category impact
-        fast_categories = ['electronics', 'clothing', 'accessories']
-        if product_data.get('category', '').lower() in fast_categories:
-            score += 3
+        score = np.where(np.isin(columns['category'], FAST_CATEGORIES), 3, 0)
         
         # Condition impact
-        if product_data.get('condition') in ['new', 'like-new']:
-            score += 2
-        elif product_data.get('condition') == 'good':
-            score += 1
+        condition = columns['condition']
+        score += np.where(np.isin(condition, ['new', 'like-new']), 2, np.where(condition == 'good', 1, 0))
         
         # Price impact (lower price = faster)
-        price = product_data.get('price', 0)
-        if price < 500:
-            score += 2
-        elif price < 1000:
-            score += 1
+        price = columns['price']
+        score += np.where(price < 500, 2, np.where(price < 1000, 1, 0))
         
         # Age impact
-        age_days = product_data.get('ageInDays', 0)
-        if age_days < 7:
-            score += 2
-        elif age_days < 30:
-            score += 1
+        age_days = columns['ageInDays']
+        score += np.where(age_days < 7, 2, np.where(age_days < 30, 1, 0))
         
         # Determine velocity
-        if score >= 6:
-            velocity = 'fast'
-            confidence = 0.85
-        elif score >= 3:
-            velocity = 'medium'
-            confidence = 0.75
-        else:
-            velocity = 'slow'
-            confidence = 0.70
+        velocity = np.where(score >= 6, 2, np.where(score >= 3, 1, 0)).astype(np.int8)
         
-        return velocity, confidence
+        return {
+            'velocity': velocity,
+            'score': score,
+            'confidence': VELOCITY_CONFIDENCE[velocity]
+        }
     
     def predict_days_to_sell(self, product_data):
         """
@@ -86,66 +234,171 @@ class InventoryPredictor:
             days: Estimated days to sell
             confidence: 0-1 confidence score
         """
-        velocity, _ = self.predict_velocity(product_data)
-        
-        # Base estimates by velocity
-        if velocity == 'fast':
-            days = np.random.randint(1, 7)
-            confidence = 0.80
-        elif velocity == 'medium':
-            days = np.random.randint(7, 30)
-            confidence = 0.70
-        else:
-            days = np.random.randint(30, 90)
-            confidence = 0.60
+        days, confidence = self.predict_days_batch(products_to_columns([product_data]))
+        return int(days[0]), float(confidence[0])
+    
+    def predict_days_batch(self, columns):
+        """
+        Predict days to sell for a batch of products
+        
+        Uses the trained model when one has been saved, otherwise a fixed
+        estimate per velocity class. Output is deterministic either way.
         
-        return int(days), confidence
+        Args:
+            columns: Product columns from products_to_columns()
+        
+        Returns:
+            days: Int array of estimated days to sell (at least 1)
+            confidence: Array of 0-1 confidence scores
+        """
+        velocity = self.predict_velocity_batch(columns)['velocity']
+        confidence = VELOCITY_DAYS_CONFIDENCE[velocity]
+        
+        model = self._load_days_model()
+        if model is None:
+            return VELOCITY_DAYS[velocity], confidence
+        
+        predicted = model['model'].predict(self._extract_feature_matrix(columns))
+        days = np.maximum(np.rint(predicted), 1).astype(np.int64)
+        return days, confidence
+    
+    def _load_days_model(self):
+        """Trained days-to-sell model, loaded once (None if not trained yet)"""
+        if self.days_model is None and os.path.exists(self.days_model_path):
+            # joblib (and sklearn behind the pickle) only once there is a model to load
+            import joblib
+            
+            self.days_model = joblib.load(self.days_model_path)
+            if self.days_model.get('format') != DAYS_MODEL_FORMAT:
+                raise ValueError(f"Unsupported days-to-sell model format: {self.days_model.get('format')}")
+        return self.days_model
+    
+    def train_days_to_sell(self, columns, path=None):
+        """
+        Fit the days-to-sell model on historical sell-through data
+        
+        Args:
+            columns: Product columns of sold products; rows without a
+                positive daysToSell are ignored
+            path: Where to save the model (default: DAYS_MODEL_PATH)
+        
+        Returns:
+            Training summary dict
+        """
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_absolute_error
+        import joblib
+        
+        sold = columns['daysToSell'] > 0
+        X = self._extract_feature_matrix(columns)[sold]
+        y = columns['daysToSell'][sold]
+        
+        if len(y) < 50:
+            raise ValueError('Insufficient training data (minimum 50 sold products required)')
+        
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        
+        # Days to sell is a positive count, so fit a Poisson loss; category
+        # is a hashed code rather than an ordered value
+        model = HistGradientBoostingRegressor(
+            loss='poisson',
+            max_iter=200,
+            learning_rate=0.1,
+            categorical_features=[FEATURE_NAMES.index('category')],
+            random_state=42
+        )
+        model.fit(X_train, y_train)
+        
+        mae = mean_absolute_error(y_test, model.predict(X_test))
+        
+        path = path or self.days_model_path
+        artifact = {
+            'format': DAYS_MODEL_FORMAT,
+            'model': model,
+            'features': FEATURE_NAMES,
+            'trainedAt': time.time(),
+            'samples': int(len(y)),
+            'mae': float(mae)
+        }
+        # Write then rename so a concurrent reader never sees a partial file
+        joblib.dump(artifact, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        
+        self.days_model_path = path
+        self.days_model = artifact
+        
+        return {
+            'trainingSamples': len(y_train),
+            'testSamples': len(y_test),
+            'mae': round(float(mae), 2),
+            'modelPath': path
+        }
     
     def identify_dead_stock(self, products, threshold_days=60):
         """
         Identify products likely to become dead stock
         
         Args:
-            products: List of product dicts
+            products: List of product dicts (or columns from products_to_columns())
             threshold_days: Days threshold for dead stock
         
         Returns:
             List of product IDs at risk
         """
-        at_risk = []
+        columns = products if isinstance(products, dict) else products_to_columns(products)
+        velocity = self.predict_velocity_batch(columns)['velocity']
+        age_days = columns['ageInDays']
         
-        for product in products:
-            age_days = product.get('ageInDays', 0)
-            velocity, _ = self.predict_velocity(product)
-            
-            # Check if product is old and slow-moving
-            if age_days > threshold_days and velocity == 'slow':
-                at_risk.append({
-                    'productId': product.get('id'),
-                    'ageInDays': age_days,
-                    'velocity': velocity,
-                    'recommendation': 'markdown_price'
-                })
-            elif age_days > threshold_days * 0.7 and velocity == 'slow':
-                at_risk.append({
-                    'productId': product.get('id'),
-                    'ageInDays': age_days,
-                    'velocity': velocity,
-                    'recommendation': 'promote'
-                })
+        # Old and slow-moving products get marked down; nearly-old ones promoted
+        slow = velocity == 0
+        markdown = slow & (age_days > threshold_days)
+        promote = slow & ~markdown & (age_days > threshold_days * 0.7)
+        
+        at_risk = []
+        for idx in np.flatnonzero(markdown | promote):
+            age = age_days[idx]
+            at_risk.append({
+                'productId': columns['id'][idx],
+                'ageInDays': int(age) if age.is_integer() else float(age),
+                'velocity': 'slow',
+                'recommendation': 'markdown_price' if markdown[idx] else 'promote'
+            })
         
         return at_risk
     
-    def optimize_stocking(self, category_data):
+    def iter_dead_stock(self, chunks, threshold_days=60):
+        """
+        Stream at-risk products from a stream of product column chunks
+        
+        Args:
+            chunks: Iterable of column dicts (e.g. from iter_product_chunks())
+            threshold_days: Days threshold for dead stock
+        
+        Yields:
+            (products in chunk, at-risk list for chunk)
+        """
+        for columns in chunks:
+            yield len(columns['id']), self.identify_dead_stock(columns, threshold_days)
+    
+    def optimize_stocking(self, category_data, mode='fixed', **simulation_options):
         """
         Recommend optimal stocking levels by category
         
         Args:
             category_data: Dict with category sales history
+            mode: 'fixed' (week of safety stock, two-week orders) or
+                'simulate' (see simulate_stocking)
+            simulation_options: Passed to simulate_stocking
         
         Returns:
             Stocking recommendations
         """
+        if mode == 'simulate':
+            return self.simulate_stocking(category_data, **simulation_options)
+        if mode != 'fixed':
+            raise ValueError(f'Unknown stocking mode: {mode}')
+        
         recommendations = {}
         
         for category, data in category_data.items():
@@ -173,6 +426,107 @@ class InventoryPredictor:
         
         return recommendations
     
+    def simulate_stocking(self, category_data, service_level=SERVICE_LEVEL, simulations=SIMULATIONS, seed=0):
+        """
+        Service-level stocking levels from simulated lead-time demand
+        
+        For every key (a category, or any category x location combination)
+        samples the lead time from a gamma distribution and the demand over
+        that lead time from a normal distribution with mean and variance
+        scaled by the lead time. The reorder point is the service_level
+        quantile of lead-time demand. All keys are simulated together in
+        NumPy, a block at a time.
+        
+        Per-key fields, beyond avgDailySales/currentStock/leadTimeDays:
+            demandStdDev: Daily demand standard deviation (default sqrt(avgDailySales))
+            leadTimeStdDev: Lead time standard deviation in days (default 0)
+            reviewDays: Days of demand per order (default 14)
+            orderCost, holdingCost: Per-order and per-unit-per-year costs;
+                when both are set the order quantity is the EOQ
+        
+        Args:
+            category_data: Dict with category sales history
+            service_level: Probability of not stocking out during a lead time
+            simulations: Samples per key
+            seed: Random seed, so results are reproducible
+        
+        Returns:
+            Stocking recommendations, with serviceLevel and stockoutRisk
+            (simulated chance current stock runs out within a lead time)
+        """
+        if not 0 < service_level < 1:
+            raise ValueError('service_level must be between 0 and 1')
+        if simulations < 1:
+            raise ValueError('simulations must be at least 1')
+        
+        keys = list(category_data)
+        values = list(category_data.values())
+        n = len(keys)
+        
+        def column(field, default):
+            return np.fromiter((_number(v.get(field, default)) for v in values), dtype=np.float64, count=n)
+        
+        daily = column('avgDailySales', 0)
+        stock = column('currentStock', 0)
+        lead = np.maximum(column('leadTimeDays', 7), 0)
+        daily_std = np.fromiter(
+            (_number(v['demandStdDev']) if v.get('demandStdDev') is not None else np.sqrt(max(d, 0))
+             for v, d in zip(values, daily)),
+            dtype=np.float64, count=n
+        )
+        lead_std = column('leadTimeStdDev', 0)
+        review_days = column('reviewDays', 14)
+        order_cost = column('orderCost', 0)
+        holding_cost = column('holdingCost', 0)
+        
+        rng = np.random.default_rng(seed)
+        reorder_point = np.empty(n)
+        stockout_risk = np.empty(n)
+        
+        for start in range(0, n, SIMULATION_BLOCK):
+            rows = slice(start, min(start + SIMULATION_BLOCK, n))
+            block = rows.stop - rows.start
+            
+            # Lead times: gamma with the given mean and std for keys that
+            # have a std, fixed otherwise
+            lead_times = np.broadcast_to(lead[rows, None], (block, simulations)).astype(np.float32)
+            variable = np.flatnonzero((lead_std[rows] > 0) & (lead[rows] > 0))
+            if len(variable):
+                mean_lead = lead[rows][variable, None]
+                shape = (mean_lead / lead_std[rows][variable, None]) ** 2
+                lead_times[variable] = rng.standard_gamma(shape, (len(variable), simulations)) * (mean_lead / shape)
+            
+            # Sum of lead_times days of demand, each with the daily mean and std
+            demand = rng.standard_normal((block, simulations), dtype=np.float32)
+            demand *= daily_std[rows, None].astype(np.float32) * np.sqrt(lead_times)
+            demand += daily[rows, None].astype(np.float32) * lead_times
+            np.maximum(demand, 0, out=demand)
+            
+            reorder_point[rows] = np.quantile(demand, service_level, axis=1)
+            stockout_risk[rows] = (demand > stock[rows, None]).mean(axis=1)
+        
+        safety_stock = np.maximum(reorder_point - daily * lead, 0)
+        
+        # Economic order quantity where costs are known, otherwise reviewDays of demand
+        eoq = np.sqrt(2 * daily * 365 * order_cost / np.where(holding_cost > 0, holding_cost, 1))
+        optimal_quantity = np.where((order_cost > 0) & (holding_cost > 0), eoq, daily * review_days)
+        
+        recommendations = {}
+        for i, key in enumerate(keys):
+            low = stock[i] < reorder_point[i]
+            recommendations[key] = {
+                'currentStock': values[i].get('currentStock', 0),
+                'safetyStock': int(np.ceil(safety_stock[i])),
+                'reorderPoint': int(np.ceil(reorder_point[i])),
+                'optimalQuantity': int(np.ceil(optimal_quantity[i])),
+                'serviceLevel': service_level,
+                'stockoutRisk': round(float(stockout_risk[i]), 4),
+                'status': 'low' if low else 'adequate',
+                'action': 'reorder' if low else 'none'
+            }
+        
+        return recommendations
+    
     def predict_seasonal_demand(self, category, month):
         """
         Predict seasonal demand multiplier
@@ -215,15 +569,47 @@ class InventoryPredictor:
         Calculate inventory turnover rate
         
         Args:
-            products: List of products with sales data
+            products: List of products with sales data (or columns from products_to_columns())
         
         Returns:
             Turnover metrics
         """
-        total_products = len(products)
-        sold_products = sum(1 for p in products if p.get('status') == 'sold')
+        columns = products if isinstance(products, dict) else products_to_columns(products)
+        return self._turnover_metrics(self._turnover_totals(columns))
+    
+    def turnover_report(self, chunks):
+        """
+        Turnover metrics over a stream of product column chunks
+        
+        Args:
+            chunks: Iterable of column dicts (e.g. from iter_product_chunks())
+        
+        Returns:
+            Turnover metrics, identical to calculate_turnover_rate() on the whole catalog
+        """
+        totals = dict.fromkeys(('total', 'sold', 'daysSum', 'daysCount', 'fast', 'slow'), 0)
+        for columns in chunks:
+            for key, count in self._turnover_totals(columns).items():
+                totals[key] += count
+        return self._turnover_metrics(totals)
+    
+    def _turnover_totals(self, columns):
+        """Additive per-chunk counts behind the turnover metrics"""
+        days_to_sell = columns['daysToSell'][columns['daysToSell'] != 0]
+        velocity = self.predict_velocity_batch(columns)['velocity']
         
-        if total_products == 0:
+        return {
+            'total': len(columns['id']),
+            'sold': int(np.count_nonzero(columns['status'] == 'sold')),
+            'daysSum': float(days_to_sell.sum()),
+            'daysCount': len(days_to_sell),
+            'fast': int(np.count_nonzero(velocity == 2)),
+            'slow': int(np.count_nonzero(velocity == 0))
+        }
+    
+    def _turnover_metrics(self, totals):
+        """Turnover metrics from accumulated counts"""
+        if totals['total'] == 0:
             return {
                 'turnoverRate': 0,
                 'avgDaysToSell': 0,
@@ -232,46 +618,83 @@ class InventoryPredictor:
             }
         
         # Calculate average days to sell
-        days_to_sell = [p.get('daysToSell', 0) for p in products if p.get('daysToSell')]
-        avg_days = np.mean(days_to_sell) if days_to_sell else 0
-        
-        # Classify products
-        fast_movers = sum(1 for p in products if self.predict_velocity(p)[0] == 'fast')
-        slow_movers = sum(1 for p in products if self.predict_velocity(p)[0] == 'slow')
+        avg_days = totals['daysSum'] / totals['daysCount'] if totals['daysCount'] else 0
         
         return {
-            'turnoverRate': round(sold_products / total_products, 2),
+            'turnoverRate': round(totals['sold'] / totals['total'], 2),
             'avgDaysToSell': int(avg_days),
-            'fastMovers': fast_movers,
-            'slowMovers': slow_movers,
-            'totalProducts': total_products
+            'fastMovers': totals['fast'],
+            'slowMovers': totals['slow'],
+            'totalProducts': totals['total']
         }
     
     def _extract_features(self, product_data):
         """Extract numerical features from product data"""
-        features = []
-        
-        # Category (encoded)
-        category = product_data.get('category', 'other')
-        features.append(hash(category) % 100)
-        
-        # Condition (encoded)
-        condition_map = {'new': 5, 'like-new': 4, 'good': 3, 'fair': 2, 'poor': 1}
-        features.append(condition_map.get(product_data.get('condition', 'good'), 3))
+        return self._extract_feature_matrix(products_to_columns([product_data]))[0].tolist()
+    
+    def _extract_feature_matrix(self, columns):
+        """Feature matrix (one row per product, FEATURE_NAMES order) from product columns"""
+        n = len(columns['id'])
+        features = np.empty((n, len(FEATURE_NAMES)), dtype=np.float64)
+        
+        # Category (encoded); crc32 rather than hash() so codes are stable across processes
+        categories, inverse = np.unique(columns['category'], return_inverse=True)
+        codes = np.array([zlib.crc32((c or 'other').encode()) % 100 for c in categories])
+        features[:, 0] = codes[inverse]
+        
+        # Condition (encoded), unknown or missing counts as good
+        condition = np.full(n, CONDITION_CODES['good'], dtype=np.float64)
+        for name, code in CONDITION_CODES.items():
+            condition[columns['condition'] == name] = code
+        features[:, 1] = condition
         
         # Price (normalized)
-        features.append(min(product_data.get('price', 0) / 10000, 1.0))
+        features[:, 2] = np.minimum(columns['price'] / 10000, 1.0)
         
         # Age
-        features.append(product_data.get('ageInDays', 0))
+        features[:, 3] = columns['ageInDays']
         
         # Views (if available)
-        features.append(product_data.get('viewCount', 0))
+        features[:, 4] = columns['viewCount']
         
         return features
 
+def pop_option(args, name, default=None):
+    """Remove `--name value` from args and return value"""
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+def is_json_arg(value):
+    """Whether a positional argument is inline JSON data rather than a path"""
+    return value.lstrip()[:1] in ('[', '{')
+
 def main():
-    """CLI interface"""
+    """
+    CLI interface
+    
+    predict_velocity <product>
+    predict_days <product | [products] | products file> [--model PATH]
+    train <history> [--model PATH]
+    dead_stock <products> [threshold_days]
+    optimize_stocking <category_data> [--mode fixed|simulate] [--service-level P] [--simulations N] [--seed N]
+    turnover <products>
+    
+    <products> for dead_stock and turnover is inline JSON, or a path to a
+    CSV/NDJSON/Parquet product file ('-' for stdin) read in chunks with
+    [--format csv|ndjson|parquet] [--chunk-size N]. For file input,
+    dead_stock writes one JSON line per at-risk product as each chunk is
+    scored, followed by a summary line with success and counts; so does
+    predict_days for a file, one line per product.
+    
+    train fits the days-to-sell model on <history> (inline JSON or a
+    product file, as above) of sold products with daysToSell, and saves it
+    to --model (default INVENTORY_DAYS_MODEL or days-to-sell-model.joblib
+    next to this script). predict_days uses it once it exists.
+    """
     try:
         if len(sys.argv) < 2:
             print(json.dumps({
@@ -281,10 +704,14 @@ def main():
             sys.exit(1)
         
         command = sys.argv[1]
+        args = sys.argv[2:]
+        fmt = pop_option(args, '--format')
+        chunk_size = int(pop_option(args, '--chunk-size', PRODUCT_CHUNK))
         predictor = InventoryPredictor()
+        predictor.days_model_path = pop_option(args, '--model', DAYS_MODEL_PATH)
         
         if command == 'predict_velocity':
-            product_data = json.loads(sys.argv[2])
+            product_data = json.loads(args[0])
             velocity, confidence = predictor.predict_velocity(product_data)
             
             print(json.dumps({
@@ -294,29 +721,94 @@ def main():
             }))
             
         elif command == 'predict_days':
-            product_data = json.loads(sys.argv[2])
-            days, confidence = predictor.predict_days_to_sell(product_data)
+            if args[0].lstrip().startswith('{'):
+                product_data = json.loads(args[0])
+                days, confidence = predictor.predict_days_to_sell(product_data)
+                
+                print(json.dumps({
+                    'success': True,
+                    'daysToSell': days,
+                    'confidence': confidence
+                }))
+            elif is_json_arg(args[0]):
+                columns = products_to_columns(json.loads(args[0]))
+                days, confidence = predictor.predict_days_batch(columns)
+                
+                print(json.dumps({
+                    'success': True,
+                    'predictions': [
+                        {'productId': product_id, 'daysToSell': int(d), 'confidence': float(c)}
+                        for product_id, d, c in zip(columns['id'], days, confidence)
+                    ]
+                }))
+            else:
+                # Stream predictions as NDJSON, one chunk at a time
+                total = 0
+                for columns in iter_product_chunks(args[0], fmt, chunk_size):
+                    days, confidence = predictor.predict_days_batch(columns)
+                    for product_id, d, c in zip(columns['id'], days, confidence):
+                        sys.stdout.write(json.dumps({
+                            'productId': product_id, 'daysToSell': int(d), 'confidence': float(c)
+                        }) + '\n')
+                    sys.stdout.flush()
+                    total += len(days)
+                
+                print(json.dumps({
+                    'success': True,
+                    'totalProducts': total
+                }))
             
-            print(json.dumps({
-                'success': True,
-                'daysToSell': days,
-                'confidence': confidence
-            }))
+        elif command == 'train':
+            result = predictor.train_days_to_sell(read_products(args[0], fmt, chunk_size))
+            
+            print(json.dumps(dict(success=True, **result)))
             
         elif command == 'dead_stock':
-            products = json.loads(sys.argv[2])
-            threshold = int(sys.argv[3]) if len(sys.argv) > 3 else 60
-            at_risk = predictor.identify_dead_stock(products, threshold)
+            threshold = int(args[1]) if len(args) > 1 else 60
             
-            print(json.dumps({
-                'success': True,
-                'atRisk': at_risk,
-                'count': len(at_risk)
-            }))
+            if is_json_arg(args[0]):
+                products = json.loads(args[0])
+                at_risk = predictor.identify_dead_stock(products, threshold)
+                
+                print(json.dumps({
+                    'success': True,
+                    'atRisk': at_risk,
+                    'count': len(at_risk)
+                }))
+            else:
+                # Stream at-risk products as NDJSON, one chunk at a time
+                chunks = iter_product_chunks(args[0], fmt, chunk_size)
+                total = 0
+                count = 0
+                for n_products, at_risk in predictor.iter_dead_stock(chunks, threshold):
+                    for product in at_risk:
+                        sys.stdout.write(json.dumps(product) + '\n')
+                    sys.stdout.flush()
+                    total += n_products
+                    count += len(at_risk)
+                
+                print(json.dumps({
+                    'success': True,
+                    'count': count,
+                    'totalProducts': total
+                }))
             
         elif command == 'optimize_stocking':
-            category_data = json.loads(sys.argv[2])
-            recommendations = predictor.optimize_stocking(category_data)
+            mode = pop_option(args, '--mode', 'fixed')
+            options = {}
+            if mode == 'simulate':
+                options = {
+                    'service_level': float(pop_option(args, '--service-level', SERVICE_LEVEL)),
+                    'simulations': int(pop_option(args, '--simulations', SIMULATIONS)),
+                    'seed': int(pop_option(args, '--seed', 0))
+                }
+            
+            if is_json_arg(args[0]):
+                category_data = json.loads(args[0])
+            else:
+                with open(args[0]) as f:
+                    category_data = json.load(f)
+            recommendations = predictor.optimize_stocking(category_data, mode, **options)
             
             print(json.dumps({
                 'success': True,
@@ -324,8 +816,10 @@ def main():
             }))
             
         elif command == 'turnover':
-            products = json.loads(sys.argv[2])
-            metrics = predictor.calculate_turnover_rate(products)
+            if is_json_arg(args[0]):
+                metrics = predictor.calculate_turnover_rate(json.loads(args[0]))
+            else:
+                metrics = predictor.turnover_report(iter_product_chunks(args[0], fmt, chunk_size))
             
             print(json.dumps({
                 'success': True,
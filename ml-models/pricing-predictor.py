@@ -7,86 +7,404 @@ Uses trained model to predict optimal pricing adjustments in real-time
 import sys
 import json
 import numpy as np
-import pandas as pd
-import joblib
 import os
+import io
+import time
+import signal
+import socketserver
+import threading
+import warnings
 
-def predict_price_adjustment(factors):
-    """Predict optimal price adjustment factor"""
+# Model is fitted on a DataFrame but scored with a plain array in FEATURE_COLUMNS order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+# Must match feature_cols in train-pricing-model.py
+FEATURE_COLUMNS = [
+    'category_encoded',
+    'condition_encoded',
+    'brand_encoded',
+    'originalPrice',
+    'sevaTokens',
+    'soldInDays',
+    'viewCount',
+    'seasonalityScore',
+    'demand_indicator'
+]
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'pricing-model.joblib')
+# Only read for models trained before encoders were bundled into MODEL_PATH
+ENCODERS_PATH = os.path.join(os.path.dirname(__file__), 'label-encoders.joblib')
+MODEL_FORMAT = 1
+
+class PricingModel:
+    """
+    Trained pricing model and label encoders, reloaded when retrained
     
-    try:
-        # Load trained model and encoders
-        model_path = os.path.join(os.path.dirname(__file__), 'pricing-model.joblib')
-        encoders_path = os.path.join(os.path.dirname(__file__), 'label-encoders.joblib')
+    train-pricing-model.py writes the model and its encoders as one bundle
+    replaced with a single rename, so a reload always gets a matching
+    pair. A model file holding only the estimator (the older two-file
+    layout) is paired with the separate encoders file.
+    """
+    
+    def __init__(self, model_path=MODEL_PATH, encoders_path=ENCODERS_PATH):
+        self.model_path = model_path
+        self.encoders_path = encoders_path
+        self.model = None
+        self.labels = {}
+        self.signature = None
+        self.failed_signature = None
+        self.last_error = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.lock = threading.Lock()
+    
+    def _signature(self):
+        """(mtime, size) of the model file, or None if it does not exist"""
+        try:
+            stat = os.stat(self.model_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def refresh(self, force=False):
+        """
+        Load the model if it changed on disk since the last load
         
-        if not os.path.exists(model_path):
-            return {
-                'adjustmentFactor': 1.0,
-                'confidence': 0.0,
-                'message': 'Model not trained yet'
-            }
+        A model that has been removed keeps being served. A model file that
+        fails to load is not retried until it changes again (or force is set),
+        so a corrupt artifact costs one failed load, not one per request.
         
-        model = joblib.load(model_path)
-        label_encoders = joblib.load(encoders_path)
+        Args:
+            force: Reload even if the file looks unchanged or failed before
         
-        # Prepare features
-        category_encoded = label_encoders['category'].transform([factors.get('category', 'clothing')])[0]
-        condition_encoded = label_encoders['condition'].transform([factors.get('condition', 'good')])[0]
-        brand_encoded = 0  # Default for unknown brands
+        Returns:
+            True if a model was (re)loaded
+        """
+        signature = self._signature()
+        if signature is None:
+            return False
+        if not force and signature in (self.signature, self.failed_signature):
+            return False
         
-        try:
-            brand_encoded = label_encoders['brand'].transform([factors.get('brand', 'Unknown')])[0]
-        except:
-            pass  # Use default if brand not in training data
+        with self.lock:
+            if not force and signature in (self.signature, self.failed_signature):
+                return False
+            
+            # joblib (and sklearn behind the pickle) only once there is a model to load
+            import joblib
+            
+            try:
+                model = joblib.load(self.model_path)
+                if isinstance(model, dict):
+                    if model.get('format') != MODEL_FORMAT:
+                        raise ValueError(f"Unsupported pricing model format: {model.get('format')}")
+                    model, label_encoders = model['model'], model['labelEncoders']
+                else:
+                    label_encoders = joblib.load(self.encoders_path)
+            except Exception as e:
+                self.failed_signature = signature
+                self.last_error = str(e)
+                raise
+            self.failed_signature = None
+            self.last_error = None
+            
+            if self.model is not None:
+                self.reloads += 1
+            # Swap in one assignment so concurrent predictions see old or new, never a mix
+            self.model, self.labels = model, {
+                col: {label: i for i, label in enumerate(encoder.classes_)}
+                for col, encoder in label_encoders.items()
+            }
+            self.signature = signature
+            self.loaded_at = time.time()
+            return True
+    
+    def status(self):
+        return {
+            'modelLoaded': self.model is not None,
+            'modelPath': self.model_path,
+            'modelMtime': self.signature[0] / 1e9 if self.signature else None,
+            'loadedAt': self.loaded_at,
+            'reloads': self.reloads,
+            'lastError': self.last_error
+        }
+    
+    def _features(self, labels, factors):
+        """Feature row in FEATURE_COLUMNS order for one set of pricing factors"""
+        category = factors.get('category', 'clothing')
+        condition = factors.get('condition', 'good')
+        if category not in labels['category']:
+            raise ValueError(f'Unknown category: {category}')
+        if condition not in labels['condition']:
+            raise ValueError(f'Unknown condition: {condition}')
         
         # Calculate derived features
         view_count = factors.get('viewCount', 0)
         age_in_days = factors.get('ageInDays', 1)
         demand_indicator = view_count / (age_in_days + 1)
         
-        # Create feature vector
-        features = pd.DataFrame([{
-            'category_encoded': category_encoded,
-            'condition_encoded': condition_encoded,
-            'brand_encoded': brand_encoded,
+        feature_values = {
+            'category_encoded': labels['category'][category],
+            'condition_encoded': labels['condition'][condition],
+            'brand_encoded': labels['brand'].get(factors.get('brand', 'Unknown'), 0),  # 0 for unknown brands
             'originalPrice': 100,  # Normalized base price
             'sevaTokens': 15,  # Default seva tokens
             'soldInDays': age_in_days,
             'viewCount': view_count,
             'seasonalityScore': factors.get('seasonalityScore', 0.5),
             'demand_indicator': demand_indicator
-        }])
+        }
+        return [feature_values[col] for col in FEATURE_COLUMNS]
+    
+    def predict_batch(self, factor_sets):
+        """
+        Predict price adjustments for many factor sets with one model call
         
-        # Predict price efficiency
-        prediction = model.predict(features)[0]
+        Args:
+            factor_sets: List of pricing factor dicts
         
-        # Convert price efficiency to adjustment factor
-        # Price efficiency of 1.0 means optimal, >1.0 means can increase, <1.0 means should decrease
-        adjustment_factor = float(prediction)
+        Returns:
+            List of result dicts, one per factor set; a factor set that
+            cannot be scored gets the default adjustment and an error
+        """
+        try:
+            self.refresh()
+        except Exception as e:
+            if self.model is None:
+                return [failed(e) for _ in factor_sets]
+            # Keep serving the previous model until the new one loads
+            print(f'Pricing model reload failed: {e}', file=sys.stderr)
         
-        # Clamp adjustment factor to reasonable range (0.7 to 1.3)
-        adjustment_factor = max(0.7, min(1.3, adjustment_factor))
+        model, labels = self.model, self.labels
+        if model is None and self.last_error is not None:
+            # The model on disk failed to load and is not retried until it changes
+            return [failed(self.last_error) for _ in factor_sets]
+        if model is None:
+            return [{
+                'adjustmentFactor': 1.0,
+                'confidence': 0.0,
+                'message': 'Model not trained yet'
+            } for _ in factor_sets]
         
-        # Calculate confidence based on model certainty
-        # Use prediction variance from ensemble
-        confidence = 0.75  # Placeholder - would calculate from model variance
+        results = [None] * len(factor_sets)
+        rows = []
+        positions = []
+        for i, factors in enumerate(factor_sets):
+            try:
+                rows.append(self._features(labels, factors))
+                positions.append(i)
+            except Exception as e:
+                results[i] = failed(e)
         
-        return {
-            'adjustmentFactor': adjustment_factor,
-            'confidence': confidence,
-            'prediction': float(prediction),
-            'message': 'ML prediction successful'
-        }
+        if rows:
+            # Predict price efficiency
+            try:
+                predictions = model.predict(np.array(rows, dtype=np.float64))
+            except Exception as e:
+                predictions = None
+                for i in positions:
+                    results[i] = failed(e)
+            
+            if predictions is not None:
+                for i, prediction in zip(positions, predictions):
+                    # Price efficiency of 1.0 means optimal, >1.0 means can increase, <1.0 means should decrease
+                    # Clamp adjustment factor to reasonable range (0.7 to 1.3)
+                    adjustment_factor = max(0.7, min(1.3, float(prediction)))
+                    
+                    results[i] = {
+                        'adjustmentFactor': adjustment_factor,
+                        'confidence': 0.75,  # Placeholder - would calculate from model variance
+                        'prediction': float(prediction),
+                        'message': 'ML prediction successful'
+                    }
         
-    except Exception as e:
-        return {
-            'adjustmentFactor': 1.0,
-            'confidence': 0.0,
-            'error': str(e),
-            'message': 'Prediction failed, using default'
+        return results
+
+def failed(error):
+    """Default-price result for a factor set that could not be scored"""
+    return {
+        'adjustmentFactor': 1.0,
+        'confidence': 0.0,
+        'error': str(error),
+        'message': 'Prediction failed, using default'
+    }
+
+def predict_price_adjustment(factors, pricing_model=None):
+    """Predict optimal price adjustment factor"""
+    return (pricing_model or PricingModel()).predict_batch([factors])[0]
+
+class PricingWorker:
+    """
+    Long-lived worker that keeps the pricing model loaded between requests
+    
+    Speaks newline-delimited JSON: each request line is
+    {"id": ..., "command": ..., ...params} and each response line echoes
+    the request id. "predict" takes "factors" (one factor set) and returns
+    its result fields; "predict_batch" takes a list of factor sets and
+    returns "results". Control commands are "health", "reload" (forces
+    a reload from disk) and "shutdown". The model is also reloaded on the
+    next prediction whenever pricing-model.joblib changes.
+    """
+    
+    def __init__(self, pricing_model=None):
+        self.pricing_model = pricing_model or PricingModel()
+        self.started_at = time.time()
+        self.requests_served = 0
+        self.shutting_down = False
+        # Predictions in progress, across socket connection threads
+        self.in_flight = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def busy(self):
+        return self.in_flight > 0
+    
+    def start(self):
+        """Load the model up front so the first request is not slow"""
+        try:
+            self.pricing_model.refresh()
+        except Exception as e:
+            print(f'Pricing model load failed: {e}', file=sys.stderr)
+    
+    def status(self):
+        status = {
+            'status': 'shutting_down' if self.shutting_down else 'ready',
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 3),
+            'requestsServed': self.requests_served
         }
+        status.update(self.pricing_model.status())
+        return status
+    
+    def handle_line(self, line):
+        """
+        Handle one request line
+        
+        Returns:
+            Response dict, or None for blank lines
+        """
+        line = line.strip()
+        if not line:
+            return None
+        
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+            
+            request_id = request.get('id')
+            command = request.get('command')
+            
+            if command == 'health':
+                response = {'success': True}
+                response.update(self.status())
+            elif command == 'shutdown':
+                self.shutting_down = True
+                response = {'success': True, 'status': 'shutting_down'}
+            elif command == 'reload':
+                reloaded = self.pricing_model.refresh(force=True)
+                response = dict(success=True, reloaded=reloaded, **self.pricing_model.status())
+            elif command in ('predict', 'predict_batch'):
+                with self.lock:
+                    self.in_flight += 1
+                try:
+                    if command == 'predict':
+                        response = dict(success=True, **self.pricing_model.predict_batch([request.get('factors') or {}])[0])
+                    else:
+                        factor_sets = request.get('factors')
+                        if not isinstance(factor_sets, list):
+                            raise ValueError('predict_batch requires a list of factors')
+                        response = {'success': True, 'results': self.pricing_model.predict_batch(factor_sets)}
+                finally:
+                    with self.lock:
+                        self.in_flight -= 1
+                        self.requests_served += 1
+            elif not command:
+                response = {'success': False, 'error': 'No command provided'}
+            else:
+                response = {'success': False, 'error': f'Unknown command: {command}'}
+        
+        except Exception as e:
+            response = {'success': False, 'error': str(e)}
+        
+        response['id'] = request_id
+        return response
+    
+    def serve_stream(self, infile, outfile):
+        """Serve requests from a line-oriented stream until EOF or shutdown"""
+        for line in infile:
+            response = self.handle_line(line)
+            if response is not None:
+                write_message(outfile, response)
+            if self.shutting_down:
+                break
+    
+    def serve_socket(self, socket_path):
+        """Serve requests over a Unix domain socket, one thread per connection"""
+        worker = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                reader = io.TextIOWrapper(self.rfile, encoding='utf-8')
+                writer = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                write_message(writer, dict(type='ready', **worker.status()))
+                worker.serve_stream(reader, writer)
+                if worker.shutting_down:
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+        
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+def write_message(outfile, message):
+    """Write one JSON message per line and flush immediately"""
+    outfile.write(json.dumps(message) + '\n')
+    outfile.flush()
+
+def serve(socket_path=None):
+    """Run the persistent worker on stdin/stdout or a Unix socket"""
+    worker = PricingWorker()
+    
+    def request_shutdown(signum, frame):
+        # Never cut a prediction short: with requests in flight, the
+        # connection that finishes last sees shutting_down and stops
+        worker.shutting_down = True
+        if not worker.busy:
+            raise KeyboardInterrupt
+    
+    signal.signal(signal.SIGTERM, request_shutdown)
+    
+    try:
+        worker.start()
+        
+        if socket_path:
+            print(f"Pricing worker listening on {socket_path}", file=sys.stderr)
+            worker.serve_socket(socket_path)
+        else:
+            write_message(sys.stdout, dict(type='ready', **worker.status()))
+            worker.serve_stream(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    
+    if not socket_path:
+        write_message(sys.stdout, {'type': 'shutdown', 'requestsServed': worker.requests_served})
 
 def main():
+    """
+    CLI interface
+    
+    pricing-predictor.py <factors>            one JSON factor set, or a JSON list of them
+    pricing-predictor.py serve [--socket PATH]
+    """
     try:
         # Read factors from command line argument
         if len(sys.argv) < 2:
@@ -97,15 +415,23 @@ def main():
             }))
             sys.exit(1)
         
+        if sys.argv[1] == 'serve':
+            args = sys.argv[2:]
+            serve(args[args.index('--socket') + 1] if '--socket' in args else None)
+            sys.exit(0)
+        
         factors = json.loads(sys.argv[1])
         
         # Get prediction
-        result = predict_price_adjustment(factors)
+        if isinstance(factors, list):
+            result = PricingModel().predict_batch(factors)
+        else:
+            result = predict_price_adjustment(factors)
         
         # Output result as JSON
         print(json.dumps(result))
         sys.exit(0)
-        
+    
     except Exception as e:
         print(json.dumps({
             'adjustmentFactor': 1.0,
@@ -5,21 +5,565 @@ Uses collaborative filtering + content-based filtering
 """
 
 import sys
+import os
 import json
+import time
+import shutil
+import csv
+import zlib
+import hashlib
+from datetime import datetime, timezone
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import TruncatedSVD
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
+# Trained model artifacts; each train writes a new version directory
+MODEL_DIR = os.environ.get(
+    'RECOMMENDATION_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recommendation-model')
+)
+ARTIFACT_FORMAT = 1
+KEEP_VERSIONS = 3
+
+# Collaborative trainer used by `train`: 'svd' (TruncatedSVD) or 'als' (implicit ALS)
+ALGORITHM = os.environ.get('RECOMMENDATION_ALGORITHM', 'svd')
+
+# Working-memory budget per ALS solver group (each worker thread holds one)
+ALS_GROUP_BYTES = 32 * 1024 * 1024
+
+# Neighbours kept per item in the precomputed content-based table
+NEIGHBOURS_K = int(os.environ.get('RECOMMENDATION_NEIGHBOURS', 50))
+
+# Encoded feature matrices for inline product lists, keyed by content digest
+FEATURE_CACHE_DIR = os.environ.get(
+    'RECOMMENDATION_FEATURE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'recommendation-features')
+)
+# Entries kept in the feature cache; least recently used ones are evicted beyond this
+FEATURE_CACHE_ENTRIES = int(os.environ.get('RECOMMENDATION_FEATURE_CACHE_ENTRIES', 32))
+
+# Streamed interaction events: weight per event type, records per parsed chunk
+DEFAULT_EVENT_WEIGHTS = {
+    'view': 1.0,
+    'click': 1.0,
+    'wishlist': 2.0,
+    'cart': 3.0,
+    'purchase': 5.0
+}
+INGEST_CHUNK = 100000
+
+# Users above which train builds an IVF index over user factors for similar-user lookup
+USER_INDEX_MIN_USERS = int(os.environ.get('RECOMMENDATION_USER_INDEX_MIN', 5000))
+USER_INDEX_PROBE = 8
+
+# Fold-in drift above which a full retrain is recommended
+RETRAIN_DRIFT = float(os.environ.get('RECOMMENDATION_RETRAIN_DRIFT', 0.1))
+
+def _top_k(scores, k):
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def _top_k_rows(scores, k):
+    """Per-row top-k column indices of a 2-D score block, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def _assign_clusters(data, centroids, chunk_size=65536):
+    """Nearest centroid for every row, computed in bounded-memory chunks"""
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk_size):
+        chunk = np.asarray(data[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def _kmeans(data, n_clusters, iterations=20, seed=42):
+    """
+    Spherical k-means over normalized vectors
+    
+    Args:
+        data: (n, d) float32 matrix of normalized vectors
+        n_clusters: Number of centroids
+        iterations: Lloyd iterations
+    
+    Returns:
+        (n_clusters, d) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    
+    for _ in range(iterations):
+        assignments = _assign_clusters(data, centroids)
+        
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[filled] = sums
+        
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        
+        centroids = _normalize_rows(centroids)
+    
+    return centroids
+
+def _last_per_cell(rows, cols, n_cols):
+    """Positions of the last entry for each (row, col) pair"""
+    keys = rows * n_cols + cols
+    _, last = np.unique(keys[::-1], return_index=True)
+    return len(keys) - 1 - last
+
+def _row_chunks(indptr, max_nnz):
+    """[start, end) row ranges holding about max_nnz stored entries each"""
+    n_rows = len(indptr) - 1
+    start = 0
+    while start < n_rows:
+        end = int(np.searchsorted(indptr, indptr[start] + max_nnz, side='right')) - 1
+        end = min(max(end, start + 1), n_rows)
+        yield start, end
+        start = end
+
+def _observed_scores(matrix, row_factors, col_factors, chunk_nnz=1 << 20):
+    """Predicted score x_u . y_i for every stored entry of a CSR matrix"""
+    scores = np.empty(matrix.nnz, dtype=np.float32)
+    for start, end in _row_chunks(matrix.indptr, chunk_nnz):
+        lo, hi = matrix.indptr[start], matrix.indptr[end]
+        rows = np.repeat(np.arange(start, end), np.diff(matrix.indptr[start:end + 1]))
+        scores[lo:hi] = np.einsum(
+            'ij,ij->i', np.asarray(row_factors[rows]), np.asarray(col_factors[matrix.indices[lo:hi]])
+        )
+    return scores
+
+def _als_solve(matrix, fixed, regularization, alpha, workers=1):
+    """
+    One implicit ALS half-step: solve every row's factors with the other side fixed
+    
+    Minimizes sum_i c_ui (p_ui - x_u . y_i)^2 + regularization * |x_u|^2 per
+    row, where p_ui = 1 for stored entries (0 elsewhere) and confidence
+    c_ui = 1 + alpha * r_ui (Hu, Koren & Volinsky 2008). Rows are sorted by
+    entry count and grouped, each group's neighbour factors are padded to a
+    (rows x longest row x k) block, and the normal equations are formed with
+    one batched matmul and solved with one batched np.linalg.solve. Groups
+    are spread over a thread pool.
+    
+    Args:
+        matrix: CSR matrix (rows to solve x fixed side)
+        fixed: Factors of the fixed side (n_cols x k)
+        regularization: L2 penalty
+        alpha: Confidence scale for interaction scores
+        workers: Solver threads
+    
+    Returns:
+        Row factors (n_rows x k, float32)
+    """
+    fixed = np.asarray(fixed, dtype=np.float32)
+    k = fixed.shape[1]
+    gram = fixed.T.astype(np.float64) @ fixed + regularization * np.eye(k)
+    factors = np.zeros((matrix.shape[0], k), dtype=np.float32)
+    
+    counts = np.diff(matrix.indptr)
+    rows = np.flatnonzero(counts)
+    rows = rows[np.argsort(counts[rows], kind='stable')]
+    
+    # Padded entries per group; the neighbour block is ~k * 4 bytes per entry
+    max_entries = 1 << 16
+    # Rows per group; each row's k x k float64 system (plus the matmul and
+    # solve temporaries) is ~3 * k * k * 8 bytes, held per worker thread
+    max_rows = max(1, ALS_GROUP_BYTES // (3 * k * k * 8))
+    groups = []
+    start = 0
+    while start < len(rows):
+        end = start + 1
+        while (end < len(rows) and end - start < max_rows
+               and (end + 1 - start) * counts[rows[end]] <= max_entries):
+            end += 1
+        groups.append(rows[start:end])
+        start = end
+    
+    def solve(group):
+        lengths = counts[group]
+        width = int(lengths[-1])
+        valid = np.arange(width)[None, :] < lengths[:, None]
+        positions = np.where(valid, matrix.indptr[group][:, None] + np.arange(width)[None, :], 0)
+        
+        neighbours = fixed[matrix.indices[positions]] * valid[..., None]
+        confidence = np.where(valid, alpha * matrix.data[positions], 0).astype(np.float32)
+        
+        # A_u = Y^T Y + Y_u^T (C_u - I) Y_u + lambda I,  b_u = Y_u^T C_u p_u
+        A = gram + np.matmul((neighbours * confidence[..., None]).transpose(0, 2, 1), neighbours)
+        b = (neighbours * (1 + confidence)[..., None]).sum(axis=1)
+        factors[group] = np.linalg.solve(A, b[..., None].astype(np.float64))[..., 0]
+    
+    if workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(solve, groups))
+    else:
+        for group in groups:
+            solve(group)
+    
+    return factors
+
+def _als_loss(matrix, user_factors, item_factors, regularization, alpha):
+    """
+    Implicit ALS objective per stored entry
+    
+    The all-cells term sum (x_u . y_i)^2 is tr(X^T X Y^T Y), so only stored
+    entries are visited individually.
+    """
+    observed = _observed_scores(matrix, user_factors, item_factors).astype(np.float64)
+    confidence = 1 + alpha * matrix.data.astype(np.float64)
+    
+    user_gram = user_factors.T.astype(np.float64) @ user_factors
+    item_gram = item_factors.T.astype(np.float64) @ item_factors
+    loss = float((user_gram * item_gram).sum())
+    loss += float((confidence * (1 - observed) ** 2 - observed ** 2).sum())
+    loss += regularization * float(np.trace(user_gram) + np.trace(item_gram))
+    return loss / max(matrix.nnz, 1)
+
+def _sparse_nbytes(matrix):
+    """Bytes held by a CSR/CSC matrix's data, index and pointer arrays"""
+    return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+
+class ItemFeatureEncoder:
+    """
+    Deterministic product feature encoder
+    
+    Columns are laid out as:
+        one-hot category over a fitted vocabulary
+        feature-hashing buckets for categories outside the vocabulary
+        condition score (0-1)
+        one-hot price bucket, weighted below category
+        normalized price (0-1, capped at 10000)
+    
+    The vocabulary is fitted once and persisted with the model, and unseen
+    categories hash with CRC32, so the same product encodes to the same
+    float32 row in every process.
+    """
+    
+    VERSION = 1
+    
+    CONDITIONS = {
+        'new': 5,
+        'like-new': 4,
+        'good': 3,
+        'fair': 2,
+        'poor': 1
+    }
+    
+    PRICE_EDGES = [250, 500, 1000, 2000, 5000, 10000]
+    PRICE_BUCKET_WEIGHT = 0.5
+    
+    def __init__(self, categories=None, hash_buckets=16):
+        self.categories = list(categories or [])
+        self.category_index = {c: idx for idx, c in enumerate(self.categories)}
+        self.hash_buckets = int(hash_buckets)
+    
+    @classmethod
+    def fit(cls, products, min_count=1, hash_buckets=16):
+        """
+        Build the category vocabulary from a product list
+        
+        Args:
+            products: List of product objects
+            min_count: Categories seen fewer times fall back to hashing
+            hash_buckets: Number of hashing buckets for unseen categories
+        """
+        counts = defaultdict(int)
+        for product in products:
+            if product.get('category') is not None:
+                counts[str(product['category'])] += 1
+        return cls(sorted(c for c, n in counts.items() if n >= min_count), hash_buckets)
+    
+    @property
+    def dimensions(self):
+        return len(self.categories) + self.hash_buckets + 1 + len(self.PRICE_EDGES) + 1 + 1
+    
+    def encode(self, products):
+        """
+        Encode products as a float32 matrix (len(products) x dimensions)
+        """
+        n_categories = len(self.categories)
+        condition_col = n_categories + self.hash_buckets
+        price_col = condition_col + 1
+        features = np.zeros((len(products), self.dimensions), dtype=np.float32)
+        
+        prices = np.empty(len(products), dtype=np.float32)
+        for row, product in enumerate(products):
+            category = product.get('category')
+            if category is not None:
+                category = str(category)
+                col = self.category_index.get(category)
+                if col is None and self.hash_buckets:
+                    col = n_categories + zlib.crc32(category.encode('utf-8')) % self.hash_buckets
+                if col is not None:
+                    features[row, col] = 1
+            
+            features[row, condition_col] = self.CONDITIONS.get(product.get('condition', 'good'), 3) / 5
+            prices[row] = product.get('price') or 0
+        
+        buckets = np.searchsorted(self.PRICE_EDGES, prices, side='right')
+        features[np.arange(len(products)), price_col + buckets] = self.PRICE_BUCKET_WEIGHT
+        features[:, -1] = np.minimum(prices / 10000, 1.0)
+        return features
+    
+    def to_dict(self):
+        return {
+            'version': self.VERSION,
+            'categories': self.categories,
+            'hashBuckets': self.hash_buckets,
+            'priceEdges': self.PRICE_EDGES
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != cls.VERSION or data.get('priceEdges', cls.PRICE_EDGES) != cls.PRICE_EDGES:
+            raise ValueError('Incompatible feature encoder; retrain the model')
+        return cls(data.get('categories'), data.get('hashBuckets', 16))
+
+def _id_order(value):
+    """Sort key for ids that may mix ints and strings (ints first)"""
+    return (isinstance(value, str), value)
+
+def _parse_id(value):
+    """Ids from CSV arrive as strings; keep numeric ids as ints"""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+def _parse_timestamp(value):
+    """Epoch seconds from epoch seconds/milliseconds or an ISO-8601 string (nan if absent)"""
+    if value is None or value == '':
+        return float('nan')
+    try:
+        number = float(value)
+        return number / 1000 if number > 1e11 else number
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def iter_interaction_records(source, fmt=None):
+    """
+    Stream interaction records from an NDJSON or CSV file
+    
+    Args:
+        source: File path, or '-' for stdin
+        fmt: 'ndjson' or 'csv' (default: from the file extension, else ndjson)
+    
+    Yields:
+        Dicts with userId, productId and optional score, eventType, timestamp
+    """
+    if fmt is None:
+        fmt = 'csv' if str(source).lower().endswith('.csv') else 'ndjson'
+    if fmt not in ('ndjson', 'csv'):
+        raise ValueError(f'Unknown interaction format: {fmt}')
+    
+    f = sys.stdin if source == '-' else open(source, newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+class InteractionAggregator:
+    """
+    Aggregate streamed interaction events into sparse matrix coordinates
+    
+    Each event contributes weight * 0.5 ** (age_days / half_life_days),
+    where weight is the event type's weight when the record has an
+    eventType and its score (default 1) otherwise. Events for the same
+    (user, item) pair are summed. Records are converted to numpy arrays a
+    chunk at a time and the coordinates are periodically compacted, so
+    memory grows with distinct pairs, not with events.
+    """
+    
+    def __init__(self, event_weights=None, half_life_days=None, as_of=None, compact_every=4 * INGEST_CHUNK):
+        self.event_weights = dict(DEFAULT_EVENT_WEIGHTS if event_weights is None else event_weights)
+        self.half_life_days = half_life_days
+        self.as_of = time.time() if as_of is None else as_of
+        self.compact_every = compact_every
+        
+        self.user_ids = []
+        self.item_ids = []
+        self.user_index = {}
+        self.item_index = {}
+        self.keys = np.empty(0, dtype=np.int64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._pending_keys = []
+        self._pending_weights = []
+        self._pending = 0
+        self.events = 0
+        self.skipped = 0
+    
+    def _index(self, index, ids, value):
+        idx = index.get(value)
+        if idx is None:
+            idx = index[value] = len(ids)
+            ids.append(value)
+        return idx
+    
+    def add(self, records):
+        """Aggregate one chunk of records"""
+        rows, cols, weights, stamps = [], [], [], []
+        
+        for record in records:
+            user_id = _parse_id(record.get('userId', record.get('user_id')))
+            product_id = _parse_id(record.get('productId', record.get('product_id')))
+            if user_id in (None, '') or product_id in (None, ''):
+                self.skipped += 1
+                continue
+            
+            event_type = record.get('eventType', record.get('event_type'))
+            if event_type:
+                weight = self.event_weights.get(event_type)
+                if weight is None:
+                    self.skipped += 1
+                    continue
+            else:
+                score = record.get('score')
+                weight = float(score) if score not in (None, '') else 1.0
+            
+            rows.append(self._index(self.user_index, self.user_ids, user_id))
+            cols.append(self._index(self.item_index, self.item_ids, product_id))
+            weights.append(weight)
+            stamps.append(_parse_timestamp(record.get('timestamp', record.get('createdAt'))))
+        
+        if not rows:
+            return
+        
+        weights = np.asarray(weights, dtype=np.float64)
+        if self.half_life_days:
+            ages = np.maximum(self.as_of - np.asarray(stamps, dtype=np.float64), 0) / 86400.0
+            weights *= np.where(np.isnan(ages), 1.0, 0.5 ** (ages / self.half_life_days))
+        
+        self._pending_keys.append((np.asarray(rows, dtype=np.int64) << 32) | np.asarray(cols, dtype=np.int64))
+        self._pending_weights.append(weights)
+        self._pending += len(rows)
+        self.events += len(rows)
+        
+        if self._pending >= self.compact_every:
+            self._compact()
+    
+    def _compact(self):
+        """Sum duplicate (user, item) coordinates"""
+        if not self._pending_keys:
+            return
+        keys = np.concatenate([self.keys] + self._pending_keys)
+        weights = np.concatenate([self.weights] + self._pending_weights)
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.weights = np.bincount(inverse.ravel(), weights=weights, minlength=len(self.keys))
+        self._pending_keys = []
+        self._pending_weights = []
+        self._pending = 0
+    
+    def consume(self, records, chunk_size=INGEST_CHUNK):
+        """Aggregate an iterable of records chunk by chunk"""
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                self.add(chunk)
+                chunk = []
+        if chunk:
+            self.add(chunk)
+        return self
+    
+    def coordinates(self):
+        """
+        Aggregated coordinates with ids sorted
+        
+        Returns:
+            (user_ids, item_ids, rows, cols, weights)
+        """
+        self._compact()
+        
+        user_order = sorted(range(len(self.user_ids)), key=lambda i: _id_order(self.user_ids[i]))
+        item_order = sorted(range(len(self.item_ids)), key=lambda i: _id_order(self.item_ids[i]))
+        user_rank = np.empty(len(user_order), dtype=np.int64)
+        user_rank[user_order] = np.arange(len(user_order))
+        item_rank = np.empty(len(item_order), dtype=np.int64)
+        item_rank[item_order] = np.arange(len(item_order))
+        
+        return (
+            [self.user_ids[i] for i in user_order],
+            [self.item_ids[i] for i in item_order],
+            user_rank[self.keys >> 32],
+            item_rank[self.keys & 0xFFFFFFFF],
+            self.weights.astype(np.float32)
+        )
+    
+    def records(self):
+        """Aggregated interactions as {userId, productId, score} dicts"""
+        user_ids, item_ids, rows, cols, weights = self.coordinates()
+        return [
+            {'userId': user_ids[r], 'productId': item_ids[c], 'score': float(w)}
+            for r, c, w in zip(rows.tolist(), cols.tolist(), weights.tolist())
+        ]
+
 class RecommendationEngine:
     def __init__(self):
         self.user_item_matrix = None
+        self.item_user_matrix = None
         self.item_features_matrix = None
         self.svd_model = None
+        self.components = None
+        self.user_factors = None
+        self.item_factors = None
+        self.item_popularity = None
+        self.singular_values = None
+        self.algorithm = 'svd'
+        self.params = {}
+        self.lineage = {}
         self.user_ids = []
         self.item_ids = []
+        self.user_index = {}
+        self.item_index = {}
+        self.feature_ids = []
+        self.feature_index = {}
+        self.feature_encoder = None
+        self.feature_active = None
+        self.neighbours = None
+        self.neighbour_scores = None
+        self.user_centroids = None
+        self.user_list_offsets = None
+        self.user_list_rows = None
+        self.version = None
+        self.ingest = {}
         
     def build_user_item_matrix(self, interactions):
         """
@@ -29,68 +573,120 @@ class RecommendationEngine:
             interactions: List of {userId, productId, score} objects
         
         Returns:
-            User-item matrix (numpy array)
+            User-item matrix (scipy.sparse CSR, float32)
         """
+        from scipy import sparse
+        
         # Get unique users and items
-        users = sorted(set(i['userId'] for i in interactions))
-        items = sorted(set(i['productId'] for i in interactions))
+        users = sorted(set(i['userId'] for i in interactions), key=_id_order)
+        items = sorted(set(i['productId'] for i in interactions), key=_id_order)
         
-        self.user_ids = users
-        self.item_ids = items
+        self._set_ids(users, items)
         
-        # Create matrix
-        matrix = np.zeros((len(users), len(items)))
+        rows = np.fromiter((self.user_index[i['userId']] for i in interactions), dtype=np.int64, count=len(interactions))
+        cols = np.fromiter((self.item_index[i['productId']] for i in interactions), dtype=np.int64, count=len(interactions))
+        scores = np.fromiter((i['score'] for i in interactions), dtype=np.float32, count=len(interactions))
         
-        user_idx = {uid: idx for idx, uid in enumerate(users)}
-        item_idx = {iid: idx for idx, iid in enumerate(items)}
+        # A repeated (user, item) pair keeps its last score
+        last = _last_per_cell(rows, cols, len(items))
         
-        for interaction in interactions:
-            u_idx = user_idx[interaction['userId']]
-            i_idx = item_idx[interaction['productId']]
-            matrix[u_idx, i_idx] = interaction['score']
+        matrix = sparse.csr_matrix(
+            (scores[last], (rows[last], cols[last])), shape=(len(users), len(items)), dtype=np.float32
+        )
+        matrix.eliminate_zeros()
         
-        self.user_item_matrix = matrix
+        self._set_matrix(matrix)
+        self.ingest = {}
         return matrix
     
-    def build_item_features_matrix(self, products):
+    def build_user_item_matrix_from_stream(self, source, fmt=None, event_weights=None,
+                                           half_life_days=None, as_of=None, chunk_size=INGEST_CHUNK):
+        """
+        Build the user-item matrix from an NDJSON or CSV interaction stream
+        
+        Args:
+            source: File path, or '-' for stdin
+            fmt: 'ndjson' or 'csv' (default: from the extension)
+            event_weights: Weight per eventType (default: DEFAULT_EVENT_WEIGHTS)
+            half_life_days: Exponential time-decay half-life (default: no decay)
+            as_of: Epoch seconds that ages are measured from (default: now)
+            chunk_size: Records parsed per chunk
+        
+        Returns:
+            Ingestion summary dict
+        """
+        from scipy import sparse
+        
+        aggregator = InteractionAggregator(event_weights, half_life_days, as_of)
+        aggregator.consume(iter_interaction_records(source, fmt), chunk_size)
+        user_ids, item_ids, rows, cols, weights = aggregator.coordinates()
+        
+        self._set_ids(user_ids, item_ids)
+        matrix = sparse.csr_matrix((weights, (rows, cols)), shape=(len(user_ids), len(item_ids)), dtype=np.float32)
+        matrix.eliminate_zeros()
+        self._set_matrix(matrix)
+        self.ingest = {'scoresAsOf': aggregator.as_of, 'halfLifeDays': half_life_days}
+        
+        return {
+            'events': aggregator.events,
+            'skipped': aggregator.skipped,
+            'pairs': int(matrix.nnz)
+        }
+    
+    def _set_ids(self, users, items):
+        self.user_ids = list(users)
+        self.item_ids = list(items)
+        self.user_index = {uid: idx for idx, uid in enumerate(self.user_ids)}
+        self.item_index = {iid: idx for idx, iid in enumerate(self.item_ids)}
+    
+    def _set_matrix(self, matrix):
+        """Keep the CSR user-item matrix plus a CSC copy for per-item access"""
+        self.user_item_matrix = matrix.tocsr()
+        self.item_user_matrix = self.user_item_matrix.tocsc()
+        self.item_popularity = np.asarray(self.item_user_matrix.sum(axis=0)).ravel()
+    
+    def matrix_stats(self):
+        """Shape, sparsity and memory of the interaction matrix"""
+        if self.user_item_matrix is None:
+            return {}
+        
+        n_users, n_items = self.user_item_matrix.shape
+        nnz = int(self.user_item_matrix.nnz)
+        matrix_bytes = _sparse_nbytes(self.user_item_matrix)
+        if self.item_user_matrix is not None:
+            matrix_bytes += _sparse_nbytes(self.item_user_matrix)
+        return {
+            'nnz': nnz,
+            'density': nnz / float(n_users * n_items) if n_users and n_items else 0.0,
+            'matrixBytes': matrix_bytes,
+            'denseEquivalentBytes': n_users * n_items * 8
+        }
+    
+    def build_item_features_matrix(self, products, encoder=None):
         """
         Build item features matrix for content-based filtering
         
         Args:
             products: List of product objects with features
+            encoder: ItemFeatureEncoder to use (default: fit one on products)
         
         Returns:
-            Item features matrix
+            Item features matrix (float32)
         """
-        # Extract features: category, condition, price_range
-        features = []
-        
-        for product in products:
-            # One-hot encode category (simplified)
-            category_features = [0] * 10
-            if 'category' in product:
-                cat_hash = hash(product['category']) % 10
-                category_features[cat_hash] = 1
-            
-            # Encode condition (1-5 scale)
-            condition_score = {
-                'new': 5,
-                'like-new': 4,
-                'good': 3,
-                'fair': 2,
-                'poor': 1
-            }.get(product.get('condition', 'good'), 3)
-            
-            # Normalize price (0-1 scale, assuming max 10000)
-            price_norm = min(product.get('price', 0) / 10000, 1.0)
-            
-            # Combine features
-            feature_vector = category_features + [condition_score / 5, price_norm]
-            features.append(feature_vector)
-        
-        self.item_features_matrix = np.array(features)
+        encoder = encoder or ItemFeatureEncoder.fit(products)
+        self.set_item_features([p.get('id') for p in products], encoder.encode(products), encoder)
         return self.item_features_matrix
     
+    def set_item_features(self, product_ids, features, encoder):
+        """Install an encoded feature matrix, dropping any neighbour table"""
+        self.feature_encoder = encoder
+        self.item_features_matrix = features
+        self.feature_ids = list(product_ids)
+        self.feature_index = {pid: idx for idx, pid in enumerate(self.feature_ids)}
+        self.feature_active = None
+        self.neighbours = None
+        self.neighbour_scores = None
+    
     def train_collaborative_filtering(self, n_components=20):
         """
         Train collaborative filtering model using SVD
@@ -101,13 +697,259 @@ class RecommendationEngine:
         if self.user_item_matrix is None:
             raise ValueError("User-item matrix not built")
         
+        from sklearn.decomposition import TruncatedSVD
+        
         # Use TruncatedSVD for matrix factorization
         n_comp = min(n_components, min(self.user_item_matrix.shape) - 1)
         self.svd_model = TruncatedSVD(n_components=n_comp, random_state=42)
-        self.svd_model.fit(self.user_item_matrix)
+        self.user_factors = self.svd_model.fit_transform(self.user_item_matrix).astype(np.float32)
+        
+        # Items' latent factors are the SVD components
+        self.components = self.svd_model.components_.astype(np.float32)
+        self.item_factors = np.ascontiguousarray(self.components.T)
+        self.singular_values = self.svd_model.singular_values_.astype(np.float32)
+        
+        self.algorithm = 'svd'
+        self.params = {'components': int(n_comp)}
+        self._start_lineage()
         
         return self.svd_model
     
+    def train_als(self, factors=32, regularization=0.05, alpha=20.0, iterations=15, tol=1e-3, workers=None):
+        """
+        Train collaborative filtering model using implicit-feedback ALS
+        
+        Scores are treated as confidence in an implied preference rather
+        than ratings to reconstruct. User and item factors are solved in
+        alternation; training stops early once the objective improves by
+        less than `tol` (relative) between iterations.
+        
+        Args:
+            factors: Number of latent factors
+            regularization: L2 penalty on factors
+            alpha: Confidence scale for interaction scores
+            iterations: Maximum ALS iterations
+            tol: Relative loss improvement below which training stops
+            workers: Solver threads (default: CPU count)
+        
+        Returns:
+            List of per-iteration losses
+        """
+        if self.user_item_matrix is None:
+            raise ValueError("User-item matrix not built")
+        
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        user_items = self.user_item_matrix
+        item_users = self.item_user_matrix.T.tocsr()
+        
+        rng = np.random.default_rng(42)
+        user_factors = (rng.standard_normal((user_items.shape[0], factors)) * 0.01).astype(np.float32)
+        item_factors = (rng.standard_normal((user_items.shape[1], factors)) * 0.01).astype(np.float32)
+        
+        losses = []
+        for _ in range(iterations):
+            user_factors = _als_solve(user_items, item_factors, regularization, alpha, workers)
+            item_factors = _als_solve(item_users, user_factors, regularization, alpha, workers)
+            
+            losses.append(_als_loss(user_items, user_factors, item_factors, regularization, alpha))
+            if len(losses) > 1 and losses[-2] - losses[-1] < tol * abs(losses[-2]):
+                break
+        
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.components = np.ascontiguousarray(item_factors.T)
+        self.singular_values = None
+        
+        self.algorithm = 'als'
+        self.params = {
+            'factors': int(factors),
+            'regularization': float(regularization),
+            'alpha': float(alpha),
+            'iterations': len(losses),
+            'loss': losses[-1] if losses else None
+        }
+        self._start_lineage()
+        
+        return losses
+    
+    def _start_lineage(self):
+        self.lineage = {
+            'trainedAt': time.time(),
+            'trainedNnz': int(self.user_item_matrix.nnz),
+            'trainedFit': self._fit_quality(),
+            'updates': 0,
+            'foldedInteractions': 0,
+            'foldedUsers': 0,
+            'foldedItems': 0,
+            'scoresAsOf': self.ingest.get('scoresAsOf'),
+            'halfLifeDays': self.ingest.get('halfLifeDays')
+        }
+    
+    def _fit_quality(self):
+        """
+        How well the factors explain the interaction matrix
+        
+        SVD: share of the matrix's squared norm captured by the user factors.
+        ALS: mean predicted preference over stored interactions (ideally 1).
+        """
+        if self.algorithm == 'als':
+            if not self.user_item_matrix.nnz:
+                return 0.0
+            return float(_observed_scores(self.user_item_matrix, self.user_factors, self.item_factors).mean())
+        
+        total = float(np.square(self.user_item_matrix.data, dtype=np.float64).sum())
+        if total == 0:
+            return 0.0
+        return float(np.square(self.user_factors, dtype=np.float64).sum()) / total
+    
+    def _score_factors(self, factors):
+        """Factors as used for scoring: cosine for SVD, raw dot products for ALS"""
+        if self.algorithm == 'als':
+            return np.asarray(factors, dtype=np.float32)
+        return _normalize_rows(factors)
+    
+    def fold_in(self, interactions, accumulate=False, as_of=None, half_life_days=None):
+        """
+        Fold new interactions into the existing latent space without retraining
+        
+        New items are projected onto the latent space from the existing
+        users' factors (SVD: V = X^T U S^-2; ALS: one least-squares solve
+        against the fixed user factors). The factors of every user whose row
+        changed, including new users, are then recomputed against the
+        extended item factors in the same way. The item space itself stays
+        fixed, so its fit to the interaction matrix degrades as behaviour
+        moves away from the training data; that fall, relative to training
+        time, is reported as drift.
+        
+        Explicit interactions are overrides: each score replaces the stored
+        score for its (user, item) pair. Aggregated event streams pass
+        accumulate=True, so their scores are added to the stored ones and
+        training on events A + B matches training on A then folding in B.
+        With a half-life the stored scores are first decayed from the time
+        they were aggregated to `as_of`.
+        
+        Args:
+            interactions: List of {userId, productId, score} objects
+            accumulate: Add scores to the stored ones instead of replacing them
+            as_of: Epoch seconds the new scores were aggregated at
+            half_life_days: Time-decay half-life the scores were aggregated with
+        
+        Returns:
+            Dict of fold-in counts, drift and whether a retrain is recommended
+        """
+        from scipy import sparse
+        
+        if self.user_factors is None:
+            raise ValueError("Model not trained")
+        
+        n_users_before = len(self.user_ids)
+        n_items_before = len(self.item_ids)
+        
+        new_users = [u for u in dict.fromkeys(i['userId'] for i in interactions) if u not in self.user_index]
+        new_items = [p for p in dict.fromkeys(i['productId'] for i in interactions) if p not in self.item_index]
+        self._set_ids(self.user_ids + new_users, self.item_ids + new_items)
+        n_users, n_items = len(self.user_ids), len(self.item_ids)
+        
+        # Age the stored scores to the new scores' reference time
+        als = self.algorithm == 'als'
+        scores_as_of = self.lineage.get('scoresAsOf')
+        decay = 1.0
+        if accumulate and half_life_days and as_of is not None and scores_as_of is not None:
+            decay = 0.5 ** (max(as_of - scores_as_of, 0) / 86400.0 / half_life_days)
+        
+        old = self.user_item_matrix.tocoo()
+        rows = np.concatenate([old.row.astype(np.int64), np.fromiter(
+            (self.user_index[i['userId']] for i in interactions), dtype=np.int64, count=len(interactions))])
+        cols = np.concatenate([old.col.astype(np.int64), np.fromiter(
+            (self.item_index[i['productId']] for i in interactions), dtype=np.int64, count=len(interactions))])
+        scores = np.concatenate([old.data.astype(np.float32) * np.float32(decay), np.fromiter(
+            (i['score'] for i in interactions), dtype=np.float32, count=len(interactions))])
+        
+        if accumulate:
+            # Duplicate (user, item) coordinates are summed
+            matrix = sparse.csr_matrix((scores, (rows, cols)), shape=(n_users, n_items), dtype=np.float32)
+        else:
+            # New scores replace old ones
+            last = _last_per_cell(rows, cols, n_items)
+            matrix = sparse.csr_matrix(
+                (scores[last], (rows[last], cols[last])), shape=(n_users, n_items), dtype=np.float32
+            )
+        matrix.eliminate_zeros()
+        self._set_matrix(matrix)
+        
+        # SVD factors are linear in the scores, so decay scales them exactly
+        user_factors = np.asarray(self.user_factors, dtype=np.float32)
+        item_factors = np.asarray(self.item_factors, dtype=np.float32)
+        if decay != 1.0 and not als:
+            user_factors = user_factors * np.float32(decay)
+            if self.singular_values is not None:
+                self.singular_values = np.asarray(self.singular_values) * np.float32(decay)
+        
+        # Project new items from the existing users' factors
+        if als:
+            regularization = self.params.get('regularization', 0.05)
+            alpha = self.params.get('alpha', 20.0)
+        
+        if new_items and als:
+            new_columns = matrix[:n_users_before, n_items_before:].T.tocsr()
+            projected = _als_solve(new_columns, user_factors, regularization, alpha)
+            item_factors = np.vstack([item_factors, projected])
+        elif new_items:
+            sigma_sq = (
+                np.square(self.singular_values, dtype=np.float32) if self.singular_values is not None
+                else np.square(user_factors).sum(axis=0)
+            )
+            new_columns = matrix[:n_users_before, n_items_before:]
+            projected = (new_columns.T @ user_factors) / np.maximum(sigma_sq, 1e-12)
+            item_factors = np.vstack([item_factors, np.asarray(projected, dtype=np.float32)])
+        
+        # Recompute factors for changed and new users
+        touched = np.unique(rows[len(old.row):])
+        user_factors = np.vstack([user_factors, np.zeros((len(new_users), item_factors.shape[1]), dtype=np.float32)])
+        if als:
+            user_factors[touched] = _als_solve(matrix[touched], item_factors, regularization, alpha)
+        else:
+            user_factors[touched] = np.asarray(matrix[touched] @ item_factors, dtype=np.float32)
+        
+        self.user_factors = user_factors
+        self.item_factors = np.ascontiguousarray(item_factors)
+        self.components = np.ascontiguousarray(item_factors.T)
+        
+        # Changed and new users join their nearest existing list
+        if self.user_centroids is not None:
+            lists = np.empty(n_users_before, dtype=np.int64)
+            lists[np.asarray(self.user_list_rows)] = np.repeat(
+                np.arange(len(self.user_centroids)), np.diff(self.user_list_offsets)
+            )
+            lists = np.concatenate([lists, np.zeros(len(new_users), dtype=np.int64)])
+            lists[touched] = _assign_clusters(_normalize_rows(user_factors[touched]), self.user_centroids)
+            self._set_user_lists(lists)
+        
+        lineage = dict(self.lineage)
+        lineage['updates'] = lineage.get('updates', 0) + 1
+        lineage['foldedInteractions'] = lineage.get('foldedInteractions', 0) + len(interactions)
+        lineage['foldedUsers'] = lineage.get('foldedUsers', 0) + len(new_users)
+        lineage['foldedItems'] = lineage.get('foldedItems', 0) + len(new_items)
+        if accumulate and as_of is not None:
+            lineage['scoresAsOf'] = as_of
+        self.lineage = lineage
+        
+        fit = self._fit_quality()
+        trained_fit = lineage.get('trainedFit') or fit
+        drift = max(0.0, 1.0 - fit / trained_fit) if trained_fit else 0.0
+        
+        return {
+            'interactions': len(interactions),
+            'newUsers': len(new_users),
+            'newItems': len(new_items),
+            'updatedUsers': int(len(touched)),
+            'fit': fit,
+            'trainedFit': trained_fit,
+            'drift': drift,
+            'foldedShare': lineage['foldedInteractions'] / max(lineage.get('trainedNnz', 0), 1),
+            'retrainRecommended': drift > RETRAIN_DRIFT
+        }
+    
     def get_collaborative_recommendations(self, user_id, n_recommendations=10):
         """
         Get recommendations using collaborative filtering
@@ -119,33 +961,22 @@ class RecommendationEngine:
         Returns:
             List of (product_id, score) tuples
         """
-        if user_id not in self.user_ids:
+        user_idx = self.user_index.get(user_id)
+        if user_idx is None:
             return []
         
-        user_idx = self.user_ids.index(user_id)
-        
-        # Get user's latent factors
-        user_vector = self.svd_model.transform(self.user_item_matrix[user_idx:user_idx+1])
+        user_row = self.user_item_matrix[user_idx]
         
-        # Get all items' latent factors
-        items_matrix = self.svd_model.transform(self.user_item_matrix.T)
+        # Score precomputed item latent factors against the user's
+        user_vector = self._score_factors(self.user_factors[user_idx:user_idx + 1])[0]
+        similarities = self._score_factors(self.item_factors) @ user_vector
         
-        # Compute similarity
-        similarities = cosine_similarity(user_vector, items_matrix)[0]
+        # Exclude items the user has already interacted with
+        similarities[user_row.indices] = -np.inf
+        n_candidates = len(self.item_ids) - user_row.nnz
         
-        # Get items user hasn't interacted with
-        user_interactions = self.user_item_matrix[user_idx]
-        uninteracted_items = np.where(user_interactions == 0)[0]
-        
-        # Get top recommendations
-        recommendations = []
-        for item_idx in uninteracted_items:
-            recommendations.append((self.item_ids[item_idx], float(similarities[item_idx])))
-        
-        # Sort by score
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        
-        return recommendations[:n_recommendations]
+        top_indices = _top_k(similarities, min(n_recommendations, n_candidates))
+        return [(self.item_ids[idx], float(similarities[idx])) for idx in top_indices]
     
     def get_content_based_recommendations(self, product_id, n_recommendations=10):
         """
@@ -158,23 +989,196 @@ class RecommendationEngine:
         Returns:
             List of (product_id, similarity) tuples
         """
-        if product_id not in self.item_ids:
+        item_idx = self.feature_index.get(product_id)
+        if item_idx is None:
             return []
         
-        item_idx = self.item_ids.index(product_id)
+        # Precomputed neighbours answer in O(K)
+        if self.neighbours is not None and n_recommendations <= self.neighbours.shape[1]:
+            row = np.asarray(self.neighbours[item_idx])
+            scores = np.asarray(self.neighbour_scores[item_idx])
+            valid = row >= 0
+            return [
+                (self.feature_ids[idx], float(score))
+                for idx, score in zip(row[valid][:n_recommendations], scores[valid][:n_recommendations])
+            ]
         
         # Compute similarity with all items
-        item_vector = self.item_features_matrix[item_idx:item_idx+1]
-        similarities = cosine_similarity(item_vector, self.item_features_matrix)[0]
+        features = _normalize_rows(self.item_features_matrix)
+        similarities = features @ features[item_idx]
+        
+        # Get top similar items (excluding itself and sold items)
+        similarities[item_idx] = -np.inf
+        if self.feature_active is not None:
+            similarities[~np.asarray(self.feature_active)] = -np.inf
+        similar_indices = _top_k(similarities, n_recommendations)
+        
+        return [
+            (self.feature_ids[idx], float(similarities[idx]))
+            for idx in similar_indices if np.isfinite(similarities[idx])
+        ]
+    
+    def _neighbour_rows(self, rows, k, workers=None, max_memory_mb=256):
+        """
+        Top-k content neighbours of the given feature rows
+        
+        Rows are scored against all active items in blocks on a thread pool;
+        each row excludes itself.
+        
+        Returns:
+            (indices int32, scores float16), both len(rows) x k; unused slots are -1 / -inf
+        """
+        features = _normalize_rows(self.item_features_matrix)
+        n_items = len(features)
+        inactive = None if self.feature_active is None else np.flatnonzero(~np.asarray(self.feature_active))
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        block_rows = max(1, int(max_memory_mb * 1024 * 1024 / (workers + 1) // max(n_items * 12, 1)))
+        
+        indices = np.full((len(rows), k), -1, dtype=np.int32)
+        scores = np.full((len(rows), k), -np.inf, dtype=np.float16)
+        
+        def score_block(start):
+            block = rows[start:start + block_rows]
+            similarities = features[block] @ features.T
+            similarities[np.arange(len(block)), block] = -np.inf
+            if inactive is not None:
+                similarities[:, inactive] = -np.inf
+            
+            top = _top_k_rows(similarities, k)
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            top[~np.isfinite(top_scores)] = -1
+            indices[start:start + len(block), :top.shape[1]] = top
+            scores[start:start + len(block), :top.shape[1]] = top_scores
         
-        # Get top similar items (excluding itself)
-        similar_indices = np.argsort(similarities)[::-1][1:n_recommendations+1]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(score_block, range(0, len(rows), block_rows)))
         
-        recommendations = []
-        for idx in similar_indices:
-            recommendations.append((self.item_ids[idx], float(similarities[idx])))
+        return indices, scores
+    
+    def build_neighbours(self, k=NEIGHBOURS_K, workers=None, max_memory_mb=256):
+        """
+        Precompute the top-k content-based neighbours of every item
+        
+        Args:
+            k: Neighbours per item
+            workers: Scoring threads (default: CPU count)
+            max_memory_mb: Bound on similarity blocks held in memory
+        
+        Returns:
+            Neighbour index table (items x k, int32)
+        """
+        if self.item_features_matrix is None:
+            raise ValueError("Item features matrix not built")
         
-        return recommendations
+        self.neighbours, self.neighbour_scores = self._neighbour_rows(
+            np.arange(len(self.feature_ids)), k, workers, max_memory_mb
+        )
+        return self.neighbours
+    
+    def refresh_neighbours(self, products=None, removed_ids=None, workers=None, max_memory_mb=256):
+        """
+        Update the neighbour table for added, changed or sold products
+        
+        Sold products stay in the table (so their own neighbours can still be
+        served) but are dropped from every other item's list. Rows that
+        listed a changed or sold product, and rows of added or changed
+        products, are recomputed in full; every other row only merges the
+        changed products in as new candidates.
+        
+        Args:
+            products: Added or changed product objects
+            removed_ids: Ids of sold or delisted products
+            workers: Scoring threads
+            max_memory_mb: Bound on similarity blocks held in memory
+        
+        Returns:
+            Dict of refresh counts
+        """
+        if self.neighbours is None:
+            raise ValueError("Neighbour table not built")
+        
+        products = products or []
+        n_before = len(self.feature_ids)
+        k = self.neighbours.shape[1]
+        
+        features = np.array(self.item_features_matrix, dtype=np.float32)
+        active = np.ones(n_before, dtype=bool) if self.feature_active is None else np.array(self.feature_active)
+        changed = []
+        added = []
+        
+        if self.feature_encoder is None:
+            raise ValueError("Feature encoder missing; retrain the model")
+        encoded = self.feature_encoder.encode(products)
+        for product, row in zip(products, encoded):
+            idx = self.feature_index.get(product.get('id'))
+            if idx is None:
+                added.append(row)
+                idx = len(self.feature_ids)
+                self.feature_ids.append(product.get('id'))
+                self.feature_index[product.get('id')] = idx
+            else:
+                features[idx] = row
+            changed.append(idx)
+        
+        if added:
+            features = np.vstack([features, np.asarray(added, dtype=np.float32)])
+            active = np.concatenate([active, np.ones(len(added), dtype=bool)])
+        changed = np.unique(np.asarray(changed, dtype=np.int64))
+        active[changed] = True
+        
+        removed = np.asarray(
+            [self.feature_index[pid] for pid in (removed_ids or []) if pid in self.feature_index], dtype=np.int64
+        )
+        active[removed] = False
+        
+        self.item_features_matrix = features
+        self.feature_active = active
+        
+        neighbours = np.vstack([np.asarray(self.neighbours), np.full((len(added), k), -1, dtype=np.int32)])
+        neighbour_scores = np.vstack([
+            np.asarray(self.neighbour_scores), np.full((len(added), k), -np.inf, dtype=np.float16)
+        ])
+        
+        # Rows listing a changed or sold item, plus changed rows, are rebuilt
+        stale = np.isin(neighbours, np.concatenate([changed, removed])).any(axis=1)
+        stale[changed] = True
+        rebuild = np.flatnonzero(stale)
+        if len(rebuild):
+            neighbours[rebuild], neighbour_scores[rebuild] = self._neighbour_rows(rebuild, k, workers, max_memory_mb)
+        
+        # Every other row considers the changed items as new candidates
+        merge = np.flatnonzero(~stale)
+        changed = changed[active[changed]]
+        if len(changed) and len(merge):
+            normalized = _normalize_rows(features)
+            candidates = normalized[changed]
+            block_rows = max(1, (64 << 20) // max((k + len(changed)) * 12, 1))
+            
+            for start in range(0, len(merge), block_rows):
+                block = merge[start:start + block_rows]
+                similarities = (normalized[block] @ candidates.T).astype(np.float32)
+                
+                all_indices = np.hstack([neighbours[block], np.broadcast_to(changed, (len(block), len(changed)))])
+                all_scores = np.hstack([neighbour_scores[block].astype(np.float32), similarities])
+                all_scores[all_indices < 0] = -np.inf
+                
+                top = _top_k_rows(all_scores, k)
+                top_indices = np.take_along_axis(all_indices, top, axis=1).astype(np.int32)
+                top_scores = np.take_along_axis(all_scores, top, axis=1)
+                top_indices[~np.isfinite(top_scores)] = -1
+                neighbours[block] = top_indices
+                neighbour_scores[block] = top_scores
+        
+        self.neighbours = neighbours
+        self.neighbour_scores = neighbour_scores
+        
+        return {
+            'added': len(added),
+            'changed': len(set(changed.tolist()) - set(range(n_before, len(self.feature_ids)))),
+            'removed': int(len(removed)),
+            'rebuiltRows': int(len(rebuild)),
+            'mergedRows': int(len(merge)) if len(changed) else 0
+        }
     
     def get_hybrid_recommendations(self, user_id, n_recommendations=10, cf_weight=0.7):
         """
@@ -196,18 +1200,14 @@ class RecommendationEngine:
             return self.get_popular_items(n_recommendations)
         
         # Get content-based recommendations for user's top items
-        user_idx = self.user_ids.index(user_id) if user_id in self.user_ids else None
+        user_idx = self.user_index.get(user_id)
+        cb_recs = []
         if user_idx is not None:
-            user_interactions = self.user_item_matrix[user_idx]
-            top_items = np.argsort(user_interactions)[::-1][:3]
-            
-            cb_recs = []
-            for item_idx in top_items:
-                if user_interactions[item_idx] > 0:
-                    item_id = self.item_ids[item_idx]
+            user_row = self.user_item_matrix[user_idx]
+            for pos in _top_k(user_row.data, 3):
+                if user_row.data[pos] > 0:
+                    item_id = self.item_ids[user_row.indices[pos]]
                     cb_recs.extend(self.get_content_based_recommendations(item_id, 5))
-        else:
-            cb_recs = []
         
         # Combine scores
         combined_scores = defaultdict(float)
@@ -229,52 +1229,584 @@ class RecommendationEngine:
         Returns:
             List of (product_id, popularity_score) tuples
         """
-        if self.user_item_matrix is None:
+        if self.item_popularity is None:
             return []
         
-        # Sum interactions for each item
-        item_popularity = self.user_item_matrix.sum(axis=0)
+        # Summed interactions for each item, computed when the matrix was built
+        item_popularity = np.asarray(self.item_popularity)
         
         # Get top items
-        top_indices = np.argsort(item_popularity)[::-1][:n_recommendations]
+        top_indices = _top_k(item_popularity, n_recommendations)
+        
+        return [(self.item_ids[idx], float(item_popularity[idx])) for idx in top_indices]
+    
+    def build_user_index(self, n_lists=None, iterations=20, sample_size=50000):
+        """
+        Build an IVF index over normalized user factors
         
-        recommendations = []
-        for idx in top_indices:
-            recommendations.append((self.item_ids[idx], float(item_popularity[idx])))
+        Users are clustered with spherical k-means; similar-user lookups
+        then score only the users in the lists nearest the query.
         
-        return recommendations
+        Args:
+            n_lists: Number of inverted lists (default ~4 * sqrt(users))
+            iterations: k-means iterations
+            sample_size: Users sampled to train the centroids
+        """
+        if self.user_factors is None:
+            raise ValueError("Model not trained")
+        
+        n_users = len(self.user_ids)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n_users))
+        n_lists = max(1, min(int(n_lists), n_users))
+        
+        factors = _normalize_rows(self.user_factors)
+        rng = np.random.default_rng(42)
+        sample = factors
+        if n_users > sample_size:
+            sample = factors[np.sort(rng.choice(n_users, sample_size, replace=False))]
+        
+        self.user_centroids = _kmeans(sample, n_lists, iterations=iterations)
+        self._set_user_lists(_assign_clusters(factors, self.user_centroids))
+    
+    def _set_user_lists(self, lists):
+        """Group user rows by list: rows of list l are user_list_rows[offsets[l]:offsets[l + 1]]"""
+        counts = np.bincount(lists, minlength=len(self.user_centroids))
+        self.user_list_rows = np.argsort(lists, kind='stable').astype(np.int32)
+        self.user_list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
     
-    def get_similar_users(self, user_id, n_users=5):
+    def _probe_rows(self, query, n_probe):
+        """User rows in the n_probe lists nearest a normalized query"""
+        probe = _top_k(self.user_centroids @ query, max(1, int(n_probe)))
+        return np.concatenate([
+            self.user_list_rows[self.user_list_offsets[l]:self.user_list_offsets[l + 1]] for l in probe
+        ]).astype(np.int64)
+    
+    def get_similar_users(self, user_id, n_users=5, exact=False, n_probe=USER_INDEX_PROBE):
         """
         Find similar users based on interaction patterns
         
+        Compares normalized user factors in latent space, probing the
+        n_probe nearest lists of the user IVF index when one is built (and
+        exact is not set). Without trained factors, falls back to sparse
+        cosine similarity of the raw interaction rows.
+        
         Args:
             user_id: User ID
             n_users: Number of similar users to return
+            exact: Score every user even when an index is built
+            n_probe: Lists probed per query with the index
         
         Returns:
             List of (user_id, similarity) tuples
         """
-        if user_id not in self.user_ids:
+        if user_id not in self.user_index:
             return []
         
-        user_idx = self.user_ids.index(user_id)
-        user_vector = self.user_item_matrix[user_idx:user_idx+1]
+        user_idx = self.user_index[user_id]
+        
+        if self.user_factors is not None:
+            query = _normalize_rows(self.user_factors[user_idx:user_idx + 1])[0]
+            if self.user_centroids is not None and not exact:
+                rows = self._probe_rows(query, n_probe)
+            else:
+                rows = np.arange(len(self.user_ids))
+            similarities = _normalize_rows(self.user_factors[rows]) @ query
+        else:
+            rows = np.arange(len(self.user_ids))
+            matrix = self.user_item_matrix
+            
+            # Sparse cosine similarity with all users
+            row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            dots = (matrix @ matrix[user_idx].T).toarray().ravel()
+            similarities = dots / np.maximum(row_norms * row_norms[user_idx], 1e-12)
+        
+        # Exclude self
+        similarities[rows == user_idx] = -np.inf
+        best = _top_k(similarities, n_users)
+        
+        return [
+            (self.user_ids[rows[b]], float(similarities[b]))
+            for b in best if np.isfinite(similarities[b])
+        ]
+    
+    def iter_similar_users(self, user_ids=None, n_users=5, exact=False, n_probe=USER_INDEX_PROBE,
+                           workers=None, max_memory_mb=256):
+        """
+        Similar users for many users at once, scored with blocked matrix multiplies
+        
+        With the user index, query users are grouped by list and each group
+        is scored in one multiply against the users of the n_probe lists
+        nearest its centroid. Otherwise (or with exact) query blocks are
+        scored against every user. Groups run on a thread pool and results
+        are yielded group by group, not in input order.
         
-        # Compute similarity with all users
-        similarities = cosine_similarity(user_vector, self.user_item_matrix)[0]
+        Args:
+            user_ids: Users to look up (default: every user); unknown ids are skipped
+            n_users: Similar users per user
+            exact: Score every user even when an index is built
+            n_probe: Lists probed per group with the index
+            workers: Scoring threads (default: CPU count)
+            max_memory_mb: Bound on score blocks held in memory
+        
+        Yields:
+            (user_id, [(similar_user_id, similarity), ...])
+        """
+        if self.user_factors is None:
+            raise ValueError("Model not trained")
         
-        # Get top similar users (excluding self)
-        similar_indices = np.argsort(similarities)[::-1][1:n_users+1]
+        if user_ids is None:
+            queries = np.arange(len(self.user_ids))
+        else:
+            queries = np.asarray([self.user_index[u] for u in user_ids if u in self.user_index], dtype=np.int64)
+        
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        factors = _normalize_rows(self.user_factors)
+        n_all = len(self.user_ids)
         
-        similar_users = []
-        for idx in similar_indices:
-            similar_users.append((self.user_ids[idx], float(similarities[idx])))
+        if self.user_centroids is not None and not exact:
+            lists = _assign_clusters(factors[queries], self.user_centroids)
+            order = np.argsort(lists, kind='stable')
+            bounds = np.flatnonzero(np.diff(lists[order])) + 1
+            groups = [
+                (queries[positions], self._probe_rows(self.user_centroids[lists[positions[0]]], n_probe))
+                for positions in np.split(order, bounds) if len(positions)
+            ]
+        else:
+            candidates = np.arange(n_all)
+            block_rows = max(1, int(max_memory_mb * 1024 * 1024 / (workers + 1) // max(n_all * 12, 1)))
+            groups = [(queries[start:start + block_rows], candidates) for start in range(0, len(queries), block_rows)]
+        
+        def score_group(group):
+            rows, candidates = group
+            similarities = factors[rows] @ factors[candidates].T
+            similarities[rows[:, None] == candidates[None, :]] = -np.inf
+            top = _top_k_rows(similarities, n_users)
+            return rows, candidates[top], np.take_along_axis(similarities, top, axis=1)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            remaining = iter(groups)
+            exhausted = False
+            
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers:
+                    group = next(remaining, None)
+                    if group is None:
+                        exhausted = True
+                        break
+                    pending.append(pool.submit(score_group, group))
+                
+                if not pending:
+                    break
+                
+                rows, top_rows, top_scores = pending.popleft().result()
+                for row, similar, scores in zip(rows, top_rows, top_scores):
+                    valid = np.isfinite(scores)
+                    yield self.user_ids[row], [
+                        (self.user_ids[r], float(score)) for r, score in zip(similar[valid], scores[valid])
+                    ]
+    
+    def iter_recommendations_all(self, n_recommendations=10, block_rows=None, workers=None, max_memory_mb=256):
+        """
+        Collaborative top-N for every user, scored in blocks
         
-        return similar_users
+        Each block of users is scored against all items with one matrix
+        multiply in latent space, seen items are masked, and top-N is taken
+        with argpartition. Blocks are scored on a thread pool (numpy releases
+        the GIL) and yielded in user order; at most `workers + 1` score
+        blocks exist at a time, each sized to fit within
+        max_memory_mb / (workers + 1).
+        
+        Args:
+            n_recommendations: Recommendations per user
+            block_rows: Users per block (default: derived from max_memory_mb)
+            workers: Scoring threads (default: CPU count)
+            max_memory_mb: Bound on the score blocks held in memory
+        
+        Yields:
+            (user_id, [(product_id, score), ...]) in user order
+        """
+        if self.user_factors is None:
+            raise ValueError("Model not trained")
+        
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        n_users = len(self.user_ids)
+        n_items = len(self.item_ids)
+        
+        if not block_rows:
+            # float32 scores plus the argpartition index array for one block
+            budget = max_memory_mb * 1024 * 1024 / (workers + 1)
+            block_rows = int(budget // max(n_items * 12, 1))
+        block_rows = max(1, min(int(block_rows), max(n_users, 1)))
+        
+        item_matrix = self._score_factors(self.item_factors)
+        seen = self.user_item_matrix
+        
+        def score_block(start):
+            end = min(start + block_rows, n_users)
+            scores = self._score_factors(self.user_factors[start:end]) @ item_matrix.T
+            
+            # Mask each user's seen items
+            block_seen = seen[start:end]
+            rows = np.repeat(np.arange(end - start), np.diff(block_seen.indptr))
+            scores[rows, block_seen.indices] = -np.inf
+            
+            top = _top_k_rows(scores, n_recommendations)
+            return start, top, np.take_along_axis(scores, top, axis=1)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            starts = iter(range(0, n_users, block_rows))
+            exhausted = False
+            
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers:
+                    start = next(starts, None)
+                    if start is None:
+                        exhausted = True
+                        break
+                    pending.append(pool.submit(score_block, start))
+                
+                if not pending:
+                    break
+                
+                start, top, top_scores = pending.popleft().result()
+                for offset in range(len(top)):
+                    valid = np.isfinite(top_scores[offset])
+                    yield self.user_ids[start + offset], [
+                        (self.item_ids[idx], float(score))
+                        for idx, score in zip(top[offset][valid], top_scores[offset][valid])
+                    ]
+    
+    def recommend_all(self, output_path, n_recommendations=10, block_rows=None, workers=None, max_memory_mb=256):
+        """
+        Write collaborative recommendations for every user to a file
+        
+        Output is NDJSON, one {userId, recommendations} object per line,
+        written to a temp file and renamed into place when complete.
+        
+        Args:
+            output_path: Destination file
+            n_recommendations: Recommendations per user
+            block_rows: Users per scoring block
+            workers: Scoring threads
+            max_memory_mb: Bound on score blocks held in memory
+        
+        Returns:
+            Summary dict (users written, seconds)
+        """
+        start = time.perf_counter()
+        written = 0
+        tmp = output_path + '.tmp'
+        
+        with open(tmp, 'w') as f:
+            for user_id, recommendations in self.iter_recommendations_all(
+                n_recommendations, block_rows, workers, max_memory_mb
+            ):
+                f.write(json.dumps({'userId': user_id, 'recommendations': recommendations}) + '\n')
+                written += 1
+        os.replace(tmp, output_path)
+        
+        return {
+            'users': written,
+            'seconds': round(time.perf_counter() - start, 3),
+            'output': output_path
+        }
+    
+    def save(self, path=MODEL_DIR, keep_versions=KEEP_VERSIONS):
+        """
+        Write the trained model as a new artifact version
+        
+        The artifact directory holds one subdirectory per version plus a
+        CURRENT file naming the live one. A version is fully written before
+        CURRENT is swapped to it, so loaders never see a partial model.
+        
+        Args:
+            path: Artifact directory
+            keep_versions: Number of versions to retain
+        
+        Returns:
+            Version name
+        """
+        if self.user_factors is None:
+            raise ValueError("Model not trained")
+        
+        version = time.strftime('%Y%m%dT%H%M%S') + '-%06d' % (time.time_ns() // 1000 % 1000000)
+        target = os.path.join(path, version)
+        tmp = target + '.tmp'
+        os.makedirs(tmp)
+        
+        matrix = self.user_item_matrix
+        arrays = {
+            'components': self.components,
+            'user_factors': self.user_factors,
+            'item_factors': self.item_factors,
+            'item_popularity': np.asarray(self.item_popularity, dtype=np.float32),
+            'user_centroids': self.user_centroids,
+            'user_list_offsets': self.user_list_offsets,
+            'user_list_rows': self.user_list_rows,
+            'singular_values': self.singular_values,
+            'seen_indptr': matrix.indptr,
+            'seen_indices': matrix.indices,
+            'seen_data': matrix.data
+        }
+        if self.item_features_matrix is not None:
+            arrays['item_features'] = np.asarray(self.item_features_matrix, dtype=np.float32)
+            arrays['feature_active'] = self.feature_active
+            arrays['neighbours'] = self.neighbours
+            arrays['neighbour_scores'] = self.neighbour_scores
+        
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        
+        # Ids go to JSON rather than .npy so int and str ids keep their types
+        ids = {'userIds': self.user_ids, 'itemIds': self.item_ids}
+        if self.item_features_matrix is not None:
+            ids['featureIds'] = self.feature_ids
+        with open(os.path.join(tmp, 'ids.json'), 'w') as f:
+            json.dump(ids, f)
+        
+        if self.feature_encoder is not None:
+            with open(os.path.join(tmp, 'feature_encoder.json'), 'w') as f:
+                json.dump(self.feature_encoder.to_dict(), f)
+        
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({
+                'format': ARTIFACT_FORMAT,
+                'version': version,
+                'trainedAt': time.time(),
+                'users': len(self.user_ids),
+                'items': len(self.item_ids),
+                'components': int(self.components.shape[0]),
+                'nnz': int(matrix.nnz),
+                'algorithm': self.algorithm,
+                'params': self.params,
+                'lineage': self.lineage
+            }, f, indent=2)
+        
+        os.replace(tmp, target)
+        
+        pointer = os.path.join(path, 'CURRENT')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(pointer + '.tmp', pointer)
+        
+        # Version names sort chronologically
+        versions = sorted(
+            name for name in os.listdir(path)
+            if os.path.isdir(os.path.join(path, name)) and not name.endswith('.tmp')
+        )
+        for name in versions[:-keep_versions]:
+            if name != version:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        
+        self.version = version
+        return version
+    
+    @classmethod
+    def load(cls, path=MODEL_DIR, version=None):
+        """
+        Load a trained model artifact, memory-mapping its arrays
+        
+        Args:
+            path: Artifact directory
+            version: Version to load (default: CURRENT)
+        
+        Returns:
+            RecommendationEngine ready to serve
+        """
+        from scipy import sparse
+        
+        if version is None:
+            pointer = os.path.join(path, 'CURRENT')
+            if not os.path.exists(pointer):
+                raise FileNotFoundError(f'No trained recommendation model at {path}; run train first')
+            with open(pointer) as f:
+                version = f.read().strip()
+        
+        version_dir = os.path.join(path, version)
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported model artifact format: {meta.get('format')}")
+        
+        def array(name, mmap=True):
+            file_path = os.path.join(version_dir, name + '.npy')
+            if not os.path.exists(file_path):
+                return None
+            return np.load(file_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        
+        ids_path = os.path.join(version_dir, 'ids.json')
+        if os.path.exists(ids_path):
+            with open(ids_path) as f:
+                ids = json.load(f)
+        else:
+            # Artifacts written before ids.json kept ids as .npy arrays
+            ids = {
+                key: array(name, mmap=False).tolist()
+                for key, name in (('userIds', 'user_ids'), ('itemIds', 'item_ids'), ('featureIds', 'feature_ids'))
+                if os.path.exists(os.path.join(version_dir, name + '.npy'))
+            }
+        
+        engine = cls()
+        engine.version = version
+        engine._set_ids(ids['userIds'], ids['itemIds'])
+        engine.components = array('components')
+        engine.user_factors = array('user_factors')
+        engine.item_factors = array('item_factors')
+        engine.item_popularity = array('item_popularity')
+        engine.singular_values = array('singular_values')
+        engine.user_centroids = array('user_centroids')
+        engine.user_list_offsets = array('user_list_offsets')
+        engine.user_list_rows = array('user_list_rows')
+        engine.algorithm = meta.get('algorithm', 'svd')
+        engine.params = meta.get('params', {})
+        engine.lineage = meta.get('lineage', {})
+        engine.user_item_matrix = sparse.csr_matrix(
+            (array('seen_data'), array('seen_indices'), array('seen_indptr')),
+            shape=(meta['users'], meta['items']), copy=False
+        )
+        
+        if 'featureIds' in ids:
+            engine.feature_ids = ids['featureIds']
+            engine.feature_index = {pid: idx for idx, pid in enumerate(engine.feature_ids)}
+            engine.item_features_matrix = array('item_features')
+            encoder_path = os.path.join(version_dir, 'feature_encoder.json')
+            if os.path.exists(encoder_path):
+                with open(encoder_path) as f:
+                    engine.feature_encoder = ItemFeatureEncoder.from_dict(json.load(f))
+            engine.feature_active = array('feature_active')
+            engine.neighbours = array('neighbours')
+            engine.neighbour_scores = array('neighbour_scores')
+        
+        return engine
+
+def build_cached_features(engine, products_json):
+    """
+    Build the engine's item features from an inline product list, reusing
+    the matrix encoded by an earlier process for identical input
+    """
+    products = json.loads(products_json)
+    digest = hashlib.sha256(
+        f'{ItemFeatureEncoder.VERSION}:{products_json}'.encode('utf-8')
+    ).hexdigest()
+    cache_path = os.path.join(FEATURE_CACHE_DIR, digest + '.npz')
+    
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                encoder = ItemFeatureEncoder.from_dict(json.loads(str(cached['encoder'])))
+                features = cached['features']
+            engine.set_item_features([p.get('id') for p in products], features, encoder)
+            # mtime is the recency used for eviction
+            os.utime(cache_path)
+            return products
+        except (OSError, ValueError, KeyError):
+            pass  # unreadable or stale entry; re-encode below
+    
+    engine.build_item_features_matrix(products)
+    try:
+        os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+        tmp = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f, features=engine.item_features_matrix,
+                encoder=np.array(json.dumps(engine.feature_encoder.to_dict()))
+            )
+        os.replace(tmp, cache_path)
+        prune_feature_cache()
+    except OSError as e:
+        print(f"Feature cache write failed: {e}", file=sys.stderr)
+    return products
+
+def prune_feature_cache(max_entries=None):
+    """Delete the least recently used feature cache entries beyond max_entries"""
+    max_entries = FEATURE_CACHE_ENTRIES if max_entries is None else max_entries
+    entries = []
+    for name in os.listdir(FEATURE_CACHE_DIR):
+        if name.endswith('.npz'):
+            path = os.path.join(FEATURE_CACHE_DIR, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass  # removed by a concurrent prune
+    
+    entries.sort(reverse=True)
+    for _, path in entries[max_entries:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def read_products_arg(value):
+    """Products as a JSON string, from inline JSON or a JSON/NDJSON file path"""
+    if is_json_arg(value):
+        return value
+    with open(value) as f:
+        text = f.read()
+    if is_json_arg(text) and not text.lstrip().startswith('{'):
+        return text
+    return json.dumps([json.loads(line) for line in text.splitlines() if line.strip()])
+
+def ingest_options(args):
+    """Pop streaming ingestion options into build_user_item_matrix_from_stream kwargs"""
+    event_weights = pop_option(args, '--event-weights')
+    half_life = pop_option(args, '--half-life')
+    as_of = pop_option(args, '--as-of')
+    return {
+        'fmt': pop_option(args, '--format'),
+        'event_weights': json.loads(event_weights) if event_weights else None,
+        'half_life_days': float(half_life) if half_life else None,
+        'as_of': _parse_timestamp(as_of) if as_of else None
+    }
+
+def pop_option(args, name, default=None):
+    """Remove `--name value` from args and return value"""
+    if name in args:
+        i = args.index(name)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+def is_json_arg(value):
+    """Whether a positional argument is inline JSON data rather than an id"""
+    return value.lstrip()[:1] in ('[', '{')
 
 def main():
-    """CLI interface"""
+    """
+    CLI interface
+    
+    train <interactions> <products> [--model DIR] [--algorithm svd|als] [--factors N] [--iterations N] [--workers N]
+    recommend <user_id> [n] [--model DIR]
+    similar_products <product_id> [n] [--model DIR]
+    popular [n] [--model DIR]
+    update <interactions> [--model DIR]
+    build_neighbours [k] [--model DIR] [--workers N]
+    refresh_neighbours <products> [removed_ids] [--model DIR]
+    similar_users <user_id | [user_ids] | all> [n] [--output FILE] [--exact] [--probe N] [--workers N] [--model DIR]
+    build_user_index [n_lists] [--model DIR]
+    recommend_all <output.ndjson> [n] [--model DIR] [--block-rows N] [--workers N] [--max-mb N]
+    
+    <interactions> for train and update is inline JSON, or a path to an
+    NDJSON/CSV event file ('-' for stdin) that is streamed in chunks with
+    [--format ndjson|csv] [--event-weights JSON] [--half-life DAYS] [--as-of TIME].
+    <products> is inline JSON or a path to a JSON/NDJSON file.
+    
+    update treats inline JSON {userId, productId, score} records as
+    overrides that replace the stored scores. A streamed event file is
+    aggregated and added to the stored scores instead, after decaying them
+    to --as-of with the half-life the model was trained with (or
+    --half-life), so train A + B and train A then update B agree.
+    
+    recommend, similar_products and popular load the artifact written by
+    train. Passing inline JSON data instead (the original form, e.g.
+    recommend <interactions> <products> <user_id> [n]) fits a throwaway
+    model from that data.
+    """
     try:
         if len(sys.argv) < 2:
             print(json.dumps({
@@ -284,78 +1816,249 @@ def main():
             sys.exit(1)
         
         command = sys.argv[1]
+        args = sys.argv[2:]
+        model_dir = pop_option(args, '--model', MODEL_DIR)
         engine = RecommendationEngine()
         
         if command == 'train':
             # Train model
-            interactions = json.loads(sys.argv[2])
-            products = json.loads(sys.argv[3])
+            algorithm = pop_option(args, '--algorithm', ALGORITHM)
+            factors = pop_option(args, '--factors')
+            iterations = int(pop_option(args, '--iterations', 15))
+            workers = pop_option(args, '--workers')
+            ingest = ingest_options(args)
             
             # Build matrices
-            engine.build_user_item_matrix(interactions)
-            engine.build_item_features_matrix(products)
+            if is_json_arg(args[0]):
+                engine.build_user_item_matrix(json.loads(args[0]))
+                ingested = None
+            else:
+                ingested = engine.build_user_item_matrix_from_stream(args[0], **ingest)
+            build_cached_features(engine, read_products_arg(args[1]))
             
-            # Train collaborative filtering
-            engine.train_collaborative_filtering()
+            # Train collaborative filtering and persist it
+            if algorithm == 'als':
+                engine.train_als(
+                    factors=int(factors or 32), iterations=iterations,
+                    workers=int(workers) if workers else None
+                )
+            elif algorithm == 'svd':
+                engine.train_collaborative_filtering(int(factors or 20))
+            else:
+                raise ValueError(f'Unknown algorithm: {algorithm}')
+            engine.build_neighbours(workers=int(workers) if workers else None)
+            if len(engine.user_ids) >= USER_INDEX_MIN_USERS:
+                engine.build_user_index()
+            version = engine.save(model_dir)
             
             print(json.dumps({
                 'success': True,
                 'users': len(engine.user_ids),
                 'items': len(engine.item_ids),
+                'memory': engine.matrix_stats(),
+                'algorithm': engine.algorithm,
+                'params': engine.params,
+                'version': version,
+                'modelPath': model_dir,
+                'ingested': ingested,
                 'message': 'Model trained successfully'
             }))
             
         elif command == 'recommend':
             # Get recommendations
-            interactions = json.loads(sys.argv[2])
-            products = json.loads(sys.argv[3])
-            user_id = int(sys.argv[4])
-            n_recs = int(sys.argv[5]) if len(sys.argv) > 5 else 10
+            if args and is_json_arg(args[0]):
+                interactions = json.loads(args[0])
+                
+                # Build and train
+                engine.build_user_item_matrix(interactions)
+                build_cached_features(engine, args[1])
+                engine.train_collaborative_filtering()
+                args = args[2:]
+            else:
+                engine = RecommendationEngine.load(model_dir)
             
-            # Build and train
-            engine.build_user_item_matrix(interactions)
-            engine.build_item_features_matrix(products)
-            engine.train_collaborative_filtering()
+            user_id = int(args[0])
+            n_recs = int(args[1]) if len(args) > 1 else 10
             
             # Get recommendations
             recommendations = engine.get_hybrid_recommendations(user_id, n_recs)
             
             print(json.dumps({
                 'success': True,
-                'recommendations': recommendations
+                'recommendations': recommendations,
+                'version': engine.version
             }))
             
         elif command == 'similar_products':
             # Get similar products
-            products = json.loads(sys.argv[2])
-            product_id = int(sys.argv[3])
-            n_recs = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+            if args and is_json_arg(args[0]):
+                # Build features matrix
+                build_cached_features(engine, args[0])
+                args = args[1:]
+            else:
+                engine = RecommendationEngine.load(model_dir)
             
-            # Build features matrix
-            engine.item_ids = [p['id'] for p in products]
-            engine.build_item_features_matrix(products)
+            product_id = int(args[0])
+            n_recs = int(args[1]) if len(args) > 1 else 10
             
             # Get similar products
             similar = engine.get_content_based_recommendations(product_id, n_recs)
             
             print(json.dumps({
                 'success': True,
-                'similar_products': similar
+                'similar_products': similar,
+                'version': engine.version
             }))
             
         elif command == 'popular':
             # Get popular items
-            interactions = json.loads(sys.argv[2])
-            n_recs = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+            if args and is_json_arg(args[0]):
+                engine.build_user_item_matrix(json.loads(args[0]))
+                args = args[1:]
+            else:
+                engine = RecommendationEngine.load(model_dir)
             
-            engine.build_user_item_matrix(interactions)
+            n_recs = int(args[0]) if args else 10
             popular = engine.get_popular_items(n_recs)
             
             print(json.dumps({
                 'success': True,
-                'popular_items': popular
+                'popular_items': popular,
+                'version': engine.version
+            }))
+            
+        elif command == 'update':
+            # Fold new interactions into the current model
+            ingest = ingest_options(args)
+            engine = RecommendationEngine.load(model_dir)
+            base_version = engine.version
+            
+            if is_json_arg(args[0]):
+                # Explicit scores override the stored ones
+                summary = engine.fold_in(json.loads(args[0]))
+            else:
+                # Streamed events are aggregated per pair and added to the stored scores
+                half_life_days = ingest['half_life_days'] or engine.lineage.get('halfLifeDays')
+                aggregator = InteractionAggregator(ingest['event_weights'], half_life_days, ingest['as_of'])
+                interactions = aggregator.consume(iter_interaction_records(args[0], ingest['fmt'])).records()
+                summary = engine.fold_in(
+                    interactions, accumulate=True, as_of=aggregator.as_of, half_life_days=half_life_days
+                )
+            version = engine.save(model_dir)
+            
+            print(json.dumps(dict(success=True, version=version, baseVersion=base_version, **summary)))
+            
+        elif command == 'build_neighbours':
+            # Rebuild the item-item neighbour table
+            workers = pop_option(args, '--workers')
+            engine = RecommendationEngine.load(model_dir)
+            k = int(args[0]) if args else NEIGHBOURS_K
+            
+            start = time.perf_counter()
+            engine.build_neighbours(k, workers=int(workers) if workers else None)
+            seconds = round(time.perf_counter() - start, 3)
+            version = engine.save(model_dir)
+            
+            print(json.dumps({
+                'success': True,
+                'items': len(engine.feature_ids),
+                'k': k,
+                'seconds': seconds,
+                'version': version
             }))
             
+        elif command == 'refresh_neighbours':
+            # Apply product additions, changes and sales to the neighbour table
+            engine = RecommendationEngine.load(model_dir)
+            products = json.loads(args[0]) if args else []
+            removed_ids = json.loads(args[1]) if len(args) > 1 else []
+            
+            summary = engine.refresh_neighbours(products, removed_ids)
+            version = engine.save(model_dir)
+            
+            print(json.dumps(dict(success=True, version=version, **summary)))
+            
+        elif command == 'similar_users':
+            # Shoppers like you: one user, a list of users, or everyone
+            output_path = pop_option(args, '--output')
+            n_probe = int(pop_option(args, '--probe', USER_INDEX_PROBE))
+            workers = pop_option(args, '--workers')
+            exact = '--exact' in args
+            if exact:
+                args.remove('--exact')
+            
+            engine = RecommendationEngine.load(model_dir)
+            n_users = int(args[1]) if len(args) > 1 else 5
+            
+            if args[0] != 'all' and not is_json_arg(args[0]):
+                similar = engine.get_similar_users(_parse_id(args[0]), n_users, exact=exact, n_probe=n_probe)
+                print(json.dumps({
+                    'success': True,
+                    'similar_users': similar,
+                    'version': engine.version
+                }))
+            else:
+                results = engine.iter_similar_users(
+                    None if args[0] == 'all' else json.loads(args[0]), n_users, exact=exact,
+                    n_probe=n_probe, workers=int(workers) if workers else None
+                )
+                if output_path:
+                    start = time.perf_counter()
+                    written = 0
+                    with open(output_path + '.tmp', 'w') as f:
+                        for user_id, similar in results:
+                            f.write(json.dumps({'userId': user_id, 'similarUsers': similar}) + '\n')
+                            written += 1
+                    os.replace(output_path + '.tmp', output_path)
+                    print(json.dumps({
+                        'success': True,
+                        'users': written,
+                        'seconds': round(time.perf_counter() - start, 3),
+                        'output': output_path,
+                        'version': engine.version
+                    }))
+                else:
+                    print(json.dumps({
+                        'success': True,
+                        'similar_users': {str(user_id): similar for user_id, similar in results},
+                        'version': engine.version
+                    }))
+            
+        elif command == 'build_user_index':
+            # Rebuild the IVF index over user factors
+            engine = RecommendationEngine.load(model_dir)
+            start = time.perf_counter()
+            engine.build_user_index(int(args[0]) if args else None)
+            seconds = round(time.perf_counter() - start, 3)
+            version = engine.save(model_dir)
+            
+            print(json.dumps({
+                'success': True,
+                'users': len(engine.user_ids),
+                'lists': len(engine.user_centroids),
+                'seconds': seconds,
+                'version': version
+            }))
+            
+        elif command == 'recommend_all':
+            # Precompute recommendations for every user
+            block_rows = pop_option(args, '--block-rows')
+            workers = pop_option(args, '--workers')
+            max_mb = float(pop_option(args, '--max-mb', 256))
+            
+            engine = RecommendationEngine.load(model_dir)
+            output_path = args[0]
+            n_recs = int(args[1]) if len(args) > 1 else 10
+            
+            summary = engine.recommend_all(
+                output_path, n_recs,
+                block_rows=int(block_rows) if block_rows else None,
+                workers=int(workers) if workers else None,
+                max_memory_mb=max_mb
+            )
+            
+            print(json.dumps(dict(success=True, version=engine.version, **summary)))
+            
         else:
             print(json.dumps({
                 'success': False,
@@ -0,0 +1,67 @@
+"""Tests for the days-to-sell model in inventory-predictor.py"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inventory-predictor.py')
+
+@pytest.fixture(scope='module')
+def inv():
+    spec = importlib.util.spec_from_file_location('inventory_predictor', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def sold_products(n=400, seed=0):
+    """Sell-through history where electronics sell fast and price slows sales"""
+    rng = np.random.default_rng(seed)
+    products = []
+    for i in range(n):
+        category = ['electronics', 'furniture', 'books'][i % 3]
+        price = float(rng.uniform(500, 20000))
+        base = {'electronics': 5, 'furniture': 40, 'books': 15}[category]
+        products.append({
+            'id': i,
+            'category': category,
+            'condition': 'good',
+            'price': price,
+            'ageInDays': 30,
+            'viewCount': int(rng.integers(0, 200)),
+            'daysToSell': max(1, int(round(base * (1 + price / 20000) + rng.normal(0, 1))))
+        })
+    return products
+
+def test_untrained_model_falls_back_to_velocity_estimate(inv, tmp_path):
+    predictor = inv.InventoryPredictor()
+    predictor.days_model_path = str(tmp_path / 'missing.joblib')
+
+    days, confidence = predictor.predict_days_to_sell({'category': 'electronics', 'price': 3000, 'viewCount': 10})
+
+    assert days in inv.VELOCITY_DAYS
+    assert 0 < confidence < 1
+
+def test_train_days_to_sell_learns_and_reloads(inv, tmp_path):
+    path = str(tmp_path / 'days.joblib')
+    predictor = inv.InventoryPredictor()
+
+    summary = predictor.train_days_to_sell(inv.products_to_columns(sold_products()), path=path)
+
+    assert summary['trainingSamples'] == 320 and summary['testSamples'] == 80
+    assert summary['mae'] < 4
+    assert os.path.exists(path) and not os.path.exists(path + '.tmp')
+
+    fast = {'category': 'electronics', 'condition': 'good', 'price': 1000, 'ageInDays': 30, 'viewCount': 50}
+    slow = dict(fast, category='furniture', price=19000)
+    reloaded = inv.InventoryPredictor()
+    reloaded.days_model_path = path
+    assert reloaded.predict_days_to_sell(fast) == predictor.predict_days_to_sell(fast)
+    assert reloaded.predict_days_to_sell(fast)[0] < 10 < reloaded.predict_days_to_sell(slow)[0]
+
+def test_train_days_to_sell_needs_enough_sold_products(inv, tmp_path):
+    with pytest.raises(ValueError):
+        inv.InventoryPredictor().train_days_to_sell(
+            inv.products_to_columns(sold_products(40)), path=str(tmp_path / 'days.joblib')
+        )
@@ -0,0 +1,32 @@
+"""Tests for inventory-predictor.py"""
+
+import importlib.util
+import os
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inventory-predictor.py')
+
+@pytest.fixture(scope='module')
+def inv():
+    spec = importlib.util.spec_from_file_location('inventory_predictor', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_inline_ids_pass_through_and_csv_ids_are_parsed(inv, tmp_path):
+    product = {'id': '007', 'category': 'home', 'price': 3000, 'ageInDays': 90}
+    predictor = inv.InventoryPredictor()
+
+    assert predictor.identify_dead_stock([product])[0]['productId'] == '007'
+
+    path = tmp_path / 'products.csv'
+    path.write_text('id,category,price,ageInDays\n007,home,3000,90\n42,home,3000,90\n-5,home,3000,90\n')
+    chunks = inv.iter_product_chunks(str(path))
+    assert [row['productId'] for row in next(predictor.iter_dead_stock(chunks))[1]] == ['007', 42, -5]
+
+def test_ndjson_string_ids_are_not_rewritten(inv, tmp_path):
+    path = tmp_path / 'products.ndjson'
+    path.write_text('{"id": "42", "category": "home"}\n{"id": 43, "category": "home"}\n')
+
+    assert next(inv.iter_product_chunks(str(path)))['id'] == ['42', 43]
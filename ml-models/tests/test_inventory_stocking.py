@@ -0,0 +1,51 @@
+"""Tests for simulated stocking levels in inventory-predictor.py"""
+
+import importlib.util
+import math
+import os
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inventory-predictor.py')
+
+@pytest.fixture(scope='module')
+def inv():
+    spec = importlib.util.spec_from_file_location('inventory_predictor', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_seeded_reorder_point_matches_normal_quantile(inv):
+    category_data = {'shoes': {'avgDailySales': 20, 'demandStdDev': 5, 'leadTimeDays': 9, 'currentStock': 180}}
+    predictor = inv.InventoryPredictor()
+
+    result = predictor.simulate_stocking(category_data, service_level=0.95, simulations=20000, seed=7)['shoes']
+
+    # Fixed lead time: demand ~ N(20 * 9, 5 * sqrt(9)); z(0.95) = 1.645
+    expected = 20 * 9 + 1.645 * 5 * math.sqrt(9)
+    assert result['reorderPoint'] == pytest.approx(expected, abs=1.5)
+    assert result['safetyStock'] == pytest.approx(expected - 180, abs=1.5)
+    assert result['stockoutRisk'] == pytest.approx(0.5, abs=0.02)
+    assert result['status'] == 'low' and result['action'] == 'reorder'
+    assert result['optimalQuantity'] == 20 * 14
+    assert predictor.simulate_stocking(category_data, simulations=20000, seed=7)['shoes'] == result
+
+def test_variable_lead_time_raises_reorder_point(inv):
+    fixed = {'avgDailySales': 10, 'demandStdDev': 3, 'leadTimeDays': 10, 'currentStock': 500}
+    category_data = {'fixed': fixed, 'variable': dict(fixed, leadTimeStdDev=4)}
+
+    result = inv.InventoryPredictor().optimize_stocking(category_data, mode='simulate', simulations=5000, seed=1)
+
+    assert result['variable']['reorderPoint'] > result['fixed']['reorderPoint'] + 40
+    assert result['fixed']['status'] == 'adequate' and result['fixed']['stockoutRisk'] == 0
+
+def test_order_quantity_is_eoq_when_costs_are_known(inv):
+    category_data = {'bags': {'avgDailySales': 4, 'leadTimeDays': 5, 'orderCost': 50, 'holdingCost': 2}}
+
+    result = inv.InventoryPredictor().simulate_stocking(category_data, simulations=100)['bags']
+
+    assert result['optimalQuantity'] == math.ceil(math.sqrt(2 * 4 * 365 * 50 / 2))
+
+def test_invalid_service_level_is_rejected(inv):
+    with pytest.raises(ValueError):
+        inv.InventoryPredictor().simulate_stocking({'bags': {'avgDailySales': 1}}, service_level=1.0)
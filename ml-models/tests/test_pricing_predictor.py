@@ -0,0 +1,124 @@
+"""Tests for pricing-predictor.py"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pricing-predictor.py')
+
+@pytest.fixture(scope='module')
+def pricing():
+    spec = importlib.util.spec_from_file_location('pricing_predictor', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def write_model(model_path, encoders_path, prediction, bundled=True):
+    """
+    A constant-prediction model plus label encoders, as train-pricing-model.py
+    writes them (bundled) or as it used to (two files)
+    """
+    import joblib
+    from sklearn.dummy import DummyRegressor
+    from sklearn.preprocessing import LabelEncoder
+
+    model = DummyRegressor(strategy='constant', constant=prediction).fit(np.zeros((1, 9)), [prediction])
+    label_encoders = {
+        'category': LabelEncoder().fit(['clothing', 'electronics']),
+        'condition': LabelEncoder().fit(['good', 'new']),
+        'brand': LabelEncoder().fit(['Acme'])
+    }
+    if bundled:
+        joblib.dump({'format': 1, 'model': model, 'labelEncoders': label_encoders}, model_path)
+    else:
+        joblib.dump(label_encoders, encoders_path)
+        joblib.dump(model, model_path)
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'pricing-model.joblib'), str(tmp_path / 'label-encoders.joblib')
+
+def test_untrained_model_returns_default_adjustment(pricing, paths):
+    result = pricing.PricingModel(*paths).predict_batch([{'category': 'clothing'}])[0]
+
+    assert result['adjustmentFactor'] == 1.0
+    assert result['message'] == 'Model not trained yet'
+
+def test_model_reloads_after_mtime_change(pricing, paths):
+    write_model(*paths, prediction=1.1)
+    model = pricing.PricingModel(*paths)
+
+    assert model.predict_batch([{'category': 'clothing', 'condition': 'new'}])[0]['adjustmentFactor'] == pytest.approx(1.1)
+    assert not model.refresh()
+
+    write_model(*paths, prediction=0.9)
+    stat = os.stat(paths[0])
+    os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    results = model.predict_batch([{'category': 'electronics'}, {'category': 'toys'}])
+    assert results[0]['adjustmentFactor'] == pytest.approx(0.9)
+    assert 'Unknown category' in results[1]['error']
+    assert model.status()['reloads'] == 1
+
+def test_unloadable_update_keeps_serving_previous_model(pricing, paths):
+    write_model(*paths, prediction=1.2)
+    model = pricing.PricingModel(*paths)
+    model.refresh()
+
+    with open(paths[0], 'wb') as f:
+        f.write(b'not a model')
+
+    result = model.predict_batch([{'category': 'clothing'}])[0]
+    assert result['adjustmentFactor'] == pytest.approx(1.2)
+    assert model.status()['reloads'] == 0
+
+def test_worker_answers_predict_and_health(pricing, paths):
+    write_model(*paths, prediction=1.05)
+    worker = pricing.PricingWorker(pricing.PricingModel(*paths))
+
+    response = worker.handle_line('{"id": 3, "command": "predict_batch", "factors": [{"category": "clothing"}]}')
+    assert response['id'] == 3 and response['success']
+    assert response['results'][0]['adjustmentFactor'] == pytest.approx(1.05)
+    assert worker.handle_line('{"id": 4, "command": "health"}')['requestsServed'] == 1
+
+def test_two_file_layout_still_loads(pricing, paths):
+    write_model(*paths, prediction=1.15, bundled=False)
+
+    result = pricing.PricingModel(*paths).predict_batch([{'category': 'electronics'}])[0]
+
+    assert result['adjustmentFactor'] == pytest.approx(1.15)
+
+def test_bundle_does_not_read_separate_encoders(pricing, paths):
+    write_model(*paths, prediction=0.95)
+    with open(paths[1], 'wb') as f:
+        f.write(b'stale encoders')
+
+    model = pricing.PricingModel(*paths)
+
+    assert model.refresh()
+    assert model.labels['category'] == {'clothing': 0, 'electronics': 1}
+
+def test_failed_load_is_not_retried_until_the_file_changes(pricing, paths, monkeypatch):
+    import joblib
+
+    with open(paths[0], 'wb') as f:
+        f.write(b'not a model')
+    model = pricing.PricingModel(*paths)
+    loads = []
+    real_load = joblib.load
+    monkeypatch.setattr(joblib, 'load', lambda path: loads.append(path) or real_load(path))
+
+    for _ in range(3):
+        assert 'error' in model.predict_batch([{'category': 'clothing'}])[0]
+    assert len(loads) == 1
+    assert model.status()['lastError']
+
+    with pytest.raises(Exception):
+        model.refresh(force=True)
+    assert len(loads) == 2
+
+    write_model(*paths, prediction=1.1)
+    assert model.predict_batch([{'category': 'clothing'}])[0]['adjustmentFactor'] == pytest.approx(1.1)
+    assert model.status()['lastError'] is None
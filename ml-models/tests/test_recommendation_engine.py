@@ -0,0 +1,293 @@
+"""Tests for recommendation-engine.py"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'recommendation-engine.py')
+
+@pytest.fixture(scope='module')
+def rec():
+    spec = importlib.util.spec_from_file_location('recommendation_engine', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def toy_interactions():
+    """Two taste clusters of five users each over eight products"""
+    interactions = []
+    for user in range(10):
+        items = range(4) if user < 5 else range(4, 8)
+        for item in items:
+            if (user + item) % 4 != 0:
+                interactions.append({'userId': 'u%d' % user, 'productId': 'p%d' % item, 'score': 1.0 + (user * item) % 3})
+    return interactions
+
+def test_user_item_matrix_is_sparse_and_keeps_last_score(rec):
+    from scipy import sparse
+
+    engine = rec.RecommendationEngine()
+    interactions = toy_interactions() + [{'userId': 'u1', 'productId': 'p2', 'score': 9.0}]
+    matrix = engine.build_user_item_matrix(interactions)
+
+    assert sparse.isspmatrix_csr(matrix)
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (10, 8)
+    assert matrix[engine.user_index['u1'], engine.item_index['p2']] == 9.0
+    assert engine.matrix_stats()['nnz'] == matrix.nnz
+
+def test_collaborative_recommendations_skip_seen_items(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+
+    seen = {i['productId'] for i in toy_interactions() if i['userId'] == 'u0'}
+    recommended = [pid for pid, _ in engine.get_collaborative_recommendations('u0', 8)]
+
+    assert recommended
+    assert not seen & set(recommended)
+    assert len(recommended) == 8 - len(seen)
+
+def test_saved_artifact_round_trips(rec, tmp_path):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+    version = engine.save(str(tmp_path))
+
+    loaded = rec.RecommendationEngine.load(str(tmp_path))
+
+    assert loaded.version == version
+    assert loaded.user_ids == engine.user_ids
+    assert loaded.item_ids == engine.item_ids
+    np.testing.assert_array_equal(loaded.user_factors, engine.user_factors)
+    np.testing.assert_array_equal(loaded.item_factors, engine.item_factors)
+    assert (loaded.user_item_matrix != engine.user_item_matrix).nnz == 0
+    for user_id in ('u0', 'u7'):
+        assert loaded.get_collaborative_recommendations(user_id, 5) == engine.get_collaborative_recommendations(user_id, 5)
+
+def test_save_keeps_only_recent_versions(rec, tmp_path):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+    versions = [engine.save(str(tmp_path), keep_versions=2) for _ in range(4)]
+
+    assert sorted(os.listdir(tmp_path)) == sorted(versions[-2:] + ['CURRENT'])
+    assert (tmp_path / 'CURRENT').read_text() == versions[-1]
+
+def test_recommend_all_matches_per_user_recommendations(rec, tmp_path):
+    import json
+
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+    output = str(tmp_path / 'recommendations.ndjson')
+
+    summary = engine.recommend_all(output, n_recommendations=3, block_rows=3, workers=2)
+
+    with open(output) as f:
+        lines = [json.loads(line) for line in f]
+    assert summary['users'] == len(lines) == 10
+    assert [line['userId'] for line in lines] == engine.user_ids
+    for line in lines:
+        expected = dict(engine.get_collaborative_recommendations(line['userId'], 3))
+        got = {pid: score for pid, score in line['recommendations']}
+        assert got.keys() == expected.keys()
+        for pid, score in got.items():
+            assert score == pytest.approx(expected[pid], abs=1e-5)
+
+def test_fold_in_agrees_with_retrain_on_toy_matrix(rec):
+    interactions = toy_interactions()
+    held_out = [i for i in interactions if i['userId'] == 'u4']
+    retrained = rec.RecommendationEngine()
+    retrained.build_user_item_matrix(interactions)
+    retrained.train_collaborative_filtering(n_components=2)
+
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix([i for i in interactions if i['userId'] != 'u4'])
+    engine.train_collaborative_filtering(n_components=2)
+    summary = engine.fold_in(held_out)
+
+    assert summary['newUsers'] == 1 and summary['newItems'] == 0
+    assert summary['drift'] == pytest.approx(0.0, abs=0.02)
+    assert not summary['retrainRecommended']
+    folded = engine.get_collaborative_recommendations('u4', 1)
+    assert [pid for pid, _ in folded] == [pid for pid, _ in retrained.get_collaborative_recommendations('u4', 1)] == ['p0']
+
+def test_fold_in_reports_drift_for_unrelated_behaviour(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+
+    summary = engine.fold_in([
+        {'userId': 'n%d' % user, 'productId': 'q%d' % item, 'score': 3.0}
+        for user in range(10) for item in range(4)
+    ])
+
+    assert summary['newUsers'] == 10 and summary['newItems'] == 4
+    assert summary['drift'] > 0.3
+    assert summary['retrainRecommended']
+    assert engine.lineage['updates'] == 1
+    assert engine.user_factors.shape[0] == len(engine.user_ids) == 20
+
+def test_als_training_converges_and_recommends_within_cluster(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    losses = engine.train_als(factors=4, iterations=30, tol=0.05, workers=2)
+
+    assert all(later <= earlier + 1e-6 for earlier, later in zip(losses, losses[1:]))
+    assert len(losses) < 30
+    assert engine.algorithm == 'als' and engine.params['iterations'] == len(losses)
+    assert [pid for pid, _ in engine.get_collaborative_recommendations('u0', 1)] == ['p0']
+    assert [pid for pid, _ in engine.get_collaborative_recommendations('u5', 1)] == ['p7']
+
+def test_als_factors_do_not_depend_on_worker_count(rec):
+    factors = []
+    for workers in (1, 3):
+        engine = rec.RecommendationEngine()
+        engine.build_user_item_matrix(toy_interactions())
+        engine.train_als(factors=4, iterations=5, workers=workers)
+        factors.append((engine.user_factors, engine.item_factors))
+
+    np.testing.assert_allclose(factors[0][0], factors[1][0], rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(factors[0][1], factors[1][1], rtol=1e-4, atol=1e-5)
+
+def test_als_fold_in_agrees_with_retrain(rec, tmp_path):
+    interactions = toy_interactions()
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix([i for i in interactions if i['userId'] != 'u4'])
+    engine.train_als(factors=4, iterations=15)
+    engine.save(str(tmp_path))
+
+    engine = rec.RecommendationEngine.load(str(tmp_path))
+    assert engine.algorithm == 'als'
+    summary = engine.fold_in([i for i in interactions if i['userId'] == 'u4'])
+
+    assert summary['newUsers'] == 1
+    assert not summary['retrainRecommended']
+    assert [pid for pid, _ in engine.get_collaborative_recommendations('u4', 1)] == ['p0']
+
+def toy_products():
+    conditions = ['new', 'like-new', 'good', 'fair']
+    return [
+        {'id': 'p%d' % i, 'category': ['shoes', 'bags', 'coats'][i % 3], 'condition': conditions[i % 4], 'price': 137 * (i + 1) ** 2}
+        for i in range(12)
+    ]
+
+def assert_neighbours_match_brute_force(engine, k):
+    for pid in engine.feature_ids:
+        if engine.feature_active is not None and not engine.feature_active[engine.feature_index[pid]]:
+            continue
+        table = engine.get_content_based_recommendations(pid, k)
+        brute = engine.get_content_based_recommendations(pid, k + 1)[:k]
+        assert [p for p, _ in table] == [p for p, _ in brute]
+        for (_, got), (_, expected) in zip(table, brute):
+            assert got == pytest.approx(expected, abs=2e-3)
+
+def test_refresh_neighbours_matches_a_full_rebuild(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_item_features_matrix(toy_products())
+    engine.build_neighbours(k=3)
+    assert_neighbours_match_brute_force(engine, 3)
+
+    summary = engine.refresh_neighbours(
+        [{'id': 'p4', 'category': 'shoes', 'condition': 'poor', 'price': 90}, {'id': 'p12', 'category': 'bags', 'price': 4000}],
+        removed_ids=['p7']
+    )
+
+    assert summary['added'] == 1 and summary['changed'] == 1 and summary['removed'] == 1
+    assert_neighbours_match_brute_force(engine, 3)
+    for pid in engine.feature_ids:
+        assert 'p7' not in [p for p, _ in engine.get_content_based_recommendations(pid, 3)]
+
+def matrix_scores(engine):
+    matrix = engine.user_item_matrix.tocoo()
+    return {
+        (engine.user_ids[r], engine.item_ids[c]): float(v)
+        for r, c, v in zip(matrix.row.tolist(), matrix.col.tolist(), matrix.data.tolist())
+    }
+
+def test_streamed_update_matches_training_on_all_events(rec, tmp_path):
+    import json
+
+    day = 86400.0
+    events = [
+        {'userId': 'u%d' % (i % 6), 'productId': 'p%d' % (i % 5), 'eventType': ['view', 'cart', 'purchase'][i % 3],
+         'timestamp': 1.7e9 + i * day / 4}
+        for i in range(60)
+    ]
+    events += [{'userId': 'u9', 'productId': 'p7', 'eventType': 'purchase', 'timestamp': 1.7e9 + 16 * day}]
+    first, second = events[:40], events[40:]
+    paths = {}
+    for name, chunk in (('all', events), ('first', first), ('second', second)):
+        paths[name] = str(tmp_path / (name + '.ndjson'))
+        with open(paths[name], 'w') as f:
+            f.writelines(json.dumps(event) + '\n' for event in chunk)
+    as_of = 1.7e9 + 20 * day
+
+    full = rec.RecommendationEngine()
+    full.build_user_item_matrix_from_stream(paths['all'], half_life_days=7, as_of=as_of)
+    full.train_collaborative_filtering(n_components=2)
+
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix_from_stream(paths['first'], half_life_days=7, as_of=1.7e9 + 10 * day)
+    engine.train_collaborative_filtering(n_components=2)
+    engine.save(str(tmp_path / 'model'))
+    engine = rec.RecommendationEngine.load(str(tmp_path / 'model'))
+    aggregator = rec.InteractionAggregator(half_life_days=7, as_of=as_of)
+    summary = engine.fold_in(
+        aggregator.consume(rec.iter_interaction_records(paths['second'])).records(),
+        accumulate=True, as_of=as_of, half_life_days=7
+    )
+
+    expected = matrix_scores(full)
+    got = matrix_scores(engine)
+    assert got.keys() == expected.keys()
+    for pair, score in expected.items():
+        assert got[pair] == pytest.approx(score, rel=1e-5)
+    assert summary['newUsers'] == 1 and summary['newItems'] == 1
+    assert engine.lineage['scoresAsOf'] == as_of
+
+def test_explicit_update_replaces_stored_scores(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(toy_interactions())
+    engine.train_collaborative_filtering(n_components=2)
+
+    engine.fold_in([{'userId': 'u1', 'productId': 'p2', 'score': 9.0}])
+
+    assert matrix_scores(engine)[('u1', 'p2')] == 9.0
+
+def test_saved_artifact_keeps_mixed_id_types(rec, tmp_path):
+    interactions = [
+        {'userId': 7, 'productId': 101, 'score': 2.0},
+        {'userId': 7, 'productId': 'sku-9', 'score': 1.0},
+        {'userId': '7', 'productId': '101', 'score': 3.0},
+        {'userId': 'u2', 'productId': 101, 'score': 1.0},
+        {'userId': 'u2', 'productId': '101', 'score': 2.0}
+    ]
+    engine = rec.RecommendationEngine()
+    engine.build_user_item_matrix(interactions)
+    engine.build_item_features_matrix([{'id': 101, 'category': 'a'}, {'id': '101', 'category': 'b'}])
+    engine.train_collaborative_filtering(n_components=2)
+    engine.save(str(tmp_path))
+
+    loaded = rec.RecommendationEngine.load(str(tmp_path))
+
+    assert loaded.user_ids == engine.user_ids == [7, '7', 'u2']
+    assert loaded.item_ids == engine.item_ids == [101, '101', 'sku-9']
+    assert loaded.feature_ids == [101, '101']
+    assert loaded.get_collaborative_recommendations(7, 2) == engine.get_collaborative_recommendations(7, 2)
+
+def test_refresh_neighbours_counts_changes_alongside_removals(rec):
+    engine = rec.RecommendationEngine()
+    engine.build_item_features_matrix(toy_products())
+    engine.build_neighbours(k=3)
+
+    summary = engine.refresh_neighbours(
+        [{'id': 'p4', 'category': 'shoes', 'price': 90}, {'id': 'p12', 'category': 'bags', 'price': 4000}],
+        removed_ids=['p12', 'p7']
+    )
+
+    assert summary['added'] == 1 and summary['changed'] == 1 and summary['removed'] == 2
+    assert_neighbours_match_brute_force(engine, 3)
@@ -0,0 +1,187 @@
+"""Tests for visual-search-clip.py that need no CLIP weights"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'visual-search-clip.py')
+
+@pytest.fixture
+def vsc(tmp_path, monkeypatch):
+    """The script as a module, with a fake encoder and a cache under tmp_path"""
+    spec = importlib.util.spec_from_file_location('visual_search_clip', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    # Each "image" is its path; its embedding is a one-hot vector at that number
+    def encode_image_batch(images, backend=None):
+        return np.eye(8, dtype=np.float32)[[int(image) for image in images]]
+
+    def read_image_bytes(path):
+        if path == 'missing':
+            raise FileNotFoundError(path)
+        return str(path).encode()
+
+    monkeypatch.setattr(module, 'read_image_bytes', read_image_bytes)
+    monkeypatch.setattr(module, 'load_image', lambda image_bytes, draft_size=None: image_bytes.decode())
+    monkeypatch.setattr(module, 'encode_image_batch', encode_image_batch)
+    module.configure_cache(cache_dir=str(tmp_path), enabled=True)
+    return module
+
+def test_iter_encode_images_keeps_input_order_with_cache_hits(vsc):
+    # Warm the cache for image 1 only
+    list(vsc.iter_encode_images(['1']))
+
+    results = list(vsc.iter_encode_images(['0', '1', '2', '3'], batch_size=3))
+
+    assert [r['index'] for r in results] == [0, 1, 2, 3]
+    assert [r.get('cached', False) for r in results] == [False, True, False, False]
+    for r in results:
+        assert int(np.argmax(r['embedding'])) == int(r['path'])
+
+def test_batch_encode_images_matches_paths(vsc):
+    list(vsc.iter_encode_images(['2', '5']))
+
+    paths = ['0', '2', '3', '5', '6']
+    embeddings = vsc.batch_encode_images(paths, batch_size=4)
+
+    assert [int(np.argmax(e)) for e in embeddings] == [int(p) for p in paths]
+
+def test_batch_encode_base64_rows_map_back_to_paths(vsc):
+    list(vsc.iter_encode_images(['4']))
+
+    paths = ['1', 'missing', '4', '3']
+    result = vsc.run_command('batch_encode', {
+        'imagePaths': paths, 'embeddingFormat': 'base64-f32', 'batchSize': 2
+    }, None)
+
+    rows = vsc.unpack_embeddings(result['embeddings'], 'base64-f32', result['dimensions'])
+    assert result['indices'] == [0, 2, 3]
+    assert [int(np.argmax(row)) for row in rows] == [int(paths[i]) for i in result['indices']]
+    assert [(f['index'], f['path']) for f in result['failures']] == [(1, 'missing')]
+
+def test_parse_options_only_consumes_known_options(vsc):
+    assert vsc.parse_options(['encode_text', '--hello']) == (['encode_text', '--hello'], {})
+    assert vsc.parse_options(['batch_encode', '--stream', 'paths.txt', '--batch-size', '8']) == (
+        ['batch_encode', 'paths.txt'], {'stream': True, 'batchSize': '8'}
+    )
+    assert vsc.parse_options(['encode_text', '--', '--stream']) == (['encode_text', '--stream'], {})
+
+def test_store_writes_swap_whole_versions(vsc, tmp_path):
+    path = str(tmp_path / 'store')
+    first = vsc.EmbeddingStore.write(path, ['a', 'b', 'c'], np.eye(8, dtype=np.float32)[:3], versions={'a': 1})
+
+    second = first.apply_changes({'d': np.eye(8, dtype=np.float32)[3]}, ['b'], {'a': 1, 'd': 1})
+    third = second.build_index(n_lists=2)
+
+    assert first.search(np.eye(8)[1], top_k=1)[0][0] == 'b'
+    assert sorted(third.ids.tolist()) == ['a', 'c', 'd']
+    assert third.versions == {'a': 1, 'd': 1}
+    assert third.version_dir != second.version_dir != first.version_dir
+    assert open(os.path.join(path, 'CURRENT')).read() == os.path.basename(third.version_dir)
+    assert vsc.open_store(path).version_dir == third.version_dir
+
+    for _ in range(3):
+        vsc.EmbeddingStore.write(path, ['a'], np.eye(8, dtype=np.float32)[:1])
+    assert len([name for name in os.listdir(path) if name != 'CURRENT']) == vsc.EmbeddingStore.KEEP_VERSIONS
+
+def test_store_rejects_mismatched_files(vsc, tmp_path):
+    path = str(tmp_path / 'store')
+    store = vsc.EmbeddingStore.write(path, ['a', 'b'], np.eye(8, dtype=np.float32)[:2])
+    np.save(os.path.join(store.version_dir, 'ids.npy'), np.asarray(['a', 'b', 'c']))
+
+    with pytest.raises(ValueError):
+        vsc.EmbeddingStore(path)
+
+def test_store_opens_and_upgrades_unversioned_layout(vsc, tmp_path):
+    path = str(tmp_path / 'store')
+    store = vsc.EmbeddingStore.write(path, ['a', 'b'], np.eye(8, dtype=np.float32)[:2], versions={'a': 3})
+    for name in os.listdir(store.version_dir):
+        os.replace(os.path.join(store.version_dir, name), os.path.join(path, name))
+    os.rmdir(store.version_dir)
+    os.remove(os.path.join(path, 'CURRENT'))
+
+    legacy = vsc.EmbeddingStore(path)
+    assert legacy.version_dir == path and legacy.ids.tolist() == ['a', 'b']
+
+    upgraded = legacy.apply_changes({}, ['a'], None)
+    assert upgraded.ids.tolist() == ['b'] and upgraded.versions == {'a': 3}
+    assert sorted(os.listdir(path)) == sorted(['CURRENT', os.path.basename(upgraded.version_dir)])
+
+def test_cache_flushes_from_two_processes_stay_consistent(vsc, tmp_path):
+    import multiprocessing
+
+    path = str(tmp_path / 'shared.bin')
+    dimensions = 4
+    record_bytes = 32 + 8 + 4 * dimensions
+    max_entries = 60
+
+    def key(value):
+        return vsc.EmbeddingCache.key_for('test', str(value))
+
+    def writer(worker):
+        cache = vsc.EmbeddingCache(path, max_bytes=vsc.EmbeddingCache.HEADER.size + max_entries * record_bytes)
+        for batch in range(30):
+            keys = [key(worker * 10000 + batch * 10 + i) for i in range(5)]
+            for i, k in enumerate(keys):
+                cache.put(k, np.full(dimensions, worker * 10000 + batch * 10 + i, dtype=np.float32))
+            cache.flush()
+            # The batch landed in the live file, not one replaced by an eviction
+            if not all(k in cache.index for k in keys):
+                os._exit(1)
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=writer, args=(worker,)) for worker in (1, 2)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data[:4] == vsc.EmbeddingCache.MAGIC
+    assert (len(data) - vsc.EmbeddingCache.HEADER.size) % record_bytes == 0
+
+    cache = vsc.EmbeddingCache(path)
+    vectors = cache.records['vector']
+    assert 0 < len(cache.records) <= max_entries
+    assert (vectors == vectors[:, :1]).all()
+    assert [bytes(k) for k in cache.records['key']] == [key(int(v)) for v in vectors[:, 0]]
+
+def test_batch_encode_json_reports_indices_and_failures(vsc):
+    result = vsc.run_command('batch_encode', {'imagePaths': ['2', 'missing', '5']}, None)
+
+    assert result['indices'] == [0, 2]
+    assert [int(np.argmax(e)) for e in result['embeddings']] == [2, 5]
+    assert [(f['index'], f['path']) for f in result['failures']] == [(1, 'missing')]
+
+def test_single_and_batch_encoding_agree_with_and_without_the_cache(tmp_path, monkeypatch):
+    from PIL import Image
+
+    spec = importlib.util.spec_from_file_location('visual_search_clip', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    # The embedding records the decoded size, so draft and full decodes differ
+    def encode_image_batch(images, backend=None):
+        return np.asarray([[image.size[0], image.size[1], 1.0] for image in images], dtype=np.float32)
+
+    monkeypatch.setattr(module, 'encode_image_batch', encode_image_batch)
+
+    path = str(tmp_path / 'photo.jpg')
+    Image.new('RGB', (1600, 1200), (200, 40, 40)).save(path, 'JPEG')
+
+    module.configure_cache(enabled=False)
+    expected = module.encode_image(path)
+    assert module.batch_encode_images([path]) == [expected]
+
+    for name, single_first in (('single', True), ('batch', False)):
+        module.configure_cache(cache_dir=str(tmp_path / name), enabled=True)
+        if single_first:
+            results = [module.encode_image(path), module.batch_encode_images([path])[0]]
+        else:
+            results = [module.batch_encode_images([path])[0], module.encode_image(path)]
+        assert results == [expected, expected]
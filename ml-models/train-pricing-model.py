@@ -14,6 +14,7 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 import os
+import time
 
 def train_pricing_model(training_data):
     """Train Random Forest model for pricing optimization"""
@@ -79,12 +80,17 @@ def train_pricing_model(training_data):
     mae = mean_absolute_error(y_test, y_pred)
     r2 = r2_score(y_test, y_pred)
     
-    # Save model
+    # Save model and encoders as one bundle, written then renamed, so a
+    # running pricing-predictor.py serve worker can never pair a new model
+    # with old encoders
     model_path = os.path.join(os.path.dirname(__file__), 'pricing-model.joblib')
-    encoders_path = os.path.join(os.path.dirname(__file__), 'label-encoders.joblib')
-    
-    joblib.dump(model, model_path)
-    joblib.dump(label_encoders, encoders_path)
+    joblib.dump({
+        'format': 1,
+        'model': model,
+        'labelEncoders': label_encoders,
+        'trainedAt': time.time()
+    }, model_path + '.tmp')
+    os.replace(model_path + '.tmp', model_path)
     
     # Feature importance
     feature_importance = dict(zip(feature_cols, model.feature_importances_))
@@ -6,34 +6,653 @@ Generates image embeddings and finds similar products
 
 import sys
 import json
-import torch
 import numpy as np
-from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
 import os
+import io
+import time
 import base64
+import fcntl
+import hashlib
+import shutil
+import signal
+import struct
+import socketserver
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
+# torch, transformers, PIL and onnxruntime are imported inside the functions
+# that need them: every request may be a fresh process, and commands such as
+# find_similar or cache_stats never touch the model.
+
 # Load CLIP model (using smaller ViT-B/32 for faster inference)
 MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# Inference backends: eager PyTorch float32, PyTorch with dynamically
+# quantized int8 Linear layers, or an exported ONNX graph (see export_onnx)
+BACKENDS = ('torch', 'int8', 'onnx')
+BACKEND = os.environ.get('VISUAL_SEARCH_BACKEND', 'torch')
+ONNX_DIR = os.environ.get(
+    'VISUAL_SEARCH_ONNX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clip-onnx')
+)
+NUM_THREADS = int(os.environ['VISUAL_SEARCH_THREADS']) if os.environ.get('VISUAL_SEARCH_THREADS') else None
+
 model = None
 processor = None
+loaded_backends = {}
 
-def initialize_model():
-    """Initialize CLIP model and processor"""
-    global model, processor
-    
-    if model is None:
+class TorchClipBackend:
+    """Eager PyTorch CLIP, optionally with int8 dynamically quantized Linear layers"""
+
+    tensor_type = 'pt'
+
+    def __init__(self, quantize=False):
+        import torch
+        from transformers import CLIPModel
+
+        self.name = 'int8' if quantize else 'torch'
+        if NUM_THREADS:
+            torch.set_num_threads(NUM_THREADS)
+
+        clip = CLIPModel.from_pretrained(MODEL_NAME)
+        clip.eval()  # Set to evaluation mode
+        if quantize:
+            clip = torch.quantization.quantize_dynamic(clip, {torch.nn.Linear}, dtype=torch.qint8)
+        self.clip = clip
+
+    def image_features(self, inputs):
+        import torch
+
+        with torch.no_grad():
+            image_features = self.clip.get_image_features(**inputs)
+            # Normalize embeddings
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        return image_features.cpu().numpy()
+
+    def text_features(self, inputs):
+        import torch
+
+        with torch.no_grad():
+            text_features = self.clip.get_text_features(**inputs)
+            # Normalize embeddings
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        return text_features.cpu().numpy()
+
+class OnnxClipBackend:
+    """CLIP towers exported by export_onnx, run with onnxruntime on CPU"""
+
+    tensor_type = 'np'
+
+    def __init__(self, onnx_dir):
+        import onnxruntime
+
+        self.name = 'onnx'
+        options = onnxruntime.SessionOptions()
+        if NUM_THREADS:
+            options.intra_op_num_threads = NUM_THREADS
+
+        def session(filename):
+            path = os.path.join(onnx_dir, filename)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'{path} not found, run export_onnx first')
+            return onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+        self.image_session = session('image.onnx')
+        self.text_session = session('text.onnx')
+
+    def image_features(self, inputs):
+        pixel_values = np.asarray(inputs['pixel_values'], dtype=np.float32)
+        return self.image_session.run(None, {'pixel_values': pixel_values})[0]
+
+    def text_features(self, inputs):
+        return self.text_session.run(None, {
+            'input_ids': np.asarray(inputs['input_ids'], dtype=np.int64),
+            'attention_mask': np.asarray(inputs['attention_mask'], dtype=np.int64)
+        })[0]
+
+def configure_backend(backend=None, threads=None):
+    """Select the inference backend and CPU thread count before first use"""
+    global BACKEND, NUM_THREADS, model
+
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend: {backend} (expected one of {", ".join(BACKENDS)})')
+        BACKEND = backend
+    if threads is not None:
+        NUM_THREADS = int(threads)
+    model = loaded_backends.get(BACKEND)
+
+def load_backend(name):
+    """Load (once) and return the named inference backend"""
+    global processor
+
+    if name not in loaded_backends:
         try:
-            print("Loading CLIP model...", file=sys.stderr)
-            model = CLIPModel.from_pretrained(MODEL_NAME)
-            processor = CLIPProcessor.from_pretrained(MODEL_NAME)
-            model.eval()  # Set to evaluation mode
+            print(f"Loading CLIP model ({name} backend)...", file=sys.stderr)
+            if processor is None:
+                from transformers import CLIPProcessor
+                processor = CLIPProcessor.from_pretrained(MODEL_NAME)
+            if name == 'onnx':
+                loaded_backends[name] = OnnxClipBackend(ONNX_DIR)
+            else:
+                loaded_backends[name] = TorchClipBackend(quantize=(name == 'int8'))
             print("CLIP model loaded successfully", file=sys.stderr)
         except Exception as e:
             print(f"Failed to load CLIP model: {e}", file=sys.stderr)
             raise
 
+    return loaded_backends[name]
+
+def initialize_model():
+    """Initialize CLIP model and processor for the selected backend"""
+    global model
+    
+    if model is None:
+        model = load_backend(BACKEND)
+    return model
+
+def export_onnx(output_dir):
+    """
+    Export the CLIP image and text towers (with output normalization) to ONNX
+
+    Returns:
+        Dict of exported file paths and sizes
+    """
+    import torch
+
+    clip = load_backend('torch').clip
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            features = self.clip.get_image_features(pixel_values=pixel_values)
+            return features / features.norm(dim=-1, keepdim=True)
+
+    class TextTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, input_ids, attention_mask):
+            features = self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+            return features / features.norm(dim=-1, keepdim=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    image_path = os.path.join(output_dir, 'image.onnx')
+    text_path = os.path.join(output_dir, 'text.onnx')
+
+    image_size = processor.image_processor.crop_size['height']
+    dummy_pixels = torch.zeros(1, 3, image_size, image_size)
+    dummy_text = processor(text=['a photo'], return_tensors='pt', padding=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            ImageTower(clip), (dummy_pixels,), image_path,
+            input_names=['pixel_values'], output_names=['image_embeds'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}},
+            opset_version=14
+        )
+        torch.onnx.export(
+            TextTower(clip), (dummy_text['input_ids'], dummy_text['attention_mask']), text_path,
+            input_names=['input_ids', 'attention_mask'], output_names=['text_embeds'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'text_embeds': {0: 'batch'}
+            },
+            opset_version=14
+        )
+
+    with open(os.path.join(output_dir, 'export.json'), 'w') as f:
+        json.dump({'model': MODEL_NAME, 'exportedAt': time.time()}, f, indent=2)
+
+    return {
+        'imageModel': image_path,
+        'textModel': text_path,
+        'bytes': os.path.getsize(image_path) + os.path.getsize(text_path)
+    }
+
+def parity_check(image_paths, candidate, texts=None, batch_size=16):
+    """
+    Compare a candidate backend against eager float32 PyTorch
+
+    Images are decoded once up front so only inference is timed.
+
+    Returns:
+        Cosine agreement between candidate and reference embeddings plus
+        images/sec for each backend and the candidate speedup
+    """
+    images = [load_image(read_image_bytes(path)) for path in image_paths]
+    if not images:
+        raise ValueError('No images to compare')
+
+    def run(backend):
+        encode_image_batch(images[:1], backend)  # warm-up
+        start = time.time()
+        embeddings = np.concatenate([
+            encode_image_batch(images[i:i + batch_size], backend)
+            for i in range(0, len(images), batch_size)
+        ])
+        return embeddings, len(images) / (time.time() - start)
+
+    reference, reference_rate = run(load_backend('torch'))
+    candidate_embeddings, candidate_rate = run(load_backend(candidate))
+    cosines = np.sum(reference * candidate_embeddings, axis=1)
+
+    report = {
+        'reference': 'torch',
+        'candidate': candidate,
+        'images': len(images),
+        'threads': NUM_THREADS,
+        'cosine': {'mean': float(cosines.mean()), 'min': float(cosines.min())},
+        'imagesPerSec': {'torch': round(reference_rate, 2), candidate: round(candidate_rate, 2)},
+        'speedup': round(candidate_rate / reference_rate, 3)
+    }
+
+    if texts:
+        text_reference = encode_text_batch(texts, load_backend('torch'))
+        text_candidate = encode_text_batch(texts, load_backend(candidate))
+        text_cosines = np.sum(text_reference * text_candidate, axis=1)
+        report['textCosine'] = {'mean': float(text_cosines.mean()), 'min': float(text_cosines.min())}
+
+    return report
+
+def read_image_bytes(image_path_or_data):
+    """Raw bytes of an image given as a file path, http(s) URL or base64 data URI"""
+    if image_path_or_data.startswith('data:image'):
+        # Base64 encoded image
+        image_data = image_path_or_data.split(',')[1]
+        return base64.b64decode(image_data)
+
+    if image_path_or_data.startswith(('http://', 'https://')):
+        import urllib.request
+        with urllib.request.urlopen(image_path_or_data, timeout=30) as response:
+            return response.read()
+
+    # File path
+    with open(image_path_or_data, 'rb') as f:
+        return f.read()
+
+# CLIP crops to 224x224, so JPEGs can be decoded at reduced scale down to this
+DECODE_DRAFT_SIZE = (224, 224)
+
+def load_image(image_bytes, draft_size=None):
+    """
+    Decode image bytes as an RGB PIL image
+
+    Args:
+        image_bytes: Encoded image file contents
+        draft_size: Optional (w, h) hint letting JPEG decoding downscale
+                    while keeping both sides at least this large
+
+    Returns:
+        PIL RGB image
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes))
+
+    if draft_size is not None:
+        image.draft('RGB', draft_size)
+
+    return image.convert('RGB')
+
+def prepare_image(image_path_or_data, draft_size=DECODE_DRAFT_SIZE):
+    """
+    Hash an image and either fetch its cached embedding or decode it
+
+    The cache key includes the decode mode, since a draft-decoded JPEG
+    embeds slightly differently from a full-size decode.
+
+    Returns:
+        (cache key, cached embedding or None, decoded image or None)
+    """
+    image_bytes = read_image_bytes(image_path_or_data)
+
+    cache = get_image_cache()
+    key = None
+    if cache is not None:
+        key = EmbeddingCache.key_for(cache_namespace(draft_size), image_bytes)
+        embedding = cache.get(key)
+        if embedding is not None:
+            return key, embedding, None
+
+    return key, None, load_image(image_bytes, draft_size)
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache
+
+    Entries live in a single binary file: a header (magic, version,
+    dimensions) followed by fixed-size records of
+        key      32-byte SHA-256 of (namespace, content)
+        used     float64 last-access timestamp
+        vector   float32[dimensions]
+
+    The file is memory-mapped for lookups; new entries are buffered and
+    appended on flush(). When the file grows past max_bytes the least
+    recently used entries are dropped by rewriting it down to 90% of the
+    budget.
+    """
+
+    MAGIC = b'SKEC'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHI')
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.lock = threading.RLock()
+        self.dimensions = None
+        self.records = None
+        self.index = {}
+        self.inode = None
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def key_for(namespace, content):
+        """Content address for bytes (or text) under a model namespace"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(namespace.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content)
+        return digest.digest()
+
+    def _record_dtype(self, dimensions):
+        return np.dtype([
+            ('key', 'u1', (32,)),
+            ('used', '<f8'),
+            ('vector', '<f4', (dimensions,))
+        ])
+
+    def _load(self):
+        """(Re)map the cache file and rebuild the key index"""
+        self.records = None
+        self.index = {}
+        self.inode = None
+
+        if not os.path.exists(self.path):
+            return
+        self.inode = os.stat(self.path).st_ino
+
+        with open(self.path, 'rb') as f:
+            header = f.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            return
+
+        magic, version, dimensions = self.HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            print(f"Ignoring incompatible embedding cache {self.path}", file=sys.stderr)
+            return
+
+        self.dimensions = dimensions
+        record_dtype = self._record_dtype(dimensions)
+        # A torn trailing record from an interrupted append is ignored
+        count = (os.path.getsize(self.path) - self.HEADER.size) // record_dtype.itemsize
+        if count == 0:
+            return
+
+        self.records = np.memmap(
+            self.path, dtype=record_dtype, mode='r+', offset=self.HEADER.size, shape=(count,)
+        )
+        keys = self.records['key']
+        self.index = {keys[i].tobytes(): i for i in range(count)}
+
+    def _extend(self):
+        """
+        Map records appended since the last load and index only those
+
+        Falls back to a full _load() when the file was replaced (eviction
+        by this or another process) or is not mapped yet.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._load()
+            return
+        if self.records is None or stat.st_ino != self.inode:
+            self._load()
+            return
+
+        record_dtype = self._record_dtype(self.dimensions)
+        count = (stat.st_size - self.HEADER.size) // record_dtype.itemsize
+        known = len(self.records)
+        if count < known:
+            self._load()
+            return
+        if count == known:
+            return
+
+        self.records = np.memmap(
+            self.path, dtype=record_dtype, mode='r+', offset=self.HEADER.size, shape=(count,)
+        )
+        keys = self.records['key']
+        for i in range(known, count):
+            self.index[keys[i].tobytes()] = i
+
+    def __len__(self):
+        return len(self.index) + len(self.pending)
+
+    def get(self, key):
+        """Cached vector for key, or None"""
+        with self.lock:
+            vector = self.pending.get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+
+            row = self.index.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.records['used'][row] = time.time()
+            self.hits += 1
+            return np.array(self.records['vector'][row])
+
+    def put(self, key, vector):
+        """Buffer a vector for the next flush()"""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            if self.dimensions is None:
+                self.dimensions = int(vector.shape[0])
+            if vector.shape[0] != self.dimensions or key in self.index:
+                return
+            self.pending[key] = vector
+
+    def flush(self):
+        """Append buffered entries, evicting least recently used ones over budget"""
+        with self.lock:
+            if self.records is not None:
+                self.records.flush()
+            if not self.pending:
+                return
+
+            record_dtype = self._record_dtype(self.dimensions)
+            new_records = np.zeros(len(self.pending), dtype=record_dtype)
+            for i, (key, vector) in enumerate(self.pending.items()):
+                new_records['key'][i] = np.frombuffer(key, dtype=np.uint8)
+                new_records['vector'][i] = vector
+
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            f = self._open_locked()
+            try:
+                if os.fstat(f.fileno()).st_size == 0:
+                    f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.dimensions))
+                new_records['used'] = time.time()
+                f.write(new_records.tobytes())
+                f.flush()
+
+                self.pending = {}
+                self._extend()
+
+                max_entries = max(1, (self.max_bytes - self.HEADER.size) // record_dtype.itemsize)
+                if self.records is not None and len(self.records) > max_entries:
+                    self._evict(int(max_entries * 0.9))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+
+    def _open_locked(self):
+        """Open the live cache file for appending, holding its exclusive lock"""
+        while True:
+            f = open(self.path, 'ab')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            # Another process evicted (replaced the file) while we waited
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _evict(self, keep):
+        """
+        Rewrite the file keeping the `keep` most recently used entries
+
+        The caller holds the lock on the live file, so no append can land
+        between reading the entries and replacing the file.
+        """
+        recent = np.sort(np.argsort(-self.records['used'], kind='stable')[:keep])
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.dimensions))
+            f.write(np.asarray(self.records[recent]).tobytes())
+        os.replace(tmp, self.path)
+        self._load()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'entries': len(self),
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            'maxBytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+# Persistent image embedding cache (configure_cache() overrides the defaults)
+CACHE_DIR = os.environ.get(
+    'VISUAL_SEARCH_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+CACHE_MAX_MB = float(os.environ.get('VISUAL_SEARCH_CACHE_MB', 256))
+cache_enabled = os.environ.get('VISUAL_SEARCH_CACHE', '1') != '0'
+image_cache = None
+text_cache = None
+
+# Hot shopper queries stay in process memory in front of the text cache file
+TEXT_LRU_SIZE = int(os.environ.get('VISUAL_SEARCH_TEXT_LRU', 4096))
+text_lru = OrderedDict()
+text_lru_lock = threading.Lock()
+
+def configure_cache(cache_dir=None, max_mb=None, enabled=None):
+    """Override cache location, size budget or switch it off"""
+    global CACHE_DIR, CACHE_MAX_MB, cache_enabled, image_cache, text_cache
+
+    if cache_dir is not None:
+        CACHE_DIR = cache_dir
+    if max_mb is not None:
+        CACHE_MAX_MB = float(max_mb)
+    if enabled is not None:
+        cache_enabled = enabled
+    image_cache = None
+    text_cache = None
+    text_lru.clear()
+
+def cache_namespace(draft_size=None):
+    """
+    Cache keys are scoped to the model (and non-default backend) that
+    produced the embedding, and for images to the decode mode
+    """
+    namespace = MODEL_NAME if BACKEND == 'torch' else f'{MODEL_NAME}:{BACKEND}'
+    if draft_size is not None:
+        namespace += ':draft%dx%d' % tuple(draft_size)
+    return namespace
+
+def get_text_cache():
+    """Open the text embedding cache on first use, or None when disabled"""
+    global text_cache
+
+    if not cache_enabled:
+        return None
+    if text_cache is None:
+        text_cache = EmbeddingCache(
+            os.path.join(CACHE_DIR, 'text-embeddings.bin'), CACHE_MAX_MB * 1024 * 1024
+        )
+    return text_cache
+
+def text_lru_get(query):
+    """In-process LRU lookup for a normalized query"""
+    if not cache_enabled:
+        return None
+    with text_lru_lock:
+        embedding = text_lru.get(query)
+        if embedding is not None:
+            text_lru.move_to_end(query)
+        return embedding
+
+def text_lru_put(query, embedding):
+    if not cache_enabled:
+        return
+    with text_lru_lock:
+        text_lru[query] = embedding
+        text_lru.move_to_end(query)
+        while len(text_lru) > TEXT_LRU_SIZE:
+            text_lru.popitem(last=False)
+
+def get_image_cache():
+    """Open the image embedding cache on first use, or None when disabled"""
+    global image_cache
+
+    if not cache_enabled:
+        return None
+    if image_cache is None:
+        image_cache = EmbeddingCache(
+            os.path.join(CACHE_DIR, 'image-embeddings.bin'), CACHE_MAX_MB * 1024 * 1024
+        )
+    return image_cache
+
+def encode_image_batch(images, backend=None):
+    """
+    Run one batch of PIL images through the CLIP image tower
+
+    Args:
+        images: List of PIL images
+        backend: Backend to use (default: the configured one)
+
+    Returns:
+        (n, 512) numpy array of normalized embeddings
+    """
+    backend = backend or initialize_model()
+
+    inputs = processor(images=images, return_tensors=backend.tensor_type)
+
+    return backend.image_features(inputs)
+
+def image_embedding(image_path_or_data):
+    """CLIP embedding for one image as a numpy array, via the image cache"""
+    key, embedding, image = prepare_image(image_path_or_data)
+
+    if embedding is None:
+        embedding = encode_image_batch([image])[0]
+
+        cache = get_image_cache()
+        if cache is not None:
+            cache.put(key, embedding)
+            cache.flush()
+
+    return embedding
+
 def encode_image(image_path_or_data):
     """
     Generate CLIP embedding for an image
@@ -45,36 +664,72 @@ def encode_image(image_path_or_data):
         numpy array of image embedding (512 dimensions)
     """
     try:
-        initialize_model()
-        
-        # Load image
-        if image_path_or_data.startswith('data:image'):
-            # Base64 encoded image
-            image_data = image_path_or_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(BytesIO(image_bytes)).convert('RGB')
-        else:
-            # File path
-            image = Image.open(image_path_or_data).convert('RGB')
-        
-        # Process image
-        inputs = processor(images=image, return_tensors="pt")
-        
-        # Generate embedding
-        with torch.no_grad():
-            image_features = model.get_image_features(**inputs)
-            # Normalize embedding
-            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-        
-        # Convert to numpy array
-        embedding = image_features.cpu().numpy()[0]
-        
-        return embedding.tolist()
+        return image_embedding(image_path_or_data).tolist()
         
     except Exception as e:
         print(f"Error encoding image: {e}", file=sys.stderr)
         raise
 
+def normalize_query(text):
+    """Canonical form of a text query used as its cache key"""
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+def encode_text_batch(texts, backend=None):
+    """
+    Run one batch of texts through the CLIP text tower
+
+    Returns:
+        (n, 512) numpy array of normalized embeddings
+    """
+    backend = backend or initialize_model()
+
+    inputs = processor(text=texts, return_tensors=backend.tensor_type, padding=True)
+
+    return backend.text_features(inputs)
+
+def encode_texts(texts, batch_size=64):
+    """
+    Generate CLIP embeddings for many texts, consulting the text caches
+
+    Texts are normalized (NFKC, lower-case, collapsed whitespace) before
+    lookup, so "Red  Saree" and "red saree" share one entry. Only texts
+    missing from both the in-memory LRU and the persistent cache reach the
+    model, in batches of batch_size.
+
+    Returns:
+        (embeddings as numpy arrays aligned with texts, number served from cache)
+    """
+    normalized = [normalize_query(text) for text in texts]
+    cache = get_text_cache()
+
+    embeddings = {}
+    for query in normalized:
+        if query in embeddings:
+            continue
+        embedding = text_lru_get(query)
+        if embedding is None and cache is not None:
+            embedding = cache.get(EmbeddingCache.key_for(cache_namespace() + ':text', query))
+            if embedding is not None:
+                text_lru_put(query, embedding)
+        if embedding is not None:
+            embeddings[query] = embedding
+
+    cached = sum(1 for query in normalized if query in embeddings)
+
+    missing = list(dict.fromkeys(query for query in normalized if query not in embeddings))
+    for start in range(0, len(missing), max(1, int(batch_size))):
+        batch = missing[start:start + batch_size]
+        for query, embedding in zip(batch, encode_text_batch(batch)):
+            embeddings[query] = embedding
+            text_lru_put(query, embedding)
+            if cache is not None:
+                cache.put(EmbeddingCache.key_for(cache_namespace() + ':text', query), embedding)
+
+    if cache is not None:
+        cache.flush()
+
+    return [embeddings[query] for query in normalized], cached
+
 def encode_text(text):
     """
     Generate CLIP embedding for text
@@ -86,21 +741,9 @@ def encode_text(text):
         numpy array of text embedding (512 dimensions)
     """
     try:
-        initialize_model()
-        
-        # Process text
-        inputs = processor(text=[text], return_tensors="pt", padding=True)
-        
-        # Generate embedding
-        with torch.no_grad():
-            text_features = model.get_text_features(**inputs)
-            # Normalize embedding
-            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        embeddings, _ = encode_texts([text])
         
-        # Convert to numpy array
-        embedding = text_features.cpu().numpy()[0]
-        
-        return embedding.tolist()
+        return embeddings[0].tolist()
         
     except Exception as e:
         print(f"Error encoding text: {e}", file=sys.stderr)
@@ -108,29 +751,41 @@ def encode_text(text):
 
 def compute_similarity(embedding1, embedding2):
     """
-    Compute cosine similarity between two embeddings
+    Compute cosine similarity between embeddings
     
     Args:
-        embedding1: First embedding (list or numpy array)
-        embedding2: Second embedding (list or numpy array)
+        embedding1: Query embedding (list or numpy array)
+        embedding2: Single embedding, or (n, d) matrix of embeddings
     
     Returns:
-        Similarity score (0-1, higher is more similar)
+        Similarity score (0-1, higher is more similar), or a list of
+        scores when embedding2 is a matrix
     """
     try:
-        # Convert to numpy arrays
-        emb1 = np.array(embedding1)
-        emb2 = np.array(embedding2)
+        emb1 = np.asarray(embedding1, dtype=np.float32)
+        emb2 = np.asarray(embedding2, dtype=np.float32)
         
-        # Compute cosine similarity
-        similarity = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+        # One matrix-vector product over normalized rows
+        query = emb1 / (np.linalg.norm(emb1) or 1.0)
+        if emb2.ndim == 1:
+            return float(np.dot(emb2, query) / (np.linalg.norm(emb2) or 1.0))
         
-        return float(similarity)
+        return (_normalize_rows(emb2) @ query).tolist()
         
     except Exception as e:
         print(f"Error computing similarity: {e}", file=sys.stderr)
         return 0.0
 
+def rank_by_similarity(query_embedding, product_ids, matrix, top_k=10):
+    """Top-k (product_id, similarity) pairs for a query against an (n, d) matrix"""
+    if len(product_ids) == 0:
+        return []
+
+    similarities = np.asarray(compute_similarity(query_embedding, matrix))
+    best = _top_k(similarities, top_k)
+
+    return [(product_ids[i], float(similarities[i])) for i in best]
+
 def find_similar_images(query_embedding, product_embeddings, top_k=10):
     """
     Find most similar products based on embeddings
@@ -144,24 +799,130 @@ def find_similar_images(query_embedding, product_embeddings, top_k=10):
         List of (product_id, similarity_score) tuples, sorted by similarity
     """
     try:
-        query_emb = np.array(query_embedding)
-        
-        similarities = []
-        for product_id, product_emb in product_embeddings:
-            product_emb_array = np.array(product_emb)
-            similarity = np.dot(query_emb, product_emb_array)
-            similarities.append((product_id, float(similarity)))
+        if not product_embeddings:
+            return []
         
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        product_ids = [product_id for product_id, _ in product_embeddings]
+        matrix = np.asarray([emb for _, emb in product_embeddings], dtype=np.float32)
         
-        return similarities[:top_k]
+        return rank_by_similarity(query_embedding, product_ids, matrix, top_k)
         
     except Exception as e:
         print(f"Error finding similar images: {e}", file=sys.stderr)
         return []
 
-def batch_encode_images(image_paths):
+def iter_encode_images(image_paths, batch_size=32, workers=4):
+    """
+    Stream CLIP embeddings for a list of images
+
+    A bounded thread pool decodes images ahead of the model while
+    fixed-size micro-batches run through the image tower. Embeddings are
+    yielded as soon as their batch finishes and carry their input index;
+    an image that fails to load or encode is reported immediately without
+    aborting the rest. Images whose bytes are already in the embedding
+    cache skip decoding and inference entirely.
+
+    Args:
+        image_paths: Iterable of image file paths or data URIs
+        batch_size: Images per model call
+        workers: Decoder threads
+
+    Yields:
+        {'index', 'path', 'embedding'[, 'cached']} or {'index', 'path', 'error'} dicts,
+        in input order
+    """
+    batch_size = max(1, int(batch_size))
+    # Keep at most two batches decoded ahead of inference
+    max_pending = batch_size * 2
+
+    cache = get_image_cache()
+
+    # Cache hits and load errors finish before earlier misses still waiting
+    # in a batch; hold every result until all earlier indices are out
+    ready = {}
+    next_index = 0
+
+    def in_order(results):
+        nonlocal next_index
+        for result in results:
+            ready[result['index']] = result
+        while next_index in ready:
+            yield ready.pop(next_index)
+            next_index += 1
+
+    def remember(key, embedding):
+        if cache is not None:
+            cache.put(key, embedding)
+            # Bound the in-memory write buffer on long reindex runs
+            if len(cache.pending) >= 1024:
+                cache.flush()
+
+    def encode_batch(batch):
+        try:
+            embeddings = encode_image_batch([image for _, _, _, image in batch])
+        except Exception as e:
+            print(f"Batch encoding failed, retrying images individually: {e}", file=sys.stderr)
+            for index, path, key, image in batch:
+                try:
+                    embedding = encode_image_batch([image])[0]
+                    remember(key, embedding)
+                    yield {'index': index, 'path': path, 'embedding': embedding}
+                except Exception as item_error:
+                    yield {'index': index, 'path': path, 'error': str(item_error)}
+            return
+
+        for (index, path, key, _), embedding in zip(batch, embeddings):
+            remember(key, embedding)
+            yield {'index': index, 'path': path, 'embedding': embedding}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            pending = deque()
+            batch = []
+            paths = iter(enumerate(image_paths))
+            exhausted = False
+
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        index, path = next(paths)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append((index, path, pool.submit(prepare_image, path)))
+
+                if not pending:
+                    break
+
+                index, path, future = pending.popleft()
+                try:
+                    key, embedding, image = future.result()
+                except Exception as e:
+                    print(f"Failed to load image {path}: {e}", file=sys.stderr)
+                    yield from in_order([{'index': index, 'path': path, 'error': str(e)}])
+                    continue
+
+                if embedding is not None:
+                    # Unchanged bytes: cache hit costs only the hash
+                    yield from in_order([{'index': index, 'path': path, 'embedding': embedding, 'cached': True}])
+                    # Don't let a partial batch hold back a long run of hits
+                    if batch and len(ready) >= max_pending:
+                        yield from in_order(encode_batch(batch))
+                        batch = []
+                    continue
+
+                batch.append((index, path, key, image))
+                if len(batch) >= batch_size:
+                    yield from in_order(encode_batch(batch))
+                    batch = []
+
+            if batch:
+                yield from in_order(encode_batch(batch))
+    finally:
+        if cache is not None:
+            cache.flush()
+
+def batch_encode_images(image_paths, batch_size=32, workers=4):
     """
     Encode multiple images in batch for efficiency
     
@@ -169,134 +930,1281 @@ def batch_encode_images(image_paths):
         image_paths: List of image file paths
     
     Returns:
-        List of embeddings
+        List of embeddings in input order (images that fail to load are skipped)
     """
     try:
-        initialize_model()
-        
-        images = []
-        valid_paths = []
-        
-        for path in image_paths:
-            try:
-                img = Image.open(path).convert('RGB')
-                images.append(img)
-                valid_paths.append(path)
-            except Exception as e:
-                print(f"Failed to load image {path}: {e}", file=sys.stderr)
-        
-        if not images:
-            return []
-        
-        # Process batch
-        inputs = processor(images=images, return_tensors="pt")
-        
-        # Generate embeddings
-        with torch.no_grad():
-            image_features = model.get_image_features(**inputs)
-            # Normalize embeddings
-            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-        
-        # Convert to list of embeddings
-        embeddings = image_features.cpu().numpy()
-        
-        return [emb.tolist() for emb in embeddings]
+        return [
+            result['embedding'].tolist()
+            for result in iter_encode_images(image_paths, batch_size, workers)
+            if 'embedding' in result
+        ]
         
     except Exception as e:
         print(f"Error in batch encoding: {e}", file=sys.stderr)
         return []
 
-def main():
-    """Main CLI interface"""
-    try:
-        if len(sys.argv) < 2:
-            print(json.dumps({
-                'success': False,
-                'error': 'No command provided'
-            }))
-            sys.exit(1)
-        
-        command = sys.argv[1]
-        
-        if command == 'encode_image':
-            if len(sys.argv) < 3:
-                print(json.dumps({
-                    'success': False,
-                    'error': 'No image path provided'
-                }))
-                sys.exit(1)
-            
-            image_path = sys.argv[2]
-            embedding = encode_image(image_path)
-            
-            print(json.dumps({
-                'success': True,
-                'embedding': embedding,
-                'dimensions': len(embedding)
-            }))
-            
-        elif command == 'encode_text':
-            if len(sys.argv) < 3:
-                print(json.dumps({
-                    'success': False,
-                    'error': 'No text provided'
-                }))
-                sys.exit(1)
-            
-            text = sys.argv[2]
-            embedding = encode_text(text)
-            
-            print(json.dumps({
-                'success': True,
-                'embedding': embedding,
-                'dimensions': len(embedding)
-            }))
-            
-        elif command == 'find_similar':
-            if len(sys.argv) < 4:
-                print(json.dumps({
-                    'success': False,
-                    'error': 'Missing arguments'
-                }))
-                sys.exit(1)
-            
-            query_embedding = json.loads(sys.argv[2])
-            product_embeddings = json.loads(sys.argv[3])
-            top_k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
-            
-            results = find_similar_images(query_embedding, product_embeddings, top_k)
-            
-            print(json.dumps({
-                'success': True,
-                'results': results
-            }))
-            
-        elif command == 'batch_encode':
-            if len(sys.argv) < 3:
-                print(json.dumps({
-                    'success': False,
-                    'error': 'No image paths provided'
-                }))
-                sys.exit(1)
-            
-            image_paths = json.loads(sys.argv[2])
-            embeddings = batch_encode_images(image_paths)
-            
-            print(json.dumps({
-                'success': True,
-                'embeddings': embeddings,
-                'count': len(embeddings)
-            }))
-            
-        else:
-            print(json.dumps({
-                'success': False,
-                'error': f'Unknown command: {command}'
-            }))
-            sys.exit(1)
-        
-        sys.exit(0)
-        
+def _top_k(scores, top_k):
+    """Indices of the top_k highest scores, best first, without a full sort"""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def _normalize_rows(matrix):
+    """L2-normalize matrix rows so dot products are cosine similarities"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _kmeans(data, n_clusters, iterations=20, seed=42):
+    """
+    Spherical k-means over normalized vectors
+
+    Args:
+        data: (n, d) float32 matrix of normalized vectors
+        n_clusters: Number of centroids
+        iterations: Lloyd iterations
+
+    Returns:
+        (n_clusters, d) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign_clusters(data, centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[filled] = sums
+
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+        centroids = _normalize_rows(centroids).astype(np.float32)
+
+    return centroids
+
+def _assign_clusters(data, centroids, chunk_size=65536):
+    """Nearest centroid for every row, computed in bounded-memory chunks"""
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk_size):
+        chunk = np.asarray(data[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+STORE_PRECISIONS = ('float32', 'float16', 'int8')
+
+def quantize_embeddings(embeddings, precision):
+    """
+    Convert normalized float32 embeddings to a storage precision
+
+    int8 uses a symmetric per-vector scale (max |x| / 127), so a row is
+    recovered as int8_row * scale.
+
+    Returns:
+        (matrix, scales) where scales is None except for int8
+    """
+    if precision == 'float32':
+        return embeddings.astype(np.float32), None
+    if precision == 'float16':
+        return embeddings.astype(np.float16), None
+    if precision == 'int8':
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        matrix = np.rint(embeddings / scales[:, None]).clip(-127, 127).astype(np.int8)
+        return matrix, scales.astype(np.float32)
+    raise ValueError(f'Unknown precision: {precision} (expected one of {", ".join(STORE_PRECISIONS)})')
+
+def score_matrix(matrix, scales, query, block_rows=32768):
+    """
+    Dot products of query with every row of a float32/float16/int8 matrix
+
+    Reduced-precision rows are widened one block at a time, so scoring
+    never materializes a float32 copy of the whole matrix.
+    """
+    if matrix.dtype == np.float32:
+        return matrix @ query
+
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        end = min(start + block_rows, len(matrix))
+        scores[start:end] = np.asarray(matrix[start:end], dtype=np.float32) @ query
+        if scales is not None:
+            scores[start:end] *= scales[start:end]
+    return scores
+
+class EmbeddingStore:
+    """
+    On-disk product embedding store
+
+    A store is a directory holding one subdirectory per version plus a
+    CURRENT file naming the live one. Each version contains:
+        meta.json       count, dimensions, precision, model name, index parameters
+        embeddings.bin  row-major matrix (count x dimensions), memory-mapped
+        scales.npy      per-row scales, only for int8 precision
+        ids.npy         product ids aligned with matrix rows
+        versions.json   product id -> image version, used by reindex
+        ivf.npz         optional IVF index (centroids and per-list row offsets)
+
+    Rows are stored L2-normalized in float32, float16 or int8. When an IVF
+    index is built the rows are rewritten in list order, so each inverted
+    list is a contiguous slice of the memory-mapped matrix.
+
+    A version is fully written before CURRENT is swapped to it, so readers
+    see the old store or the new one, never a mix of the two. Stores
+    written before versioning (files directly in the directory) still open.
+    """
+
+    CURRENT_FILE = 'CURRENT'
+    KEEP_VERSIONS = 3
+
+    META_FILE = 'meta.json'
+    EMBEDDINGS_FILE = 'embeddings.bin'
+    SCALES_FILE = 'scales.npy'
+    IDS_FILE = 'ids.npy'
+    VERSIONS_FILE = 'versions.json'
+    INDEX_FILE = 'ivf.npz'
+
+    # Rows widened per block when scoring, bounding temporary memory
+    BLOCK_ROWS = 32768
+
+    def __init__(self, path):
+        self.path = path
+        self.version_dir = self.live_dir(path)
+
+        with open(os.path.join(self.version_dir, self.META_FILE)) as f:
+            self.meta = json.load(f)
+
+        self.count = int(self.meta['count'])
+        self.dimensions = int(self.meta['dimensions'])
+        self.precision = self.meta.get('precision', 'float32')
+        self.ids = np.load(os.path.join(self.version_dir, self.IDS_FILE), allow_pickle=False)
+        if len(self.ids) != self.count:
+            raise ValueError(f'Inconsistent store {path}: {len(self.ids)} ids for {self.count} rows')
+
+        if self.count:
+            embeddings_path = os.path.join(self.version_dir, self.EMBEDDINGS_FILE)
+            expected = self.count * self.dimensions * np.dtype(self.precision).itemsize
+            if os.path.getsize(embeddings_path) != expected:
+                raise ValueError(f'Inconsistent store {path}: embeddings file does not hold {self.count} rows')
+            self.embeddings = np.memmap(
+                embeddings_path, dtype=np.dtype(self.precision), mode='r', shape=(self.count, self.dimensions)
+            )
+        else:
+            self.embeddings = np.zeros((0, self.dimensions), dtype=np.dtype(self.precision))
+
+        self.scales = None
+        if self.precision == 'int8':
+            self.scales = np.load(os.path.join(self.version_dir, self.SCALES_FILE), allow_pickle=False)
+            if len(self.scales) != self.count:
+                raise ValueError(f'Inconsistent store {path}: {len(self.scales)} scales for {self.count} rows')
+
+        self.versions = {}
+        versions_path = os.path.join(self.version_dir, self.VERSIONS_FILE)
+        if os.path.exists(versions_path):
+            with open(versions_path) as f:
+                self.versions = json.load(f)
+
+        self.centroids = None
+        self.list_offsets = None
+        index_path = os.path.join(self.version_dir, self.INDEX_FILE)
+        if self.meta.get('index') == 'ivf' and os.path.exists(index_path):
+            with np.load(index_path, allow_pickle=False) as index:
+                self.centroids = index['centroids']
+                self.list_offsets = index['list_offsets']
+
+    @classmethod
+    def live_dir(cls, path):
+        """Directory of the version CURRENT points at (the store itself before versioning)"""
+        pointer = os.path.join(path, cls.CURRENT_FILE)
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                return os.path.join(path, f.read().strip())
+        return path
+
+    @classmethod
+    def exists(cls, path):
+        """Whether path holds a store"""
+        return os.path.exists(os.path.join(cls.live_dir(path), cls.META_FILE))
+
+    @classmethod
+    def write(cls, path, ids, embeddings, model_name=MODEL_NAME, precision='float32', versions=None):
+        """
+        Create (or replace) a store from ids and embeddings
+
+        Args:
+            path: Store directory
+            ids: Sequence of product ids
+            embeddings: (n, d) array-like of embeddings
+            precision: Storage precision (float32, float16 or int8)
+            versions: Optional dict of str(product id) -> image version
+
+        Returns:
+            Opened EmbeddingStore
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(ids) == 0:
+            embeddings = embeddings.reshape(0, embeddings.shape[-1] if embeddings.ndim == 2 else 0)
+        if embeddings.ndim != 2 or len(embeddings) != len(ids):
+            raise ValueError('Embeddings must be a 2-D matrix with one row per id')
+
+        matrix, scales = quantize_embeddings(_normalize_rows(embeddings), precision)
+        cls._write_files(path, np.asarray(ids), matrix, scales, {
+            'model': model_name,
+            'count': len(ids),
+            'dimensions': int(embeddings.shape[1]),
+            'precision': precision,
+            'index': None
+        }, versions=versions or {})
+        return cls(path)
+
+    @classmethod
+    def _write_files(cls, path, ids, embeddings, scales, meta, index_arrays=None, versions=None):
+        """
+        Write a complete new store version and swap CURRENT to it
+
+        versions=None carries the live version's versions.json over.
+
+        Returns:
+            Version name
+        """
+        os.makedirs(path, exist_ok=True)
+        previous = cls.live_dir(path)
+
+        version = time.strftime('%Y%m%dT%H%M%S') + '-%06d' % (time.time_ns() // 1000 % 1000000)
+        target = os.path.join(path, version)
+        tmp = target + '.tmp'
+        os.makedirs(tmp)
+
+        def write(name, writer):
+            with open(os.path.join(tmp, name), 'wb') as f:
+                writer(f)
+
+        write(cls.EMBEDDINGS_FILE, lambda f: f.write(np.ascontiguousarray(embeddings).tobytes()))
+        write(cls.IDS_FILE, lambda f: np.save(f, ids, allow_pickle=False))
+        if scales is not None:
+            write(cls.SCALES_FILE, lambda f: np.save(f, scales, allow_pickle=False))
+        if index_arrays is not None:
+            write(cls.INDEX_FILE, lambda f: np.savez(f, **index_arrays))
+        if versions is not None:
+            write(cls.VERSIONS_FILE, lambda f: f.write(json.dumps(versions).encode('utf-8')))
+        elif os.path.exists(os.path.join(previous, cls.VERSIONS_FILE)):
+            shutil.copyfile(os.path.join(previous, cls.VERSIONS_FILE), os.path.join(tmp, cls.VERSIONS_FILE))
+
+        meta = dict(meta, version=version, updatedAt=time.time())
+        write(cls.META_FILE, lambda f: f.write(json.dumps(meta, indent=2).encode('utf-8')))
+
+        os.replace(tmp, target)
+
+        pointer = os.path.join(path, cls.CURRENT_FILE)
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(pointer + '.tmp', pointer)
+
+        # Files of a store written before versioning are superseded
+        if previous == path:
+            for name in (cls.META_FILE, cls.EMBEDDINGS_FILE, cls.SCALES_FILE, cls.IDS_FILE,
+                         cls.VERSIONS_FILE, cls.INDEX_FILE):
+                if os.path.exists(os.path.join(path, name)):
+                    os.remove(os.path.join(path, name))
+
+        # Version names sort chronologically
+        names = sorted(
+            name for name in os.listdir(path)
+            if os.path.isdir(os.path.join(path, name)) and not name.endswith('.tmp')
+        )
+        for name in names[:-cls.KEEP_VERSIONS]:
+            if name != version:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+        return version
+
+    def rows(self, start, end):
+        """Rows [start, end) dequantized to float32"""
+        block = np.asarray(self.embeddings[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def score_rows(self, query, start=0, end=None):
+        """Dot products of query with rows [start, end)"""
+        end = self.count if end is None else end
+        scales = self.scales[start:end] if self.scales is not None else None
+        return score_matrix(self.embeddings[start:end], scales, query, self.BLOCK_ROWS)
+
+    def build_index(self, n_lists=None, iterations=20, sample_size=50000):
+        """
+        Build an IVF index: cluster the catalog and regroup rows by cluster
+
+        Args:
+            n_lists: Number of inverted lists (default ~4 * sqrt(count))
+            iterations: k-means iterations
+            sample_size: Rows sampled to train the centroids
+
+        Returns:
+            Re-opened EmbeddingStore with the index loaded
+        """
+        if self.count == 0:
+            raise ValueError('Cannot index an empty store')
+
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(self.count))
+        n_lists = max(1, min(int(n_lists), self.count))
+
+        rng = np.random.default_rng(42)
+        if self.count > sample_size:
+            sample_rows = np.sort(rng.choice(self.count, sample_size, replace=False))
+            sample = np.asarray(self.embeddings[sample_rows], dtype=np.float32)
+            if self.scales is not None:
+                sample *= self.scales[sample_rows, None]
+        else:
+            sample = self.rows(0, self.count)
+
+        centroids = _kmeans(sample, n_lists, iterations=iterations)
+
+        assignments = np.empty(self.count, dtype=np.int64)
+        for start in range(0, self.count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, self.count)
+            assignments[start:end] = _assign_clusters(self.rows(start, end), centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        embeddings = np.asarray(self.embeddings[order])
+        scales = self.scales[order] if self.scales is not None else None
+        ids = self.ids[order]
+
+        meta = dict(self.meta, index='ivf', nLists=n_lists, rowsAddedSinceIndex=0)
+        self._write_files(self.path, ids, embeddings, scales, meta, {
+            'centroids': centroids,
+            'list_offsets': list_offsets
+        })
+        return EmbeddingStore(self.path)
+
+    def apply_changes(self, upserts, removed, versions):
+        """
+        Add/replace and delete products without re-encoding the rest
+
+        Unchanged rows are copied in their stored precision. With an IVF
+        index the existing centroids are kept: new rows join their nearest
+        list and rows are regrouped, so no k-means pass is needed.
+
+        Args:
+            upserts: Dict of product id -> embedding for new or changed products
+            removed: Iterable of product ids to delete
+            versions: Dict of str(product id) -> version for the resulting store
+
+        Returns:
+            Re-opened EmbeddingStore
+        """
+        drop = {str(product_id) for product_id in removed} | {str(product_id) for product_id in upserts}
+        keep = np.array([str(product_id) not in drop for product_id in self.ids.tolist()], dtype=bool)
+
+        upsert_ids = list(upserts)
+        new_rows = np.asarray(list(upserts.values()), dtype=np.float32).reshape(len(upsert_ids), self.dimensions)
+        new_rows = _normalize_rows(new_rows)
+        new_matrix, new_scales = quantize_embeddings(new_rows, self.precision)
+
+        kept_ids = self.ids[keep].tolist()
+        ids = np.asarray(kept_ids + upsert_ids)
+        embeddings = np.concatenate([np.asarray(self.embeddings[keep]), new_matrix])
+        scales = None
+        if self.scales is not None:
+            scales = np.concatenate([self.scales[keep], new_scales])
+
+        meta = dict(self.meta, count=len(ids))
+        index_arrays = None
+        if self.centroids is not None:
+            n_lists = len(self.centroids)
+            row_lists = np.repeat(np.arange(n_lists), np.diff(self.list_offsets))[keep]
+            lists = np.concatenate([row_lists, _assign_clusters(new_rows, self.centroids)])
+
+            order = np.argsort(lists, kind='stable')
+            ids, embeddings = ids[order], embeddings[order]
+            if scales is not None:
+                scales = scales[order]
+
+            index_arrays = {
+                'centroids': self.centroids,
+                'list_offsets': np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=n_lists)))).astype(np.int64)
+            }
+            meta['rowsAddedSinceIndex'] = int(meta.get('rowsAddedSinceIndex', 0)) + len(upsert_ids)
+
+        self._write_files(self.path, ids, embeddings, scales, meta, index_arrays, versions)
+        return EmbeddingStore(self.path)
+
+    def search(self, query_embedding, top_k=10, nprobe=8, exact=False):
+        """
+        Find the most similar products to a query embedding
+
+        Uses the IVF index when present (probing the nprobe closest lists),
+        otherwise - or when exact is set - a blocked matrix-vector product
+        over the whole catalog. Top-k selection uses argpartition.
+
+        Returns:
+            List of (product_id, similarity_score) tuples, best first
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dimensions:
+            raise ValueError(f'Query has {query.shape[0]} dimensions, store has {self.dimensions}')
+
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        if self.centroids is None or exact:
+            rows = None
+            scores = self.score_rows(query)
+        else:
+            probe = _top_k(self.centroids @ query, max(1, int(nprobe)))
+            rows = np.concatenate([
+                np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probe
+            ])
+            scores = np.concatenate([
+                self.score_rows(query, self.list_offsets[l], self.list_offsets[l + 1]) for l in probe
+            ])
+
+        best = _top_k(scores, top_k)
+        if rows is not None:
+            best_rows = rows[best]
+        else:
+            best_rows = best
+
+        return [(self.ids[r].item(), float(scores[b])) for r, b in zip(best_rows, best)]
+
+def evaluate_precisions(store, n_queries=200, top_k=10, seed=42):
+    """
+    Compare reduced-precision copies of a float32 store against float32
+
+    Queries are catalog rows with small Gaussian noise. For each precision
+    reports recall@k of exact search versus float32 exact search, the
+    matrix size in bytes and mean query latency.
+
+    Returns:
+        Dict of precision -> metrics
+    """
+    if store.precision != 'float32':
+        raise ValueError('Precision evaluation needs a float32 store as the reference')
+    if store.count == 0:
+        raise ValueError('Cannot evaluate an empty store')
+
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(store.count, min(n_queries, store.count), replace=False)
+    queries = store.rows(0, store.count)[query_rows]
+    queries = _normalize_rows(queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32))
+
+    full = store.rows(0, store.count)
+    reference = [set(_top_k(full @ q, top_k).tolist()) for q in queries]
+
+    report = {}
+    for precision in STORE_PRECISIONS:
+        matrix, scales = quantize_embeddings(full, precision)
+
+        hits = 0
+        start = time.time()
+        for q, truth in zip(queries, reference):
+            scores = score_matrix(matrix, scales, q)
+            hits += len(truth & set(_top_k(scores, top_k).tolist()))
+        elapsed = time.time() - start
+
+        report[precision] = {
+            'recallAtK': round(hits / (len(queries) * top_k), 4),
+            'bytes': int(matrix.nbytes + (scales.nbytes if scales is not None else 0)),
+            'avgQueryMs': round(elapsed / len(queries) * 1000, 3)
+        }
+
+    return report
+
+def load_embedding_pairs(source):
+    """
+    Read (product_id, embedding) pairs from a file path or '-' for stdin
+
+    Accepts a JSON array of [id, embedding] pairs, or NDJSON with one
+    [id, embedding] pair or {"productId"/"id", "embedding"} object per line.
+    """
+    f = sys.stdin if source == '-' else open(source)
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    try:
+        records = json.loads(text)
+        if not isinstance(records, list) or (records and not isinstance(records[0], (list, dict))):
+            records = [records]
+    except json.JSONDecodeError:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    ids = []
+    embeddings = []
+    for record in records:
+        if isinstance(record, dict):
+            if 'embedding' not in record:
+                continue
+            ids.append(record.get('productId', record.get('id')))
+            embeddings.append(record['embedding'])
+        else:
+            ids.append(record[0])
+            embeddings.append(record[1])
+
+    return ids, embeddings
+
+_open_stores = {}
+
+def open_store(path):
+    """Open a store, reusing the mapping while the live version is unchanged"""
+    version_dir = EmbeddingStore.live_dir(path)
+    key = (version_dir, os.path.getmtime(os.path.join(version_dir, EmbeddingStore.META_FILE)))
+    cached = _open_stores.get(path)
+    if cached is None or cached[0] != key:
+        cached = (key, EmbeddingStore(path))
+        _open_stores[path] = cached
+    return cached[1]
+
+# Wire formats for embedding-carrying responses and requests. 'json' is a
+# plain float list; the base64 formats carry raw little-endian values
+# (a matrix is one row-major blob, reshaped with 'dimensions').
+EMBEDDING_FORMATS = {
+    'json': None,
+    'base64-f32': '<f4',
+    'base64-f16': '<f2'
+}
+
+def pack_embeddings(embeddings, embedding_format='json'):
+    """Serialize one embedding or a matrix of embeddings for the wire"""
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f'Unknown embedding format: {embedding_format}')
+
+    array = np.asarray(embeddings, dtype=np.float32)
+    if embedding_format == 'json':
+        return array.tolist()
+    return base64.b64encode(array.astype(EMBEDDING_FORMATS[embedding_format]).tobytes()).decode('ascii')
+
+def unpack_embeddings(value, embedding_format=None, dimensions=None):
+    """
+    Inverse of pack_embeddings
+
+    Float lists pass through; strings are decoded as base64 in the given
+    format (base64-f32 by default) and reshaped to rows of `dimensions`.
+    """
+    if not isinstance(value, str):
+        return np.asarray(value, dtype=np.float32)
+
+    embedding_format = embedding_format if embedding_format not in (None, 'json') else 'base64-f32'
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f'Unknown embedding format: {embedding_format}')
+
+    array = np.frombuffer(base64.b64decode(value), dtype=EMBEDDING_FORMATS[embedding_format]).astype(np.float32)
+    return array.reshape(-1, int(dimensions)) if dimensions else array
+
+def read_lines(source):
+    """Read a list from a file or '-' for stdin: a JSON array or one entry per line"""
+    f = sys.stdin if source == '-' else open(source)
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def load_manifest(source):
+    """
+    Read a product image manifest from a file or '-' for stdin
+
+    Accepts a JSON array or NDJSON of objects with an id (or productId),
+    an image (or imageUrl / imagePath) and optionally updatedAt and/or
+    contentHash.
+    """
+    f = sys.stdin if source == '-' else open(source)
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    try:
+        entries = json.loads(text)
+    except json.JSONDecodeError:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    manifest = {}
+    for entry in entries:
+        product_id = entry.get('id', entry.get('productId'))
+        image = entry.get('image') or entry.get('imageUrl') or entry.get('imagePath')
+        if product_id is None or not image:
+            continue
+        manifest[str(product_id)] = {
+            'id': product_id,
+            'image': image,
+            'updatedAt': entry.get('updatedAt'),
+            'contentHash': entry.get('contentHash')
+        }
+    return manifest
+
+def manifest_version(entry):
+    """
+    Version string identifying the image a product was embedded from
+
+    An explicit contentHash wins; otherwise the image location plus
+    updatedAt; with neither, a hash of the image bytes.
+    """
+    if entry.get('contentHash'):
+        return f"sha:{entry['contentHash']}"
+    if entry.get('updatedAt') is not None:
+        return f"{entry['image']}@{entry['updatedAt']}"
+    return 'sha:' + hashlib.sha256(read_image_bytes(entry['image'])).hexdigest()
+
+def reindex_store(store_path, manifest, precision='float32', delete_missing=True,
+                  batch_size=32, workers=4):
+    """
+    Bring a store in line with a product manifest, encoding only the churn
+
+    Products whose version matches the stored one are left untouched; new
+    and changed images are encoded; products absent from the manifest are
+    deleted unless delete_missing is off. A changed image that fails to
+    encode keeps its previous embedding and version.
+
+    Returns:
+        Dict of change counts, failures and timing
+    """
+    start = time.time()
+    store = None
+    if EmbeddingStore.exists(store_path):
+        store = EmbeddingStore(store_path)
+
+    stored_versions = store.versions if store is not None else {}
+    stored_ids = {str(product_id) for product_id in store.ids.tolist()} if store is not None else set()
+
+    versions = {}
+    failed = []
+    to_encode = []
+    unchanged = 0
+    for key, entry in manifest.items():
+        try:
+            version = manifest_version(entry)
+        except Exception as e:
+            failed.append({'productId': entry['id'], 'error': str(e)})
+            continue
+        versions[key] = version
+        if key not in stored_ids or stored_versions.get(key) != version:
+            to_encode.append(entry)
+        else:
+            unchanged += 1
+
+    removed = []
+    if delete_missing:
+        removed = [product_id for product_id in (store.ids.tolist() if store is not None else [])
+                   if str(product_id) not in manifest]
+
+    upserts = {}
+    for result in iter_encode_images([entry['image'] for entry in to_encode], batch_size, workers):
+        entry = to_encode[result['index']]
+        if 'embedding' in result:
+            upserts[entry['id']] = result['embedding']
+        else:
+            failed.append({'productId': entry['id'], 'error': result['error']})
+
+    # Failed products keep whatever version (and row) they had before
+    for failure in failed:
+        key = str(failure['productId'])
+        if key in stored_versions:
+            versions[key] = stored_versions[key]
+        else:
+            versions.pop(key, None)
+    if not delete_missing:
+        for key, version in stored_versions.items():
+            versions.setdefault(key, version)
+
+    added = sum(1 for product_id in upserts if str(product_id) not in stored_ids)
+
+    if store is None:
+        if not upserts:
+            raise ValueError('No images could be encoded for a new store')
+        store = EmbeddingStore.write(
+            store_path, list(upserts), np.asarray(list(upserts.values()), dtype=np.float32),
+            precision=precision, versions=versions
+        )
+    elif upserts or removed:
+        store = store.apply_changes(upserts, removed, versions)
+
+    return {
+        'added': added,
+        'updated': len(upserts) - added,
+        'removed': len(removed),
+        'unchanged': unchanged,
+        'failed': failed,
+        'count': store.count,
+        'rowsAddedSinceIndex': store.meta.get('rowsAddedSinceIndex'),
+        'reindexTime': round(time.time() - start, 3)
+    }
+
+def run_command(command, params, emit=None):
+    """
+    Execute a single visual search command
+
+    Args:
+        command: Command name (encode_image, encode_text, encode_texts, find_similar, batch_encode,
+                 build_store, build_index, reindex, evaluate_precision, export_onnx,
+                 parity_check, cache_stats)
+        params: Dict of command parameters
+        emit: Optional callback receiving intermediate messages from
+              streaming commands (batch_encode with stream set)
+
+    Embedding-carrying commands honour params['embeddingFormat']
+    (json, base64-f32 or base64-f16) for both outputs and inputs.
+
+    Returns:
+        JSON-serializable result dict
+    """
+    embedding_format = params.get('embeddingFormat', 'json')
+    if embedding_format not in EMBEDDING_FORMATS:
+        return {'success': False, 'error': f'Unknown embedding format: {embedding_format}'}
+
+    if command == 'encode_image':
+        if not params.get('image'):
+            return {'success': False, 'error': 'No image path provided'}
+
+        try:
+            embedding = image_embedding(params['image'])
+        except Exception as e:
+            print(f"Error encoding image: {e}", file=sys.stderr)
+            raise
+
+        return {
+            'success': True,
+            'embedding': pack_embeddings(embedding, embedding_format),
+            'embeddingFormat': embedding_format,
+            'dimensions': len(embedding)
+        }
+
+    elif command == 'encode_text':
+        if not params.get('text'):
+            return {'success': False, 'error': 'No text provided'}
+
+        try:
+            embedding = encode_texts([params['text']])[0][0]
+        except Exception as e:
+            print(f"Error encoding text: {e}", file=sys.stderr)
+            raise
+
+        return {
+            'success': True,
+            'embedding': pack_embeddings(embedding, embedding_format),
+            'embeddingFormat': embedding_format,
+            'dimensions': len(embedding)
+        }
+
+    elif command == 'encode_texts':
+        if params.get('input'):
+            params['texts'] = read_lines(params['input'])
+        if not params.get('texts'):
+            return {'success': False, 'error': 'No texts provided'}
+
+        embeddings, cached = encode_texts(params['texts'], int(params.get('batchSize', 64)))
+
+        result = {
+            'success': True,
+            'count': len(embeddings),
+            'cached': cached,
+            'dimensions': len(embeddings[0]) if embeddings else 0
+        }
+        # --precompute only warms the caches (e.g. popular queries at deploy time)
+        if not params.get('precompute'):
+            result['embeddings'] = pack_embeddings(np.asarray(embeddings), embedding_format)
+            result['embeddingFormat'] = embedding_format
+        return result
+
+    elif command == 'find_similar':
+        if 'queryEmbedding' not in params or ('productEmbeddings' not in params and 'store' not in params):
+            return {'success': False, 'error': 'Missing arguments'}
+
+        top_k = int(params.get('topK', 10))
+        query = unpack_embeddings(params['queryEmbedding'], embedding_format)
+
+        if params.get('store'):
+            store = open_store(params['store'])
+            results = store.search(query, top_k, int(params.get('nprobe', 8)), bool(params.get('exact')))
+        elif isinstance(params['productEmbeddings'], dict):
+            # Columnar form: {"ids": [...], "embeddings": <matrix or base64 blob>}
+            products = params['productEmbeddings']
+            matrix = unpack_embeddings(products['embeddings'], embedding_format, len(query))
+            results = rank_by_similarity(query, products['ids'], matrix.reshape(len(products['ids']), -1), top_k)
+        else:
+            results = find_similar_images(query, params['productEmbeddings'], top_k)
+
+        return {
+            'success': True,
+            'results': results
+        }
+
+    elif command == 'build_store':
+        if not params.get('source') or not params.get('store'):
+            return {'success': False, 'error': 'Missing arguments'}
+
+        ids, embeddings = load_embedding_pairs(params['source'])
+        store = EmbeddingStore.write(
+            params['store'], ids, embeddings, precision=params.get('precision', 'float32')
+        )
+
+        return {
+            'success': True,
+            'store': params['store'],
+            'count': store.count,
+            'dimensions': store.dimensions,
+            'precision': store.precision
+        }
+
+    elif command == 'build_index':
+        if not params.get('store'):
+            return {'success': False, 'error': 'No store path provided'}
+
+        start = time.time()
+        n_lists = params.get('nLists')
+        store = EmbeddingStore(params['store']).build_index(int(n_lists) if n_lists else None)
+
+        return {
+            'success': True,
+            'store': params['store'],
+            'count': store.count,
+            'nLists': store.meta['nLists'],
+            'buildTime': round(time.time() - start, 3)
+        }
+
+    elif command == 'reindex':
+        if not params.get('manifest') or not params.get('store'):
+            return {'success': False, 'error': 'Missing arguments'}
+
+        summary = reindex_store(
+            params['store'],
+            load_manifest(params['manifest']),
+            precision=params.get('precision', 'float32'),
+            delete_missing=not params.get('keepMissing'),
+            batch_size=int(params.get('batchSize', 32)),
+            workers=int(params.get('workers', 4))
+        )
+
+        return dict(success=True, store=params['store'], **summary)
+
+    elif command == 'evaluate_precision':
+        if not params.get('store'):
+            return {'success': False, 'error': 'No store path provided'}
+
+        report = evaluate_precisions(
+            EmbeddingStore(params['store']),
+            n_queries=int(params.get('queries', 200)),
+            top_k=int(params.get('topK', 10))
+        )
+
+        return {
+            'success': True,
+            'store': params['store'],
+            'precisions': report
+        }
+
+    elif command == 'batch_encode':
+        if params.get('input'):
+            params['imagePaths'] = read_lines(params['input'])
+        if not params.get('imagePaths'):
+            return {'success': False, 'error': 'No image paths provided'}
+
+        batch_size = int(params.get('batchSize', 32))
+        workers = int(params.get('workers', 4))
+
+        if params.get('stream') and emit is not None:
+            # One NDJSON line per image as soon as its micro-batch finishes
+            count = 0
+            failed = 0
+            for result in iter_encode_images(params['imagePaths'], batch_size, workers):
+                if 'embedding' in result:
+                    result['embedding'] = pack_embeddings(result['embedding'], embedding_format)
+                    count += 1
+                else:
+                    failed += 1
+                emit(dict(type='item', **result))
+
+            return {
+                'success': True,
+                'type': 'summary',
+                'count': count,
+                'failed': failed
+            }
+
+        # Successful rows only, in input order; indices maps each row back
+        # to imagePaths and failures lists the images that could not be encoded
+        results = sorted(
+            iter_encode_images(params['imagePaths'], batch_size, workers),
+            key=lambda result: result['index']
+        )
+        encoded = [result for result in results if 'embedding' in result]
+        embeddings = [result['embedding'] for result in encoded]
+        indices = [result['index'] for result in encoded]
+        failures = [
+            {'index': result['index'], 'path': result['path'], 'error': result['error']}
+            for result in results if 'error' in result
+        ]
+
+        if embedding_format == 'json':
+            return {
+                'success': True,
+                'embeddings': [embedding.tolist() for embedding in embeddings],
+                'count': len(embeddings),
+                'indices': indices,
+                'failures': failures
+            }
+
+        # Packed into one blob of count x dimensions
+        return {
+            'success': True,
+            'embeddings': pack_embeddings(np.asarray(embeddings), embedding_format),
+            'embeddingFormat': embedding_format,
+            'count': len(embeddings),
+            'dimensions': len(embeddings[0]) if embeddings else 0,
+            'indices': indices,
+            'failures': failures
+        }
+
+    elif command == 'export_onnx':
+        output_dir = params.get('output') or ONNX_DIR
+        exported = export_onnx(output_dir)
+
+        return dict(success=True, outputDir=output_dir, **exported)
+
+    elif command == 'parity_check':
+        if params.get('input'):
+            params['imagePaths'] = read_lines(params['input'])
+        if not params.get('imagePaths'):
+            return {'success': False, 'error': 'No image paths provided'}
+
+        candidate = params.get('candidate') or ('int8' if BACKEND == 'torch' else BACKEND)
+        texts = params.get('texts')
+        if isinstance(texts, str):
+            texts = json.loads(texts)
+        report = parity_check(params['imagePaths'], candidate, texts, int(params.get('batchSize', 16)))
+
+        return dict(success=True, **report)
+
+    elif command == 'cache_stats':
+        cache = get_image_cache()
+        text = get_text_cache()
+
+        return {
+            'success': True,
+            'enabled': cache is not None,
+            'imageCache': cache.stats() if cache is not None else None,
+            'textCache': text.stats() if text is not None else None,
+            'textLruEntries': len(text_lru)
+        }
+
+    return {'success': False, 'error': f'Unknown command: {command}'}
+
+def params_from_argv(command, args):
+    """Map positional CLI arguments onto command parameters"""
+    params = {}
+
+    if command == 'encode_image' and len(args) >= 1:
+        params['image'] = args[0]
+    elif command == 'encode_text' and len(args) >= 1:
+        params['text'] = args[0]
+    elif command == 'find_similar' and len(args) >= 2:
+        # A JSON float list, or a base64 blob in --embedding-format
+        params['queryEmbedding'] = json.loads(args[0]) if args[0].lstrip().startswith('[') else args[0]
+        # Second argument is either a store directory or inline JSON embeddings
+        if os.path.isdir(args[1]):
+            params['store'] = args[1]
+        else:
+            params['productEmbeddings'] = json.loads(args[1])
+        if len(args) > 2:
+            params['topK'] = int(args[2])
+        if len(args) > 3:
+            params['nprobe'] = int(args[3])
+    elif command == 'build_store' and len(args) >= 2:
+        params['source'] = args[0]
+        params['store'] = args[1]
+    elif command == 'reindex' and len(args) >= 2:
+        params['manifest'] = args[0]
+        params['store'] = args[1]
+    elif command == 'evaluate_precision' and len(args) >= 1:
+        params['store'] = args[0]
+        if len(args) > 1:
+            params['queries'] = int(args[1])
+        if len(args) > 2:
+            params['topK'] = int(args[2])
+    elif command == 'build_index' and len(args) >= 1:
+        params['store'] = args[0]
+        if len(args) > 1:
+            params['nLists'] = int(args[1])
+    elif command == 'batch_encode' and len(args) >= 1:
+        params['imagePaths'] = json.loads(args[0])
+    elif command == 'encode_texts' and len(args) >= 1:
+        params['texts'] = json.loads(args[0])
+    elif command == 'export_onnx' and len(args) >= 1:
+        params['output'] = args[0]
+    elif command == 'parity_check' and len(args) >= 1:
+        params['imagePaths'] = json.loads(args[0])
+        if len(args) > 1:
+            params['candidate'] = args[1]
+
+    return params
+
+# CLI options: value options take the next argument (or --name=value),
+# flags take none. Anything else starting with -- is a positional argument.
+VALUE_OPTIONS = {
+    'backend', 'batch-size', 'cache-dir', 'cache-mb', 'candidate', 'embedding-format', 'input',
+    'n-lists', 'nprobe', 'output', 'precision', 'queries', 'socket', 'texts', 'threads',
+    'top-k', 'workers'
+}
+FLAG_OPTIONS = {'exact', 'keep-missing', 'lazy', 'no-cache', 'precompute', 'stream'}
+
+def parse_options(argv):
+    """
+    Split known --key value options and flags from positional arguments
+
+    Option names become camelCase parameter keys (--n-lists -> nLists).
+    Unknown --words are kept as positional arguments, and everything after
+    a bare -- is positional.
+
+    Returns:
+        (positional args, options dict)
+    """
+    positional = []
+    options = {}
+
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name, has_value, value = arg[2:].partition('=') if arg.startswith('--') else ('', False, None)
+
+        if arg == '--':
+            positional.extend(argv[i + 1:])
+            break
+        elif name in VALUE_OPTIONS:
+            if not has_value:
+                if i + 1 >= len(argv):
+                    raise ValueError(f'Option --{name} requires a value')
+                value = argv[i + 1]
+                i += 1
+        elif name in FLAG_OPTIONS:
+            if has_value:
+                raise ValueError(f'Option --{name} takes no value')
+            value = True
+        else:
+            positional.append(arg)
+            i += 1
+            continue
+
+        head, *rest = name.split('-')
+        options[head + ''.join(part.capitalize() for part in rest)] = value
+        i += 1
+
+    return positional, options
+
+class VisualSearchWorker:
+    """
+    Long-lived worker that keeps the CLIP model loaded between requests
+
+    Speaks newline-delimited JSON: each request line is
+    {"id": ..., "command": ..., ...params} and each response line echoes
+    the request id alongside the usual command result. Control commands
+    are "health" and "shutdown".
+    """
+
+    def __init__(self, preload=True):
+        self.preload = preload
+        self.started_at = time.time()
+        self.requests_served = 0
+        self.shutting_down = False
+        self.busy = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Load the model up front so the first request is not slow"""
+        if self.preload:
+            initialize_model()
+
+    def status(self):
+        return {
+            'status': 'shutting_down' if self.shutting_down else 'ready',
+            'model': MODEL_NAME,
+            'backend': BACKEND,
+            'modelLoaded': model is not None,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 3),
+            'requestsServed': self.requests_served
+        }
+
+    def handle_line(self, line, emit=None):
+        """
+        Handle one request line
+
+        Args:
+            line: Raw request line
+            emit: Callback for intermediate messages of streaming commands
+
+        Returns:
+            Response dict, or None for blank lines
+        """
+        line = line.strip()
+        if not line:
+            return None
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+
+            request_id = request.get('id')
+            command = request.get('command')
+
+            if command == 'health':
+                response = {'success': True}
+                response.update(self.status())
+            elif command == 'shutdown':
+                self.shutting_down = True
+                response = {'success': True, 'status': 'shutting_down'}
+            elif not command:
+                response = {'success': False, 'error': 'No command provided'}
+            else:
+                # CLIP inference is not re-entrant across socket connections
+                with self.lock:
+                    self.busy = True
+                    try:
+                        response = run_command(command, request, self._tagged(emit, request_id))
+                    finally:
+                        self.busy = False
+                    self.requests_served += 1
+
+        except Exception as e:
+            response = {'success': False, 'error': str(e)}
+
+        response['id'] = request_id
+        return response
+
+    @staticmethod
+    def _tagged(emit, request_id):
+        """Wrap emit so streamed messages carry the request id"""
+        if emit is None:
+            return None
+        return lambda message: emit(dict(message, id=request_id))
+
+    def serve_stream(self, infile, outfile):
+        """Serve requests from a line-oriented stream until EOF or shutdown"""
+        emit = lambda message: write_message(outfile, message)
+        for line in infile:
+            response = self.handle_line(line, emit)
+            if response is not None:
+                write_message(outfile, response)
+            if self.shutting_down:
+                break
+
+    def serve_socket(self, socket_path):
+        """Serve requests over a Unix domain socket, one thread per connection"""
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                reader = io.TextIOWrapper(self.rfile, encoding='utf-8')
+                writer = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                write_message(writer, dict(type='ready', **worker.status()))
+                worker.serve_stream(reader, writer)
+                if worker.shutting_down:
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+def write_message(outfile, message):
+    """Write one JSON message per line and flush immediately"""
+    outfile.write(json.dumps(message) + '\n')
+    outfile.flush()
+
+def serve(options):
+    """Run the persistent worker on stdin/stdout or a Unix socket"""
+    worker = VisualSearchWorker(preload=not options.get('lazy'))
+
+    def request_shutdown(signum, frame):
+        # Let an in-flight request finish; only interrupt an idle read
+        worker.shutting_down = True
+        if not worker.busy:
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    try:
+        worker.start()
+
+        socket_path = options.get('socket')
+        if socket_path:
+            print(f"Visual search worker listening on {socket_path}", file=sys.stderr)
+            worker.serve_socket(socket_path)
+        else:
+            write_message(sys.stdout, dict(type='ready', **worker.status()))
+            worker.serve_stream(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+
+    if not options.get('socket'):
+        write_message(sys.stdout, {'type': 'shutdown', 'requestsServed': worker.requests_served})
+
+def main():
+    """Main CLI interface"""
+    try:
+        args, options = parse_options(sys.argv[1:])
+
+        if not args:
+            print(json.dumps({
+                'success': False,
+                'error': 'No command provided'
+            }))
+            sys.exit(1)
+
+        command = args[0]
+
+        configure_backend(options.get('backend'), options.get('threads'))
+        configure_cache(
+            cache_dir=options.get('cacheDir'),
+            max_mb=options.get('cacheMb'),
+            enabled=False if options.get('noCache') else None
+        )
+
+        if command == 'serve':
+            serve(options)
+            sys.exit(0)
+
+        params = params_from_argv(command, args[1:])
+        params.update(options)
+        result = run_command(command, params, lambda message: write_message(sys.stdout, message))
+        print(json.dumps(result))
+
+        sys.exit(0 if result['success'] else 1)
+
     except Exception as e:
         print(json.dumps({
             'success': False,